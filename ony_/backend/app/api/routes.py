@@ -2,78 +2,900 @@
 Routes API pour Aqua Verify
 """
 
+import asyncio
+import hmac
+import json
 import logging
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query
-from typing import List
-from ..models.document import AnalysisReport, ChatRequest, ChatMessage
+import time
+import zipfile
+from functools import lru_cache, partial
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, BackgroundTasks, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import TypeAdapter, ValidationError
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Set, Tuple
+from ..models.document import (
+    AnalysisJobInfo, AnalysisReport, ChatRequest, ChatMessage, ChatUpgrade, ExplainRequest,
+    DossierDetail, DossierList, IssueDossierList, SearchResults,
+    FileCheckRequest, FileCheckResponse, KnownFile, ProfileInfo,
+)
+from ..core.config import settings
+from ..services.pipeline import (
+    AnalysisResult, DossierFile, ExtractedFile, close_files, file_names, is_supported, probe_files, run_analysis
+)
+from ..services import backends
 from ..services.extractor import TextExtractor
-from ..services.analyzer import DocumentAnalyzer
+from ..services.zip_dossier import ZipDossier, ZipLimitError, is_zip
+from ..services.archive import DossierArchive, match_query
+from ..services.job_queue import AnalysisJob, JobManager, JobQueueFullError, JobStatus
+from ..services.work_scheduler import FairWorkScheduler, JobCost
+from ..services.cancellation import AnalysisCancelled, CancellationStats, CancellationToken, CancelReason
 from ..services.chatbot import ChatbotService
 from ..services.jan_client import JanAIClient
 from ..services.rag_service import RAGService
+from ..services.pending_answers import PendingAnswerStore
+from ..services.conversation import Conversation, ConversationStore
+from ..services.report_store import ReportStore, compute_report_id
+from ..services.report_memo import ReportMemo, content_hash
+from ..services.shared_state import SharedState
+from ..services import metrics
+from ..services.memory import MB, MemoryBudgetExceeded, MemoryGovernor
+from ..services.metrics import CACHE_REQUESTS
+from ..services.profiler import ProfileStore, SamplingProfiler, folded, profiled_call
+from ..services.llm_scheduler import LLMPriority, LLMQueueFullError
+from ..services.model_router import LLMRequestKind
 
 
 router = APIRouter()
 logger = logging.getLogger("aqua_verify")
 
-# Instance du chatbot (stateful pour garder le contexte)
-chatbot = ChatbotService()
-# Client IA Jan.ai (utilisé pour les réponses enrichies)
+# Client IA Jan.ai (utilisé pour les réponses enrichies) ; connexions ouvertes au démarrage
 jan_client = JanAIClient()
-rag_service = RAGService(jan_client=jan_client)
+# Analyses annulées (déconnexion, DELETE, échéance) et travail évité
+cancellations = CancellationStats()
+# Fréquence de vérification de la connexion pendant une analyse synchrone
+DISCONNECT_POLL_S = 0.5
+# Créneaux d'extraction / OCR page par page, partagés équitablement entre clients
+work_scheduler = FairWorkScheduler(
+    capacity=settings.ANALYSIS_WORKERS,
+    ocr_page_cost=settings.ANALYSIS_OCR_PAGE_COST,
+    fast_lane_max_units=settings.ANALYSIS_FAST_LANE_MAX_COST,
+    fast_lane_weight=settings.ANALYSIS_FAST_LANE_WEIGHT,
+)
+
+# Ressources propres au processus worker (bases SQLite, répertoires de
+# débordement, pool de jobs) : créées par open_resources() dans le lifespan,
+# pas à l'import du module.
+# État partagé entre processus workers (jobs, conversations, mémo, réponses
+# différées) ; inutile avec un seul worker
+shared_state: Optional[SharedState] = None
+# Rapports d'analyse par session : chaque instructeur garde son propre contexte
+sessions: ReportStore
+# Rapports par identifiant : /chat reçoit un report_id au lieu du rapport complet
+reports: ReportStore
+# Explications Jan.ai des rapports (partagées entre workers une fois terminées)
+rag_service: RAGService
+# Réponses Jan.ai poursuivies après dépassement du budget de latence
+pending_answers: PendingAnswerStore
+# Historiques de conversation par session (résumé glissant + derniers échanges)
+conversations: ConversationStore
+# Dossiers déjà analysés : empreinte (fichiers, type, règles, code) -> report_id
+report_memo: ReportMemo
+# Suivi et budget mémoire des analyses (synchrones et jobs)
+memory_governor: MemoryGovernor
+# Archive durable des dossiers analysés (désactivée si ARCHIVE_DB_PATH est vide)
+archive: Optional[DossierArchive] = None
+# Jobs d'analyse asynchrones (POST /api/jobs)
+jobs: JobManager
+# Profils d'analyses à la demande (désactivé sans PROFILING_TOKEN)
+profiles: Optional[ProfileStore] = None
+
+
+def open_resources() -> None:
+    """Crée les ressources du processus (lifespan, au démarrage du worker)."""
+    global shared_state, sessions, reports, rag_service, pending_answers, conversations
+    global report_memo, memory_governor, archive, jobs, profiles
+    shared_state = SharedState(settings.SHARED_STATE_DB_PATH) if settings.WEB_WORKERS > 1 else None
+    sessions = ReportStore(
+        ttl_s=settings.SESSION_TTL_S,
+        max_bytes=settings.SESSION_MAX_BYTES,
+        max_entries=settings.SESSION_MAX_ENTRIES,
+        spill_dir=settings.SESSION_SPILL_DIR,
+    )
+    reports = ReportStore(
+        ttl_s=settings.REPORT_TTL_S,
+        max_bytes=settings.REPORT_MAX_BYTES,
+        max_entries=settings.REPORT_MAX_ENTRIES,
+        spill_dir=settings.REPORT_SPILL_DIR,
+    )
+    rag_service = RAGService(jan_client=jan_client, shared=shared_state)
+    pending_answers = PendingAnswerStore(shared=shared_state)
+    conversations = ConversationStore(
+        recent_token_budget=settings.CHAT_HISTORY_TOKEN_BUDGET,
+        summary_token_budget=settings.CHAT_SUMMARY_TOKEN_BUDGET,
+        shared=shared_state,
+    )
+    report_memo = ReportMemo(max_entries=settings.REPORT_MEMO_MAX_ENTRIES, shared=shared_state)
+    memory_governor = MemoryGovernor(
+        budget_bytes=settings.ANALYSIS_MEMORY_BUDGET_MB * MB if settings.ANALYSIS_MEMORY_BUDGET_MB else None,
+        degrade_ratio=settings.MEMORY_DEGRADE_RATIO,
+        ocr_dpi=settings.OCR_DPI,
+        degraded_ocr_scale=settings.MEMORY_DEGRADED_OCR_SCALE,
+        track_python=settings.MEMORY_TRACK_PYTHON,
+    )
+    archive = DossierArchive(settings.ARCHIVE_DB_PATH) if settings.ARCHIVE_DB_PATH else None
+    jobs = JobManager(
+        on_result=lambda job, result: _store_result(result, job.case_type, job.session_id, job.memo_key),
+        scheduler=work_scheduler,
+        cancellations=cancellations,
+        max_active=settings.ANALYSIS_MAX_ACTIVE_JOBS,
+        max_jobs=settings.ANALYSIS_MAX_JOBS,
+        max_queued=settings.ANALYSIS_MAX_QUEUED_JOBS,
+        disconnect_grace_s=settings.JOB_DISCONNECT_GRACE_S,
+        shared=shared_state,
+        memory=memory_governor,
+    )
+    profiles = (
+        ProfileStore(settings.PROFILE_DIR, max_profiles=settings.PROFILE_MAX_PROFILES)
+        if settings.PROFILING_TOKEN else None
+    )
+
+
+async def close_resources() -> None:
+    """Libère les ressources du processus (lifespan, à l'arrêt du worker)."""
+    # Jobs en cours annulés (statut "cancelled", raison "shutdown") avant de fermer les bases
+    await jobs.shutdown()
+    if shared_state is not None:
+        await run_in_threadpool(shared_state.delete, "metrics", metrics.process_key())
+    if archive is not None:
+        await run_in_threadpool(archive.close)
+    if shared_state is not None:
+        await run_in_threadpool(shared_state.close)
+
+
+# Fichiers cités par haché dans /api/analyze et /api/jobs (champ de formulaire JSON)
+KNOWN_FILES_DESCRIPTION = (
+    'Fichiers déjà connus du serveur, non réuploadés : JSON [{"filename": "...", "sha256": "..."}]'
+)
+_KNOWN_FILES = TypeAdapter(List[KnownFile])
+
+# Intentions du chatbot auxquelles l'explication globale du dossier répond directement
+EXPLANATION_INTENTS = {"get_compliance_issues"}
 
 
 @router.post("/analyze", response_model=AnalysisReport)
 async def analyze_documents(
-    files: List[UploadFile] = File(...),
+    background_tasks: BackgroundTasks,
+    request: Request,
+    response: Response,
+    files: List[UploadFile] = File([]),
+    known_files: Optional[str] = Form(None, description=KNOWN_FILES_DESCRIPTION),
     case_type: str = Query("PC", description="Type de dossier: PC (permis de construire) ou PA (permis d'aménager)"),
+    pregenerate_explanation: bool = Query(
+        False,
+        description="Génère en tâche de fond l'explication Jan.ai du rapport (servie ensuite par /chat et /explain)",
+    ),
+    session_id: Optional[str] = Query(
+        None,
+        max_length=128,
+        description="Session (ou dossier) à laquelle rattacher le rapport pour le chat",
+    ),
+    deadline_s: Optional[float] = Query(
+        None,
+        gt=0,
+        description="Échéance de l'analyse en secondes (défaut : ANALYSIS_DEADLINE_S)",
+    ),
 ):
     """
     Analyse une liste de documents uploadés.
     
     Args:
-        files: Liste des fichiers uploadés
+        files: Liste des fichiers uploadés (PDF, Word, ou archive ZIP du dossier)
+        known_files: Fichiers déjà connus du serveur (voir POST /api/files/check), non réuploadés
+        pregenerate_explanation: Lance la génération de l'explication après la réponse
+        session_id: Identifiant de session pour retrouver le rapport depuis /chat
+        deadline_s: Au-delà, l'extraction s'arrête et la réponse est une 504
         
     Returns:
-        Rapport d'analyse complet
+        Rapport d'analyse complet, avec son `report_id` (repris en en-tête ETag).
+        Un dossier déjà analysé (mêmes fichiers, règles et code) est servi depuis
+        le mémo ; avec `If-None-Match` égal à son ETag, la réponse est une 304.
+        Avec l'en-tête X-Profile-Token, l'analyse est profilée ; l'identifiant
+        du profil est renvoyé dans X-Profile-Id.
     """
-    if not files:
-        raise HTTPException(status_code=400, detail="Aucun fichier fourni")
-    
-    # Extraire le texte de chaque document
-    extracted_files = []
-    extractor = TextExtractor()
-    
-    for file in files:
-        # Vérifier l'extension
-        filename = file.filename or "unknown"
-        if not any(filename.lower().endswith(ext) for ext in [".pdf", ".docx", ".doc"]):
-            continue
-        
-        # Lire le contenu du fichier
-        content = await file.read()
-        
-        # Extraire le texte
-        text, success = extractor.extract(content, filename)
-        
-        extracted_files.append((filename, text))
+    profiling = _profile_token(request) is not None
+    if profiling:
+        _check_profile_token(request)
+    analysis = _analyze_request(
+        files, known_files, case_type, session_id, deadline_s,
+        pregenerate_explanation, request, response, background_tasks,
+    )
+    if not profiling:
+        return await analysis
+    return await _profiled(
+        analysis, response, case_type=case_type, files=[f.filename or "" for f in files],
+    )
+
+
+async def _analyze_request(
+    files: List[UploadFile],
+    known_files: Optional[str],
+    case_type: str,
+    session_id: Optional[str],
+    deadline_s: Optional[float],
+    pregenerate_explanation: bool,
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
+):
+    # Fichiers acceptés (PDF, Word, ZIP) : uploads et fichiers cités par haché
+    dossier_files, file_hashes = await _collect_files(files, known_files)
+    try:
+        return await _analyze_dossier(
+            dossier_files, file_hashes, case_type, session_id, deadline_s,
+            pregenerate_explanation, request, response, background_tasks,
+        )
+    finally:
+        close_files(dossier_files)
+
+
+def _profile_token(request: Request) -> Optional[str]:
+    # En-tête seulement : un paramètre d'URL finirait dans les journaux d'accès
+    return request.headers.get("X-Profile-Token")
+
+
+def _check_profile_token(request: Request) -> ProfileStore:
+    """Magasin de profils si le jeton est valide ; 404 si le profilage est désactivé, 403 sinon."""
+    if profiles is None:
+        raise HTTPException(status_code=404, detail="Profilage désactivé (PROFILING_TOKEN)")
+    supplied = _profile_token(request) or ""
+    if not hmac.compare_digest(supplied.encode(), settings.PROFILING_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Jeton de profilage invalide")
+    return profiles
+
+
+async def _profiled(analysis, response: Response, **meta: Any):
+    """Exécute l'analyse sous l'échantillonneur puis enregistre le profil."""
+    profile_id = ProfileStore.new_id()
+    response.headers["X-Profile-Id"] = profile_id
+    profiler = SamplingProfiler(settings.PROFILE_INTERVAL_S, settings.PROFILE_MAX_DURATION_S)
+    outcome = "ok"
+    profiler.start()
+    try:
+        return await analysis
+    except HTTPException as e:
+        outcome = str(e.status_code)
+        raise
+    except Exception as e:
+        outcome = e.__class__.__name__
+        raise
+    finally:
+        profiler.stop()
+        meta.update(outcome=outcome, worker=metrics.process_key())
+        try:
+            await run_in_threadpool(profiles.save, profile_id, profiler, meta)
+        except OSError:
+            logger.exception("Enregistrement du profil %s impossible", profile_id)
+        else:
+            logger.info("Profil %s enregistré (%d échantillons)", profile_id, profiler.sample_count)
+
+
+async def _analyze_dossier(
+    dossier_files: List[DossierFile],
+    file_hashes: List[Tuple[str, str]],
+    case_type: str,
+    session_id: Optional[str],
+    deadline_s: Optional[float],
+    pregenerate_explanation: bool,
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
+):
+    response.headers["X-Files-Reused"] = str(_reused_count(dossier_files))
+
+    # Dossier déjà analysé : ni extraction ni OCR
+    memo_key, cached = await _memo_lookup(file_hashes, case_type)
+    if cached is not None:
+        etag = _etag(cached.report_id)
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag, "X-Report-Cache": "hit"})
+        await run_in_threadpool(_bind_session, cached, session_id)
+        response.headers["ETag"] = etag
+        response.headers["X-Report-Cache"] = "hit"
+        if pregenerate_explanation:
+            background_tasks.add_task(rag_service.pregenerate_explanation, cached)
+        return cached
     
-    if not extracted_files:
+    # Extraire puis analyser hors de la boucle asyncio (OCR bloquant), page par
+    # page dans les créneaux partagés avec les jobs ; l'analyse s'arrête si le
+    # client se déconnecte ou si l'échéance est dépassée
+    cost = await _estimate_cost(dossier_files)
+    token = CancellationToken(deadline_s or settings.ANALYSIS_DEADLINE_S)
+    page_slot = partial(work_scheduler.slot, _client_id(request), work_scheduler.lane_for(cost), token)
+    analysis = asyncio.ensure_future(
+        run_in_threadpool(
+            profiled_call, run_analysis, dossier_files, case_type, None, page_slot, token, memory=memory_governor,
+        )
+    )
+    try:
+        result = await _await_unless_disconnected(request, analysis, token)
+    except AnalysisCancelled:
+        cancellations.record(token, cost.pages, cost.scanned_pages)
+        if token.reason == CancelReason.DEADLINE:
+            raise HTTPException(status_code=504, detail="Délai d'analyse dépassé")
+        # Client parti : personne ne lira la réponse (499, convention nginx)
+        raise HTTPException(status_code=499, detail="Analyse annulée")
+    except (ZipLimitError, zipfile.BadZipFile) as e:
+        # Membre d'archive corrompu ou plus grand que déclaré
+        raise HTTPException(status_code=400, detail=str(e))
+    except MemoryBudgetExceeded as e:
+        # Dossier trop gourmand pour ANALYSIS_MEMORY_BUDGET_MB : refusé plutôt que d'épuiser le worker
+        raise HTTPException(status_code=413, detail=str(e))
+    if result is None:
         raise HTTPException(
             status_code=400, 
             detail="Aucun fichier valide trouvé (formats acceptés: PDF, DOCX)"
         )
+
+    report = result.report
+    report_id = await run_in_threadpool(profiled_call, _store_result, result, case_type, session_id, memo_key)
+    response.headers["ETag"] = _etag(report_id)
+    response.headers["X-Report-Cache"] = "miss"
+
+    # L'explication est générée pendant que l'utilisateur lit le rapport
+    if pregenerate_explanation:
+        background_tasks.add_task(rag_service.pregenerate_explanation, report)
     
-    # Analyser les documents
-    analyzer = DocumentAnalyzer(case_type=case_type)
-    report = analyzer.analyze_documents(extracted_files)
-    
-    # Mettre à jour le contexte du chatbot
-    chatbot.set_report(report)
-    
     return report
 
 
+async def _await_unless_disconnected(request: Request, analysis: asyncio.Future, token: CancellationToken):
+    """Attend l'analyse en surveillant la connexion : un client parti l'annule."""
+    while True:
+        done, _ = await asyncio.wait({analysis}, timeout=DISCONNECT_POLL_S)
+        if done:
+            return analysis.result()
+        if not token.cancelled and await request.is_disconnected():
+            logger.info("Client déconnecté : annulation de l'analyse en cours")
+            token.cancel(CancelReason.DISCONNECT)
+
+
+async def _read_uploads(files: List[UploadFile]) -> List[DossierFile]:
+    """
+    Contenu des fichiers uploadés dont l'extension est acceptée.
+
+    Une archive ZIP n'est pas lue en mémoire : elle est recopiée par blocs et
+    contrôlée (limites ZIP_*) ; ses membres seront décompressés à l'analyse.
+    """
+    uploaded: List[DossierFile] = []
+    try:
+        for file in files:
+            filename = file.filename or "unknown"
+            if is_zip(filename):
+                uploaded.append(await run_in_threadpool(profiled_call, _open_zip, filename, file.file))
+            elif is_supported(filename):
+                uploaded.append((filename, await file.read()))
+    except ZipLimitError as e:
+        close_files(uploaded)
+        raise HTTPException(status_code=400, detail=str(e))
+    except BaseException:
+        close_files(uploaded)
+        raise
+    return uploaded
+
+
+def _open_zip(filename: str, source) -> ZipDossier:
+    return ZipDossier(
+        filename,
+        source,
+        is_supported,
+        max_members=settings.ZIP_MAX_MEMBERS,
+        max_member_bytes=settings.ZIP_MAX_MEMBER_BYTES,
+        max_total_bytes=settings.ZIP_MAX_TOTAL_BYTES,
+        max_ratio=settings.ZIP_MAX_RATIO,
+    )
+
+
+async def _collect_files(
+    files: List[UploadFile],
+    known_files: Optional[str],
+) -> Tuple[List[DossierFile], List[Tuple[str, str]]]:
+    """
+    Fichiers du dossier et couples (nom, SHA-256) pour le mémo.
+
+    Un upload dont le contenu est déjà archivé reprend l'extraction archivée
+    (pas d'OCR). Un haché cité mais inconnu donne une 409 avec la liste des
+    hachés à uploader.
+    """
+    known = [item for item in _parse_known_files(known_files) if is_supported(item.filename)]
+    uploaded = await _read_uploads(files or [])
+    if not uploaded and not known:
+        raise HTTPException(
+            status_code=400,
+            detail="Aucun fichier valide trouvé (formats acceptés: PDF, DOCX, ZIP)"
+        )
+    dossier_files, file_hashes, missing = await run_in_threadpool(profiled_call, _resolve_files, uploaded, known)
+    if missing:
+        close_files(dossier_files)
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Fichiers inconnus du serveur : à uploader", "unknown": missing},
+        )
+    return dossier_files, file_hashes
+
+
+def _parse_known_files(known_files: Optional[str]) -> List[KnownFile]:
+    if not known_files:
+        return []
+    try:
+        return _KNOWN_FILES.validate_json(known_files)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"known_files invalide : {e.errors(include_url=False)}")
+
+
+@lru_cache(maxsize=1)
+def _extractor_version() -> str:
+    """Version d'extraction du processus (charge les bibliothèques d'extraction au premier appel)."""
+    return TextExtractor.version(settings.OCR_DPI)
+
+
+def _known_hashes(hashes: List[str]) -> Set[str]:
+    return archive.known_hashes(hashes, _extractor_version())
+
+
+def _resolve_files(
+    uploaded: List[DossierFile],
+    known: List[KnownFile],
+) -> Tuple[List[DossierFile], List[Tuple[str, str]], List[str]]:
+    """Remplace par l'extraction archivée ce qui est déjà connu ; renvoie aussi les hachés introuvables."""
+    dossier_files: List[DossierFile] = []
+    file_hashes: List[Tuple[str, str]] = []
+    missing: List[str] = []
+    for item in uploaded:
+        if isinstance(item, ZipDossier):
+            # Le mémo reconnaît une archive identique sans la décompresser
+            file_hashes.append((item.filename, item.content_hash))
+            dossier_files.append(item)
+            continue
+        filename, content = item
+        sha = content_hash(content)
+        file_hashes.append((filename, sha))
+        archived = archive.get_extracted(sha, filename, _extractor_version()) if archive is not None else None
+        CACHE_REQUESTS.inc(cache="extraction", result="miss" if archived is None else "hit")
+        dossier_files.append(archived or (filename, content))
+    for item in known:
+        sha = item.sha256.lower()
+        archived = archive.get_extracted(sha, item.filename, _extractor_version()) if archive is not None else None
+        CACHE_REQUESTS.inc(cache="extraction", result="miss" if archived is None else "hit")
+        if archived is None:
+            missing.append(sha)
+            continue
+        file_hashes.append((item.filename, sha))
+        dossier_files.append(archived)
+    return dossier_files, file_hashes, missing
+
+
+def _reused_count(dossier_files: List[DossierFile]) -> int:
+    return sum(1 for item in dossier_files if isinstance(item, ExtractedFile))
+
+
+async def _estimate_cost(dossier_files: List[DossierFile]) -> JobCost:
+    pages, scanned_pages = await run_in_threadpool(profiled_call, probe_files, dossier_files)
+    return work_scheduler.cost(pages, scanned_pages)
+
+
+def _client_id(request: Request) -> str:
+    """Client pour l'équité : en-tête X-Client-Id, à défaut l'adresse IP."""
+    client_id = request.headers.get("x-client-id", "").strip()[:128]
+    if client_id:
+        return client_id
+    return request.client.host if request.client else "anonymous"
+
+
+async def _memo_lookup(
+    file_hashes: List[Tuple[str, str]],
+    case_type: str,
+) -> Tuple[str, Optional[AnalysisReport]]:
+    """Clé du dossier dans le mémo, et le rapport déjà produit s'il est encore conservé."""
+    return await run_in_threadpool(profiled_call, _memo_report, file_hashes, case_type)
+
+
+def _memo_report(
+    file_hashes: List[Tuple[str, str]],
+    case_type: str,
+) -> Tuple[str, Optional[AnalysisReport]]:
+    # Bloquant : version des règles (disque) et de l'extraction, état partagé, débordement, archive
+    memo_key = report_memo.key(file_hashes, case_type, _extractor_version())
+    report_id = report_memo.get(memo_key)
+    if report_id is None:
+        return memo_key, None
+    report = _load_report(report_id)
+    if report is None:
+        # Rapport ni en mémoire ni archivé : l'entrée ne sert plus
+        report_memo.discard(memo_key)
+    return memo_key, report
+
+
+def _bind_session(report: AnalysisReport, session_id: Optional[str]) -> None:
+    # Rattacher le rapport à la session pour le chatbot
+    if session_id:
+        sessions.set_report(session_id, report)
+
+
+def _store_result(
+    result: AnalysisResult,
+    case_type: str,
+    session_id: Optional[str],
+    memo_key: Optional[str] = None,
+) -> str:
+    """
+    Signale les pièces déjà déposées dans d'autres dossiers, conserve le
+    rapport côté serveur (et pour la session), l'archive ; renvoie son report_id.
+
+    Appelé hors de la boucle asyncio (écriture SQLite).
+    """
+    report = result.report
+    if archive is not None:
+        try:
+            archive.flag_resubmissions(result)
+        except Exception as e:
+            logger.exception("Recherche des pièces redéposées impossible: %s", e)
+    # Le chat n'enverra plus que l'identifiant du rapport
+    report.report_id = compute_report_id(report)
+    reports.set_report(report.report_id, report)
+    _bind_session(report, session_id)
+    if result.degraded:
+        # OCR en mode mémoire dégradé : servi une fois, mais un dossier identique
+        # soumis plus tard doit être réanalysé à pleine qualité
+        logger.info("Rapport %s issu d'un OCR dégradé : ni mémorisé ni archivé", report.report_id)
+        return report.report_id
+    if memo_key:
+        report_memo.set(memo_key, report.report_id)
+    if archive is not None:
+        try:
+            archive.save_result(result, case_type, _extractor_version())
+        except Exception as e:
+            # L'archive ne doit pas faire échouer une analyse réussie
+            logger.exception("Échec de l'archivage du dossier %s: %s", report.report_id, e)
+    return report.report_id
+
+
+def _load_report(report_id: str) -> Optional[AnalysisReport]:
+    """Rapport en mémoire, à défaut relu depuis l'archive (puis remis en mémoire)."""
+    report = reports.get_report(report_id)
+    if report is None and archive is not None:
+        report = archive.get_report(report_id)
+        if report is not None:
+            reports.set_report(report_id, report)
+    return report
+
+
+@router.post("/jobs", response_model=AnalysisJobInfo, status_code=202)
+async def create_analysis_job(
+    request: Request,
+    files: List[UploadFile] = File([]),
+    known_files: Optional[str] = Form(None, description=KNOWN_FILES_DESCRIPTION),
+    case_type: str = Query("PC", description="Type de dossier: PC (permis de construire) ou PA (permis d'aménager)"),
+    session_id: Optional[str] = Query(
+        None,
+        max_length=128,
+        description="Session (ou dossier) à laquelle rattacher le rapport pour le chat",
+    ),
+    deadline_s: Optional[float] = Query(
+        None,
+        gt=0,
+        description="Échéance du job en secondes, attente en file comprise (défaut : ANALYSIS_DEADLINE_S)",
+    ),
+    cancel_on_disconnect: bool = Query(
+        False,
+        description="Annule le job quand plus aucun client ne suit son flux d'événements",
+    ),
+):
+    """
+    Met l'analyse d'un dossier en file et rend la main immédiatement.
+
+    La progression se suit via GET /api/jobs/{job_id} ou en SSE via
+    GET /api/jobs/{job_id}/events ; le rapport final est conservé sous son `report_id`.
+    Le coût estimé (pages, pages à OCRiser) place le job en voie rapide ou lente.
+    DELETE /api/jobs/{job_id} annule le job. Comme /api/analyze, accepte des
+    fichiers déjà connus du serveur (`known_files`) à la place d'uploads.
+    """
+    dossier_files, file_hashes = await _collect_files(files, known_files)
+
+    # Dossier déjà analysé : job terminé d'emblée
+    memo_key, cached = await _memo_lookup(file_hashes, case_type)
+    if cached is not None:
+        close_files(dossier_files)
+        await run_in_threadpool(_bind_session, cached, session_id)
+        job = jobs.submit_cached(
+            [name for item in dossier_files for name in file_names(item)],
+            cached.report_id,
+            case_type=case_type,
+            client_id=_client_id(request),
+            session_id=session_id,
+        )
+        return _job_info(job.info())
+
+    cost = await _estimate_cost(dossier_files)
+    try:
+        job = jobs.submit(
+            dossier_files,
+            cost,
+            case_type=case_type,
+            client_id=_client_id(request),
+            session_id=session_id,
+            memo_key=memo_key,
+            deadline_s=deadline_s or settings.ANALYSIS_DEADLINE_S,
+            cancel_on_disconnect=cancel_on_disconnect,
+        )
+    except JobQueueFullError as e:
+        close_files(dossier_files)
+        raise HTTPException(
+            status_code=429,
+            detail="Trop d'analyses en attente, veuillez réessayer plus tard",
+            headers={"Retry-After": str(e.retry_after_s)},
+        )
+    return _job_info(job.info())
+
+
+async def _get_job(job_id: str) -> Tuple[Optional[AnalysisJob], Dict[str, Any]]:
+    """Job de ce processus, à défaut état d'un job d'un autre worker (job None)."""
+    job = jobs.get(job_id)
+    if job is not None:
+        return job, job.info()
+    info = await run_in_threadpool(jobs.remote_info, job_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Job inconnu ou expiré")
+    return None, info
+
+
+def _job_info(info: Dict[str, Any], with_report: bool = False) -> AnalysisJobInfo:
+    report_id = info.get("report_id")
+    report = _load_report(report_id) if with_report and report_id else None
+    return AnalysisJobInfo(**info, report=report)
+
+
+@router.get("/jobs/{job_id}", response_model=AnalysisJobInfo)
+async def get_analysis_job(job_id: str):
+    """État d'un job d'analyse : dernière étape, puis rapport une fois terminé."""
+    _, info = await _get_job(job_id)
+    return await run_in_threadpool(_job_info, info, True)
+
+
+@router.delete("/jobs/{job_id}", response_model=AnalysisJobInfo, status_code=202)
+async def cancel_analysis_job(job_id: str):
+    """
+    Annule un job : immédiatement s'il est en file, à la page suivante s'il tourne.
+
+    Le statut passe à "cancelled" une fois l'extraction arrêtée.
+    """
+    job, info = await _get_job(job_id)
+    if job is None:
+        # Job d'un autre worker : il relève la demande à son prochain passage
+        if info["status"] in JobStatus.FINISHED:
+            raise HTTPException(status_code=409, detail="Job déjà terminé")
+        await run_in_threadpool(jobs.request_remote_cancel, job_id, CancelReason.CLIENT)
+        return _job_info(info)
+    if not jobs.cancel(job, CancelReason.CLIENT):
+        raise HTTPException(status_code=409, detail="Job déjà terminé")
+    return _job_info(job.info())
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_analysis_job(job_id: str, request: Request):
+    """
+    Progression d'un job en Server-Sent Events.
+
+    Événements : `progress` (queued, extracting, ocr page n/m, identifying,
+    evaluating), puis `done` avec le rapport complet, `failed` ou `cancelled`.
+    `Last-Event-ID` reprend le flux après une reconnexion.
+    """
+    job, _ = await _get_job(job_id)
+    try:
+        start = max(0, int(request.headers.get("last-event-id", "-1")) + 1)
+    except ValueError:
+        start = 0
+    # Job d'un autre worker : événements relus dans l'état partagé
+    events = jobs.events(job, start=start) if job is not None else jobs.remote_events(job_id, start=start)
+
+    async def event_stream() -> AsyncIterator[str]:
+        async for event in events:
+            if await request.is_disconnected():
+                return
+            if event["stage"] == JobStatus.DONE:
+                report_id = event.get("report_id")
+                report = await run_in_threadpool(_load_report, report_id) if report_id else None
+                data = {**event, "report": report.model_dump(mode="json") if report else None}
+                yield _sse_event(JobStatus.DONE, data, event_id=event["seq"])
+            elif event["stage"] in (JobStatus.FAILED, JobStatus.CANCELLED):
+                yield _sse_event(event["stage"], event, event_id=event["seq"])
+            else:
+                yield _sse_event("progress", event, event_id=event["seq"])
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _etag(report_id: str) -> str:
+    return f'"{report_id}"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match", "")
+    return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+
+
+def _resolve_report(
+    report: Optional[AnalysisReport],
+    report_id: Optional[str],
+    session_id: Optional[str],
+) -> Optional[AnalysisReport]:
+    """
+    Rapport de la requête : fourni en entier, par identifiant, ou celui de la session.
+
+    Le rapport retrouvé est mémorisé pour la session. Un `report_id` inconnu
+    (expiré, serveur redémarré) donne une 404 : le client renvoie alors le rapport.
+    """
+    if report is None and report_id:
+        report = _load_report(report_id)
+        if report is None:
+            raise HTTPException(status_code=404, detail="Rapport inconnu ou expiré")
+
+    if not session_id:
+        return report
+    current = sessions.get_report(session_id)
+    if report is None:
+        return current
+    # On ne réécrit la session que si le rapport a changé
+    if current is None or report.report_id is None or current.report_id != report.report_id:
+        sessions.set_report(session_id, report)
+    return report
+
+
+@router.get("/reports/{report_id}", response_model=AnalysisReport)
+async def get_report(report_id: str, request: Request, response: Response):
+    """
+    Rapport conservé côté serveur.
+
+    Requête conditionnelle : avec `If-None-Match` égal à l'ETag courant,
+    la réponse est une 304 sans corps. Un rapport sorti de la mémoire est relu
+    depuis l'archive.
+    """
+    report = await run_in_threadpool(_load_report, report_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Rapport inconnu ou expiré")
+
+    etag = _etag(report_id)
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return report
+
+
+def _get_archive() -> DossierArchive:
+    if archive is None:
+        raise HTTPException(status_code=503, detail="Archive des dossiers désactivée")
+    return archive
+
+
+@router.get("/dossiers", response_model=DossierList)
+async def list_dossiers(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[int] = Query(None, description="`next_cursor` de la page précédente"),
+    reference: Optional[str] = Query(None, description="Référence cadastrale exacte"),
+    case_type: Optional[str] = Query(None, description="PC ou PA"),
+    since: Optional[float] = Query(None, description="Archivés à partir de (timestamp Unix)"),
+    until: Optional[float] = Query(None, description="Archivés avant (timestamp Unix)"),
+):
+    """Dossiers archivés, du plus récent au plus ancien, paginés par curseur."""
+    items, next_cursor = await run_in_threadpool(
+        _get_archive().list_dossiers, limit, cursor, reference, case_type, since, until
+    )
+    return DossierList(items=items, next_cursor=next_cursor)
+
+
+@router.get("/dossiers/{dossier_id}", response_model=DossierDetail)
+async def get_dossier(dossier_id: int):
+    """Dossier archivé : pièces identifiées, fichiers, infos projet et écarts."""
+    dossier = await run_in_threadpool(_get_archive().get_dossier, dossier_id)
+    if dossier is None:
+        raise HTTPException(status_code=404, detail="Dossier inconnu")
+    return dossier
+
+
+@router.get("/issues/{code}/dossiers", response_model=IssueDossierList)
+async def list_issue_dossiers(
+    code: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[int] = Query(None, description="`next_cursor` de la page précédente"),
+):
+    """Dossiers archivés présentant un écart donné (ex. MISSING_SURFACE)."""
+    items, next_cursor = await run_in_threadpool(_get_archive().list_issues, code, limit, cursor)
+    return IssueDossierList(items=items, next_cursor=next_cursor)
+
+
+@router.post("/files/check", response_model=FileCheckResponse)
+async def check_files(request: FileCheckRequest):
+    """
+    Indique, parmi des SHA-256, les fichiers dont le serveur a déjà l'extraction.
+
+    Le client n'uploade que les inconnus et cite les autres dans `known_files`
+    de /api/analyze ou /api/jobs. Sans archive, tout est inconnu.
+    """
+    hashes = list(dict.fromkeys(sha.lower() for sha in request.hashes))
+    known = await run_in_threadpool(_known_hashes, hashes) if archive is not None else set()
+    return FileCheckResponse(
+        known=[sha for sha in hashes if sha in known],
+        unknown=[sha for sha in hashes if sha not in known],
+    )
+
+
+@router.get("/search", response_model=SearchResults)
+async def search_archive(
+    q: str = Query(..., min_length=1, max_length=500, description="Mots recherchés (ET implicite, `*` final = préfixe)"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000, description="`next_offset` de la page précédente"),
+):
+    """
+    Recherche plein texte dans l'archive : texte des pages et infos projet
+    (adresse, référence cadastrale, surfaces).
+
+    Résultats classés par pertinence, termes trouvés entourés de `<mark>`.
+    """
+    if not match_query(q):
+        raise HTTPException(status_code=400, detail="Requête de recherche vide")
+    store = _get_archive()
+    started = time.perf_counter()
+    hits = await run_in_threadpool(store.search, q, limit + 1, offset)
+    took_ms = round((time.perf_counter() - started) * 1000, 2)
+    return SearchResults(
+        query=q,
+        items=hits[:limit],
+        next_offset=offset + limit if len(hits) > limit else None,
+        took_ms=took_ms,
+    )
+
+
+@router.get("/profiles", response_model=List[ProfileInfo])
+async def list_profiles(request: Request):
+    """Profils d'analyses enregistrés, du plus récent au plus ancien (jeton de profilage requis)."""
+    store = _check_profile_token(request)
+    return await run_in_threadpool(store.list)
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    request: Request,
+    fmt: str = Query(
+        "speedscope",
+        alias="format",
+        pattern="^(speedscope|folded)$",
+        description="speedscope (JSON, https://www.speedscope.app) ou folded (piles repliées, flamegraph.pl)",
+    ),
+):
+    """Télécharge un profil d'analyse (jeton de profilage requis)."""
+    store = _check_profile_token(request)
+    path = store.speedscope_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profil introuvable")
+    if fmt == "speedscope":
+        return FileResponse(path, media_type="application/json", filename=f"{profile_id}.speedscope.json")
+    text = await run_in_threadpool(_folded_profile, store, profile_id, path)
+    return PlainTextResponse(
+        text, headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded.txt"'},
+    )
+
+
+def _folded_profile(store: ProfileStore, profile_id: str, path: str) -> str:
+    meta = store.meta(profile_id) or {}
+    with open(path, "r", encoding="utf-8") as f:
+        return folded(json.load(f), meta.get("interval_s", settings.PROFILE_INTERVAL_S))
+
+
 @router.post("/chat", response_model=ChatMessage)
 async def chat(request: ChatRequest):
     """
@@ -88,25 +910,215 @@ async def chat(request: ChatRequest):
     if not request.message.strip():
         raise HTTPException(status_code=400, detail="Message vide")
     
-    # Mettre à jour le rapport si fourni
-    if request.report:
-        chatbot.set_report(request.report)
-
     # Essayer d'abord d'utiliser Jan.ai via RAGService (même sans retrieval pour l'instant),
     # avec fallback sur le chatbot rule-based.
-    report = request.report or getattr(chatbot, "report", None)
+    report, conversation = await run_in_threadpool(_chat_context, request)
+
+    reply = await _chat_reply(request, report, conversation)
+
+    # Historique borné de la session (pour les questions de suivi)
+    if request.session_id:
+        await run_in_threadpool(conversations.append, request.session_id, request.message, reply.content)
+    return reply
+
+
+def _chat_context(request: ChatRequest) -> Tuple[Optional[AnalysisReport], Optional[Conversation]]:
+    """Rapport et historique de la session (bloquant : archive, état partagé, disque)."""
+    report = _resolve_report(request.report, request.report_id, request.session_id)
+    conversation = conversations.get(request.session_id) if request.session_id else None
+    return report, conversation
+
+
+async def _chat_reply(
+    request: ChatRequest,
+    report: Optional[AnalysisReport],
+    conversation: Optional[Conversation],
+) -> ChatMessage:
+    """Réponse Jan.ai (explication pré-générée, budget de latence) ou rule-based."""
+    # Disjoncteur ouvert : Jan.ai est en panne, on répond tout de suite en rule-based
+    if report and jan_client.is_available():
+        budget_ms = request.latency_budget_ms
+        if budget_ms is None:
+            budget_ms = settings.CHAT_LATENCY_BUDGET_MS
+
+        # Explication globale déjà générée (ou en cours) : on la réutilise, pour une
+        # question reconnue exactement (une intention floue peut être une autre question)
+        intent = ChatbotService.detect_intent(request.message)
+        explains = intent is not None and intent.exact and intent.handler in EXPLANATION_INTENTS
+        if explains and await rag_service.has_explanation(report):
+            # Génération encore en cours : même budget que pour une réponse Jan.ai
+            if budget_ms is not None:
+                return await _hedged_answer(
+                    report, request.message, budget_ms, llm_call=rag_service.get_explanation(report)
+                )
+            try:
+                explanation = await rag_service.get_explanation(report)
+                return ChatMessage(role="assistant", content=explanation, source="llm")
+            except Exception as e:
+                logger.exception("Explication pré-générée indisponible: %s", e)
+
+        if budget_ms is not None:
+            return await _hedged_answer(report, request.message, budget_ms, conversation)
 
-    if report:
         try:
-            ai_response = await rag_service.answer(report=report, user_message=request.message)
-            return ChatMessage(role="assistant", content=ai_response)
+            ai_response = await rag_service.answer(
+                report=report, user_message=request.message, conversation=conversation
+            )
+            return ChatMessage(role="assistant", content=ai_response, source="llm")
         except Exception as e:
             # En cas d'erreur d'appel Jan.ai, on retombe sur le chatbot rule-based
             logger.exception("Échec appel Jan.ai (fallback chatbot rule-based): %s", e)
 
     # Fallback : chatbot rule-based actuel
-    response = chatbot.get_response(request.message)
-    return ChatMessage(role="assistant", content=response)
+    response = ChatbotService(report).get_response(request.message)
+    return ChatMessage(role="assistant", content=response, source="rules")
+
+
+async def _hedged_answer(
+    report: AnalysisReport,
+    message: str,
+    budget_ms: int,
+    conversation: Optional[Conversation] = None,
+    llm_call: Optional[Awaitable[str]] = None,
+) -> ChatMessage:
+    """
+    Lance Jan.ai et le chatbot rule-based en parallèle.
+
+    Si Jan.ai répond dans le budget, sa réponse est renvoyée ; sinon on renvoie
+    la réponse rule-based avec un `upgrade_id` permettant de récupérer la
+    réponse Jan.ai plus tard (GET /chat/upgrades/{upgrade_id}).
+
+    `llm_call` remplace la réponse Jan.ai à la question (explication en cours
+    de génération, par exemple).
+    """
+    if llm_call is None:
+        llm_call = rag_service.answer(report=report, user_message=message, conversation=conversation)
+    llm_task = asyncio.ensure_future(llm_call)
+    fallback = ChatbotService(report).get_response(message)
+
+    try:
+        ai_response = await asyncio.wait_for(asyncio.shield(llm_task), timeout=budget_ms / 1000)
+        return ChatMessage(role="assistant", content=ai_response, source="llm")
+    except asyncio.TimeoutError:
+        upgrade_id = await pending_answers.add(llm_task)
+        return ChatMessage(role="assistant", content=fallback, source="rules", upgrade_id=upgrade_id)
+    except asyncio.CancelledError:
+        # Client parti : inutile de poursuivre la génération
+        llm_task.cancel()
+        raise
+    except Exception as e:
+        logger.exception("Échec appel Jan.ai (fallback chatbot rule-based): %s", e)
+        return ChatMessage(role="assistant", content=fallback, source="rules")
+
+
+@router.get("/chat/upgrades/{upgrade_id}", response_model=ChatUpgrade)
+async def chat_upgrade(
+    upgrade_id: str,
+    wait_s: float = Query(0, ge=0, le=30, description="Attente maximale (s) si la réponse n'est pas prête"),
+):
+    """
+    Récupère la réponse Jan.ai d'un message servi en rule-based faute de temps.
+
+    Avec `wait_s` > 0, la requête attend la fin de la génération (attente longue).
+    """
+    outcome = await pending_answers.result(upgrade_id, wait_s)
+    if outcome is None:
+        raise HTTPException(status_code=404, detail="Réponse inconnue ou expirée")
+    status, content = outcome
+    if content is None:
+        return ChatUpgrade(status=status)
+    return ChatUpgrade(
+        status=status,
+        message=ChatMessage(role="assistant", content=content, source="llm"),
+    )
+
+
+def _sse_event(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    """Formate un événement server-sent events."""
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """
+    Variante streaming de /chat (server-sent events).
+
+    Événements émis :
+    - `token` : morceau de réponse Jan.ai ({"content": "..."})
+    - `fallback` : réponse complète du chatbot rule-based si Jan.ai échoue
+      (remplace le texte partiel éventuellement reçu)
+    - `done` : fin du flux
+    """
+    if not request.message.strip():
+        raise HTTPException(status_code=400, detail="Message vide")
+
+    report, conversation = await run_in_threadpool(_chat_context, request)
+
+    async def remember(answer: str) -> None:
+        if request.session_id:
+            await run_in_threadpool(conversations.append, request.session_id, request.message, answer)
+
+    async def event_stream() -> AsyncIterator[str]:
+        if report and jan_client.is_available():
+            parts: List[str] = []
+            try:
+                async for chunk in rag_service.answer_stream(
+                    report=report, user_message=request.message, conversation=conversation
+                ):
+                    if await http_request.is_disconnected():
+                        # Le client est parti : on arrête (ferme aussi le flux Jan.ai)
+                        logger.info("Client déconnecté, arrêt du streaming Jan.ai")
+                        return
+                    parts.append(chunk)
+                    yield _sse_event("token", {"content": chunk})
+                await remember("".join(parts))
+                yield _sse_event("done", {"source": "llm"})
+                return
+            except Exception as e:
+                logger.exception("Échec streaming Jan.ai (fallback chatbot rule-based): %s", e)
+
+        response = ChatbotService(report).get_response(request.message)
+        await remember(response)
+        yield _sse_event("fallback", {"content": response})
+        yield _sse_event("done", {"source": "rules"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _queue_full_error(error: LLMQueueFullError) -> HTTPException:
+    """File Jan.ai saturée : 429 avec l'attente estimée en Retry-After."""
+    return HTTPException(
+        status_code=429,
+        detail="Assistant IA surchargé, veuillez réessayer dans quelques instants",
+        headers={"Retry-After": str(error.retry_after_s)},
+    )
+
+
+@router.post("/explain", response_model=ChatMessage)
+async def explain(request: ExplainRequest):
+    """
+    Explication pédagogique des non-conformités du dossier.
+
+    Retourne l'explication pré-générée si elle existe, attend la génération
+    en cours le cas échéant, sinon la lance.
+    """
+    report = await run_in_threadpool(_resolve_report, request.report, request.report_id, request.session_id)
+    if not report:
+        raise HTTPException(status_code=400, detail="Aucun rapport d'analyse disponible")
+
+    try:
+        explanation = await rag_service.get_explanation(report)
+    except LLMQueueFullError as e:
+        raise _queue_full_error(e)
+    except Exception as e:
+        logger.exception("Échec génération de l'explication: %s", e)
+        raise HTTPException(status_code=502, detail="Jan.ai indisponible pour générer l'explication")
+    return ChatMessage(role="assistant", content=explanation)
 
 
 @router.get("/jan/ping")
@@ -121,16 +1133,70 @@ async def jan_ping():
             [
                 {"role": "system", "content": "Tu réponds uniquement 'pong'."},
                 {"role": "user", "content": "ping"},
-            ]
+            ],
+            priority=LLMPriority.PING,
+            kind=LLMRequestKind.PING,
         )
         return {"ok": True, "response": content}
+    except LLMQueueFullError as e:
+        raise _queue_full_error(e)
     except Exception as e:
         logger.exception("Jan.ai ping failed: %s", e)
         return {"ok": False, "error": str(e)}
 
 
+@router.get("/jan/status")
+async def jan_status():
+    """État du disjoncteur et de la file d'attente Jan.ai, sans appeler le modèle."""
+    return {
+        "available": jan_client.is_available(),
+        "breaker": jan_client.breaker.snapshot(),
+        "queue": jan_client.scheduler.snapshot(),
+        "single_flight": jan_client.single_flight.snapshot(),
+        "routing": jan_client.router.snapshot(),
+    }
+
+
+def publish_metrics() -> None:
+    """Recopie les métriques de ce processus dans l'état partagé (bloquant)."""
+    shared_state.set(
+        "metrics", metrics.process_key(), metrics.REGISTRY.snapshot(),
+        ttl_s=4 * settings.METRICS_PUBLISH_INTERVAL_S,
+    )
+
+
+async def publish_metrics_periodically() -> None:
+    """Tâche de fond d'un worker (plusieurs workers seulement)."""
+    while True:
+        await asyncio.sleep(settings.METRICS_PUBLISH_INTERVAL_S)
+        try:
+            await run_in_threadpool(publish_metrics)
+        except Exception:
+            logger.exception("Publication des métriques impossible")
+
+
+def metrics_text() -> str:
+    """Métriques au format Prometheus, tous workers confondus (bloquant)."""
+    if shared_state is None:
+        return metrics.REGISTRY.render()
+    own = metrics.process_key()
+    publish_metrics()
+    others = [snapshot for key, snapshot in shared_state.items("metrics").items() if key != own]
+    return metrics.REGISTRY.render(others)
+
+
 @router.get("/health")
 async def health_check():
     """Vérifie que l'API est fonctionnelle"""
-    return {"status": "ok", "service": "Aqua Verify API"}
+    return {
+        "status": "ok",
+        "service": "Aqua Verify API",
+        "sessions": sessions.stats(),
+        "jobs": jobs.snapshot(),
+        "cancellations": cancellations.snapshot(),
+        "report_memo": report_memo.stats(),
+        "archive": await run_in_threadpool(archive.stats) if archive is not None else None,
+        "shared_state": await run_in_threadpool(shared_state.stats) if shared_state is not None else None,
+        "backends": backends.snapshot(),
+    }
 
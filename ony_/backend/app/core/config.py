@@ -4,8 +4,8 @@ Configuration de l'application Aqua Verify
 from __future__ import annotations
 
 from pydantic_settings import BaseSettings
-from typing import List
-from pydantic import field_validator
+from typing import List, Optional
+from pydantic import field_validator, model_validator
 
 
 class Settings(BaseSettings):
@@ -39,10 +39,111 @@ class Settings(BaseSettings):
     # CORS
     CORS_ORIGINS: List[str] = ["http://localhost:5173", "http://localhost:3000"]
     
+    # Chat : budget de latence par défaut (ms) avant de servir la réponse rule-based.
+    # None = on attend Jan.ai (comportement historique).
+    CHAT_LATENCY_BUDGET_MS: Optional[int] = None
+
+    # Historique de conversation : budget (tokens estimés) des derniers échanges
+    # gardés mot pour mot, et du résumé glissant des plus anciens.
+    CHAT_HISTORY_TOKEN_BUDGET: int = 800
+    CHAT_SUMMARY_TOKEN_BUDGET: int = 300
+
+    # Sessions (rapport d'analyse par instructeur) : expiration, plafonds mémoire,
+    # et répertoire de débordement disque (partagé entre workers si renseigné).
+    SESSION_TTL_S: int = 3600
+    SESSION_MAX_BYTES: int = 256 * 1024 * 1024  # 256 MB
+    SESSION_MAX_ENTRIES: int = 500
+    SESSION_SPILL_DIR: Optional[str] = None
+
+    # Rapports conservés côté serveur (GET /api/reports/{id}, report_id dans /chat)
+    REPORT_TTL_S: int = 24 * 3600
+    REPORT_MAX_BYTES: int = 512 * 1024 * 1024  # 512 MB
+    REPORT_MAX_ENTRIES: int = 2000
+    REPORT_SPILL_DIR: Optional[str] = None
+    # Archive SQLite (WAL) des dossiers analysés : texte par page, identifications,
+    # infos projet, écarts. None = pas d'archive.
+    ARCHIVE_DB_PATH: Optional[str] = "storage/aqua_verify.sqlite3"
+
+    # Dossiers en archive ZIP : limites contrôlées avant décompression (zip bombs)
+    ZIP_MAX_MEMBERS: int = 500
+    ZIP_MAX_MEMBER_BYTES: int = 200 * 1024 * 1024  # 200 MB décompressés par fichier
+    ZIP_MAX_TOTAL_BYTES: int = 1024 * 1024 * 1024  # 1 GB décompressé par archive
+    ZIP_MAX_RATIO: float = 100.0  # taux de compression maximal d'un fichier
+
+    # Mémo dossier -> rapport : un dossier renvoyé à l'identique n'est pas ré-analysé
+    REPORT_MEMO_MAX_ENTRIES: int = 2000
+
+    # Analyse : pages extraites / OCRisées en parallèle (≈ cœurs CPU disponibles)
+    ANALYSIS_WORKERS: int = 2
+    # Jobs (/api/jobs) en cours simultanément (ils se partagent les créneaux de pages),
+    # et nombre de jobs gardés en mémoire pour le suivi de progression.
+    ANALYSIS_MAX_ACTIVE_JOBS: int = 8
+    ANALYSIS_MAX_JOBS: int = 200
+    # Jobs en attente au plus : au-delà, POST /api/jobs répond 429 (Retry-After)
+    ANALYSIS_MAX_QUEUED_JOBS: int = 50
+    # Coût estimé d'un dossier = pages natives + pages scannées × ANALYSIS_OCR_PAGE_COST.
+    # Sous ANALYSIS_FAST_LANE_MAX_COST, le dossier passe en voie rapide ; celle-ci
+    # obtient jusqu'à ANALYSIS_FAST_LANE_WEIGHT créneaux pour un de la voie lente.
+    ANALYSIS_OCR_PAGE_COST: float = 10.0
+    ANALYSIS_FAST_LANE_MAX_COST: float = 30.0
+    ANALYSIS_FAST_LANE_WEIGHT: int = 4
+    # Échéance par défaut d'une analyse (secondes, None = aucune) ; au-delà, l'extraction
+    # s'arrête à la page suivante. Un job `cancel_on_disconnect` sans client abonné
+    # à son flux d'événements est annulé après JOB_DISCONNECT_GRACE_S.
+    ANALYSIS_DEADLINE_S: Optional[float] = None
+    JOB_DISCONNECT_GRACE_S: float = 15.0
+    # Budget mémoire d'une analyse (Mo, None = illimité) : croissance du RSS du
+    # worker (et des allocations Python si MEMORY_TRACK_PYTHON) depuis son début.
+    # Au-delà de MEMORY_DEGRADE_RATIO du budget, les pages sont rendues pour l'OCR
+    # en niveaux de gris à MEMORY_DEGRADED_OCR_SCALE × OCR_DPI, une à la fois dans le
+    # processus ; au-delà du budget, l'analyse est refusée (413) au lieu de faire
+    # tuer le worker. Les pics sont publiés dans /metrics et journalisés.
+    ANALYSIS_MEMORY_BUDGET_MB: Optional[int] = None
+    MEMORY_DEGRADE_RATIO: float = 0.6
+    OCR_DPI: int = 72
+    MEMORY_DEGRADED_OCR_SCALE: float = 0.6
+    # tracemalloc : mesure les allocations Python, mais ralentit toutes les allocations
+    MEMORY_TRACK_PYTHON: bool = False
+
+    # Production : nombre de processus workers uvicorn (python main.py).
+    # Chaque processus a ses propres créneaux de pages : au total
+    # WEB_WORKERS × ANALYSIS_WORKERS pages traitées en parallèle, à dimensionner
+    # d'après les cœurs CPU. Au-delà d'un worker, les jobs, conversations, mémo
+    # et réponses Jan.ai différées passent par SHARED_STATE_DB_PATH, et les
+    # rapports débordent dans storage/ (SESSION_SPILL_DIR / REPORT_SPILL_DIR
+    # par défaut) pour être visibles de tous les workers.
+    WEB_WORKERS: int = 1
+    SHARED_STATE_DB_PATH: str = "storage/shared_state.sqlite3"
+    # Les bibliothèques lourdes (PyMuPDF, Tesseract, python-docx...) sont importées
+    # au premier usage. Si activé, chaque worker les charge et les vérifie au
+    # démarrage, avant d'accepter des requêtes : démarrage plus lent, mais la
+    # première analyse ne paie pas le chargement.
+    WARM_UP_BACKENDS: bool = False
+    # Plusieurs workers : fréquence de publication des métriques de chaque
+    # processus dans l'état partagé (GET /metrics les additionne)
+    METRICS_PUBLISH_INTERVAL_S: float = 15.0
+    # Profilage à la demande d'une analyse : /api/analyze avec l'en-tête
+    # X-Profile-Token égal à PROFILING_TOKEN est échantillonnée toutes les
+    # PROFILE_INTERVAL_S (en-tête seulement : un paramètre d'URL finirait dans les
+    # journaux d'accès) ; profil speedscope conservé dans PROFILE_DIR
+    # (partagé entre workers), PROFILE_MAX_PROFILES au plus. Désactivé si vide.
+    PROFILING_TOKEN: Optional[str] = None
+    PROFILE_DIR: str = "storage/profiles"
+    PROFILE_INTERVAL_S: float = 0.005
+    PROFILE_MAX_DURATION_S: float = 300.0
+    PROFILE_MAX_PROFILES: int = 50
+
     # Upload
     MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50 MB
     ALLOWED_EXTENSIONS: List[str] = [".pdf", ".docx", ".doc"]
     
+    @model_validator(mode="after")
+    def _default_shared_spill_dirs(self) -> "Settings":
+        if self.WEB_WORKERS > 1:
+            self.SESSION_SPILL_DIR = self.SESSION_SPILL_DIR or "storage/sessions"
+            self.REPORT_SPILL_DIR = self.REPORT_SPILL_DIR or "storage/reports"
+        return self
+
     class Config:
         env_file = ".env"
 
@@ -2,7 +2,7 @@
 Modèles de données pour les documents
 """
 from enum import Enum
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -50,6 +50,11 @@ class Document(BaseModel):
     # Texte complet OCRisé (utile pour extraction d'infos), non renvoyé au frontend
     full_text: Optional[str] = Field(default=None, exclude=True)
     issues: List[str] = []  # Problèmes détectés
+    # Quasi-doublon : variante analysée à sa place, et similarité estimée (0-1)
+    duplicate_of: Optional[str] = None
+    similarity: Optional[float] = None
+    # Dossiers archivés (report_id) contenant déjà cette pièce ou une quasi-copie
+    resubmitted_in: List[str] = []
 
 
 class ProjectInfo(BaseModel):
@@ -94,16 +99,167 @@ class AnalysisReport(BaseModel):
     total_documents: int
     conformity_score: float  # Pourcentage de conformité
     compliance_issues: List[ComplianceIssue] = []  # écarts réglementaires (au-delà de la complétude)
+    # Quasi-doublons d'une pièce du dossier : non analysés, hors score
+    documents_doublons: List[Document] = []
+    # Identifiant du rapport conservé côté serveur (à renvoyer à /chat au lieu du rapport)
+    report_id: Optional[str] = None
 
 
 class ChatMessage(BaseModel):
     """Message du chatbot"""
     role: str  # "user" ou "assistant"
     content: str
+    source: Optional[str] = None  # "llm" (Jan.ai) ou "rules" (chatbot rule-based)
+    # Si la réponse rule-based a été servie faute de temps : id de la réponse Jan.ai à venir
+    upgrade_id: Optional[str] = None
 
 
 class ChatRequest(BaseModel):
     """Requête au chatbot"""
     message: str
     report: Optional[AnalysisReport] = None
+    # Rapport conservé côté serveur (évite de renvoyer le rapport complet à chaque message)
+    report_id: Optional[str] = Field(default=None, max_length=64)
+    # Budget de latence (ms) : au-delà, la réponse rule-based est renvoyée immédiatement
+    latency_budget_ms: Optional[int] = Field(default=None, ge=0)
+    # Identifiant de conversation : active l'historique côté serveur (questions de suivi)
+    session_id: Optional[str] = Field(default=None, max_length=128)
 
+
+class ChatUpgrade(BaseModel):
+    """État d'une réponse Jan.ai poursuivie après un dépassement du budget de latence"""
+    status: str  # "pending" | "done" | "failed"
+    message: Optional[ChatMessage] = None
+
+
+class ExplainRequest(BaseModel):
+    """Requête d'explication globale du dossier"""
+    report: Optional[AnalysisReport] = None
+    report_id: Optional[str] = Field(default=None, max_length=64)
+    session_id: Optional[str] = Field(default=None, max_length=128)
+
+
+class AnalysisJobInfo(BaseModel):
+    """État d'un job d'analyse asynchrone (POST /api/jobs)"""
+    job_id: str
+    status: str  # "queued" | "running" | "done" | "failed" | "cancelled"
+    case_type: str
+    files: List[str] = []
+    # Estimation avant traitement : voie "fast" (petit dossier) ou "bulk"
+    lane: Optional[str] = None
+    estimated_pages: Optional[int] = None
+    estimated_scanned_pages: Optional[int] = None
+    # Dernier événement de progression (étape, fichier, page n/m...)
+    progress: Optional[Dict[str, Any]] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    report_id: Optional[str] = None
+    error: Optional[str] = None
+    # Annulation demandée : "client" (DELETE), "disconnect", "deadline" ou "shutdown"
+    cancel_reason: Optional[str] = None
+    report: Optional[AnalysisReport] = None
+
+
+class DossierSummary(BaseModel):
+    """Dossier archivé (liste)"""
+    id: int
+    report_id: str
+    case_type: str
+    reference: Optional[str] = None
+    address: Optional[str] = None
+    created_at: float
+    conformity_score: Optional[float] = None
+    total_documents: Optional[int] = None
+
+
+class DossierList(BaseModel):
+    """Page de dossiers archivés ; `next_cursor` à repasser pour la page suivante"""
+    items: List[DossierSummary]
+    next_cursor: Optional[int] = None
+
+
+class ArchivedDocument(BaseModel):
+    """Pièce d'un dossier archivé et fichier correspondant"""
+    filename: str
+    document_type: str
+    status: str
+    confidence: Optional[float] = None
+    content_hash: Optional[str] = None
+    size: Optional[int] = None
+    page_count: Optional[int] = None
+
+
+class DossierDetail(DossierSummary):
+    """Dossier archivé avec ses pièces, ses infos projet et ses écarts"""
+    documents: List[ArchivedDocument] = []
+    project_info: ProjectInfo
+    compliance_issues: List[ComplianceIssue] = []
+
+
+class IssueDossier(DossierSummary):
+    """Dossier archivé présentant un écart donné"""
+    severity: str
+    message: str
+
+
+class IssueDossierList(BaseModel):
+    items: List[IssueDossier]
+    next_cursor: Optional[int] = None
+
+
+class SearchHit(BaseModel):
+    """Résultat de recherche : infos projet ou page d'une pièce, avec extrait surligné (<mark>)"""
+    kind: str  # "project" | "page"
+    score: float  # pertinence BM25 (plus haut = plus pertinent)
+    snippet: str
+    dossiers: List[DossierSummary] = []  # dossiers concernés, du plus récent au plus ancien
+    address: Optional[str] = None  # kind="project", surligné
+    reference: Optional[str] = None  # kind="project", surligné
+    filename: Optional[str] = None  # kind="page"
+    content_hash: Optional[str] = None  # kind="page"
+    page_no: Optional[int] = None  # kind="page", à partir de 1
+
+
+class SearchResults(BaseModel):
+    """Page de résultats ; `next_offset` à repasser pour la page suivante"""
+    query: str
+    items: List[SearchHit]
+    next_offset: Optional[int] = None
+    took_ms: float
+
+
+class FileCheckRequest(BaseModel):
+    """SHA-256 des fichiers d'un dossier, avant upload"""
+    hashes: List[str] = Field(max_length=10000)
+
+
+class FileCheckResponse(BaseModel):
+    """Fichiers déjà extraits côté serveur (à citer par haché) et fichiers à uploader"""
+    known: List[str]
+    unknown: List[str]
+
+
+class KnownFile(BaseModel):
+    """Fichier du dossier déjà connu du serveur, cité par son SHA-256 au lieu d'être uploadé"""
+    filename: str = Field(max_length=255)
+    sha256: str = Field(pattern=r"^[0-9a-fA-F]{64}$")
+
+
+class ProfileInfo(BaseModel):
+    """Profil d'une analyse (/api/analyze avec X-Profile-Token)"""
+    profile_id: str
+    created_at: float
+    duration_s: float
+    samples: int
+    interval_s: float
+    # Threads échantillonnés : boucle asyncio et threads du pool travaillant pour la requête
+    threads: List[str] = []
+    # Threads partagés avec les autres requêtes du worker (boucle asyncio) : leurs
+    # piles peuvent appartenir à des requêtes concurrentes
+    shared_threads: List[str] = []
+    case_type: Optional[str] = None
+    files: List[str] = []
+    # "ok", code HTTP de l'erreur ou nom de l'exception
+    outcome: str = "ok"
+    worker: Optional[str] = None
@@ -3,12 +3,15 @@ Service d'analyse rule-based des documents
 Système fait maison sans LLM pré-entraîné
 """
 import re
+import time
 from typing import List, Dict, Optional, Tuple, Iterable
 from ..models.document import (
     Document, DocumentType, DocumentStatus, 
     AnalysisReport, ProjectInfo
 )
 from ..services.compliance import ComplianceEngine
+from ..services.extractor import ProgressCallback
+from ..services.metrics import STAGE_SECONDS
 
 
 class DocumentAnalyzer:
@@ -615,26 +618,52 @@ class DocumentAnalyzer:
         
         return project_info
     
+    def identify_documents(
+        self,
+        files: List[Tuple[str, str]],
+        progress: Optional[ProgressCallback] = None,
+    ) -> List[Tuple[DocumentType, float]]:
+        """
+        Identifie chaque document (type, confiance), dans l'ordre de `files`.
+        
+        Args:
+            files: Liste de tuples (nom_fichier, contenu_texte)
+            progress: Rappel de progression ("identifying" par fichier)
+        """
+        identified = []
+        for index, (filename, content) in enumerate(files):
+            if progress:
+                progress("identifying", file=filename, file_index=index + 1, files=len(files))
+            start = time.perf_counter()
+            doc_type, confidence = self.identify_document_type(filename, content)
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage="identify", document_type=doc_type.value)
+            identified.append((doc_type, confidence))
+        return identified
+    
     def analyze_documents(
         self, 
-        files: List[Tuple[str, str]]
+        files: List[Tuple[str, str]],
+        progress: Optional[ProgressCallback] = None,
+        identified: Optional[List[Tuple[DocumentType, float]]] = None,
     ) -> AnalysisReport:
         """
         Analyse une liste de documents et génère un rapport.
         
         Args:
             files: Liste de tuples (nom_fichier, contenu_texte)
+            progress: Rappel de progression ("identifying" par fichier, puis "evaluating")
+            identified: Types déjà identifiés (identify_documents), alignés sur `files`
             
         Returns:
             Rapport d'analyse complet
         """
         documents: List[Document] = []
         found_types: set = set()
+        if identified is None:
+            identified = self.identify_documents(files, progress)
         
         # Analyser chaque document
-        for filename, content in files:
-            doc_type, confidence = self.identify_document_type(filename, content)
-            
+        for (filename, content), (doc_type, confidence) in zip(files, identified):
             # Déterminer le statut
             if doc_type != DocumentType.AUTRE:
                 status = DocumentStatus.CONFORME
@@ -666,15 +695,19 @@ class DocumentAnalyzer:
         non_conformes = [d for d in documents if d.status == DocumentStatus.NON_CONFORME]
         
         # Extraire les infos du projet
-        project_info = self.extract_project_info(documents)
+        with STAGE_SECONDS.time(stage="project_info"):
+            project_info = self.extract_project_info(documents)
 
         # Évaluer les règles de conformité (niveau dossier)
+        if progress:
+            progress("evaluating")
         compliance_engine = ComplianceEngine()
-        compliance_issues = compliance_engine.evaluate(
-            project_info=project_info,
-            documents=documents,
-            detected_types=list(found_types),
-        )
+        with STAGE_SECONDS.time(stage="compliance"):
+            compliance_issues = compliance_engine.evaluate(
+                project_info=project_info,
+                documents=documents,
+                detected_types=list(found_types),
+            )
         
         # Calculer le score de conformité
         total_required = len(required_list)
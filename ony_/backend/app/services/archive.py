@@ -0,0 +1,699 @@
+"""
+Archive durable des dossiers analysés (SQLite en mode WAL).
+
+Rien n'était conservé : un rapport ne vivait que dans la réponse HTTP et en
+mémoire, et toute réutilisation (audit, ré-évaluation) imposait un nouvel
+upload et un nouvel OCR. L'archive garde :
+- les dossiers (rapport, type, référence, adresse, date, score) ;
+- les fichiers, une fois par contenu (SHA-256, taille, nombre de pages) ;
+- le texte extrait de chaque page ;
+- l'identification de chaque pièce d'un dossier ;
+- le ProjectInfo et les ComplianceIssue du dossier, en colonnes/lignes.
+
+WAL : les lectures (listes, rapports) ne bloquent pas l'écriture d'un dossier.
+Chaque thread a sa connexion ; les écritures sont sérialisées. Les listes sont
+paginées par curseur (id décroissant), sans OFFSET : le coût d'une page ne
+dépend pas de la taille de l'archive.
+
+Recherche plein texte (FTS5, index à contenu externe) sur le texte des pages
+et sur l'adresse, la référence et les surfaces du ProjectInfo. Des triggers
+tiennent les index à jour à chaque écriture ; une archive antérieure à la
+recherche est indexée une fois, à l'ouverture.
+
+Chaque fichier garde sa signature MinHash, découpée en bandes indexées (LSH) :
+une pièce déjà déposée dans un autre dossier, à l'identique ou presque, est
+signalée dans le rapport (`resubmitted_in`).
+
+L'extraction d'un fichier n'est réutilisée (get_extracted, known_hashes) que
+si elle a réussi avec du texte, sous la version d'extraction courante
+(TextExtractor.version : moteur PDF, OCR, résolution). Sinon, le fichier est
+réextrait et sa ligne remplacée à l'archivage suivant.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from ..models.document import AnalysisReport, ProjectInfo
+from . import near_duplicates
+from .pipeline import AnalysisResult, ExtractedFile
+
+
+logger = logging.getLogger("aqua_verify")
+
+
+def _column_type(name: str) -> str:
+    annotation = str(ProjectInfo.model_fields[name].annotation)
+    if "float" in annotation:
+        return "REAL"
+    if "bool" in annotation:
+        return "INTEGER"
+    return "TEXT"
+
+
+# Une colonne par champ du ProjectInfo (requêtes directes sur surface, volumes...)
+PROJECT_FIELDS = list(ProjectInfo.model_fields)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS dossiers (
+    id INTEGER PRIMARY KEY,
+    report_id TEXT NOT NULL UNIQUE,
+    case_type TEXT NOT NULL,
+    reference TEXT,
+    address TEXT,
+    created_at REAL NOT NULL,
+    conformity_score REAL,
+    total_documents INTEGER,
+    report_json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_dossiers_reference ON dossiers(reference);
+CREATE INDEX IF NOT EXISTS idx_dossiers_created_at ON dossiers(created_at);
+
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    page_count INTEGER NOT NULL,
+    extracted_at REAL NOT NULL,
+    success INTEGER NOT NULL DEFAULT 0,
+    extractor_version TEXT
+);
+
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    page_no INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    UNIQUE (file_id, page_no)
+);
+
+CREATE TABLE IF NOT EXISTS dossier_documents (
+    id INTEGER PRIMARY KEY,
+    dossier_id INTEGER NOT NULL REFERENCES dossiers(id) ON DELETE CASCADE,
+    file_id INTEGER REFERENCES files(id),
+    filename TEXT NOT NULL,
+    document_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    confidence REAL
+);
+CREATE INDEX IF NOT EXISTS idx_dossier_documents_dossier ON dossier_documents(dossier_id);
+CREATE INDEX IF NOT EXISTS idx_dossier_documents_file ON dossier_documents(file_id);
+CREATE INDEX IF NOT EXISTS idx_dossier_documents_type ON dossier_documents(document_type);
+
+CREATE TABLE IF NOT EXISTS project_info (
+    dossier_id INTEGER PRIMARY KEY REFERENCES dossiers(id) ON DELETE CASCADE,
+    {", ".join(f"{name} {_column_type(name)}" for name in PROJECT_FIELDS)}
+);
+
+CREATE TABLE IF NOT EXISTS compliance_issues (
+    id INTEGER PRIMARY KEY,
+    dossier_id INTEGER NOT NULL REFERENCES dossiers(id) ON DELETE CASCADE,
+    code TEXT NOT NULL,
+    title TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    message TEXT NOT NULL,
+    evidence TEXT,
+    related_documents TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_compliance_issues_code ON compliance_issues(code, dossier_id);
+CREATE INDEX IF NOT EXISTS idx_compliance_issues_dossier ON compliance_issues(dossier_id);
+
+CREATE TABLE IF NOT EXISTS file_signatures (
+    file_id INTEGER PRIMARY KEY REFERENCES files(id) ON DELETE CASCADE,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    PRIMARY KEY (band, bucket, file_id)
+) WITHOUT ROWID;
+"""
+
+# Champs du ProjectInfo interrogeables en plein texte
+SEARCH_PROJECT_FIELDS = ("address", "reference", "surface_m2", "impermeabilized_area_m2", "infiltration_area_m2")
+# Accents ignorés : "bâtiment" trouve "batiment"
+_TOKENIZER = "unicode61 remove_diacritics 2"
+
+SEARCH_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+    text, content='pages', content_rowid='id', tokenize='{_TOKENIZER}', prefix='3'
+);
+CREATE TRIGGER IF NOT EXISTS pages_fts_insert AFTER INSERT ON pages BEGIN
+    INSERT INTO pages_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS pages_fts_delete AFTER DELETE ON pages BEGIN
+    INSERT INTO pages_fts(pages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS project_fts USING fts5(
+    {", ".join(SEARCH_PROJECT_FIELDS)},
+    content='project_info', content_rowid='dossier_id', tokenize='{_TOKENIZER}', prefix='3'
+);
+CREATE TRIGGER IF NOT EXISTS project_fts_insert AFTER INSERT ON project_info BEGIN
+    INSERT INTO project_fts(rowid, {", ".join(SEARCH_PROJECT_FIELDS)})
+    VALUES (new.dossier_id, {", ".join(f"new.{name}" for name in SEARCH_PROJECT_FIELDS)});
+END;
+CREATE TRIGGER IF NOT EXISTS project_fts_delete AFTER DELETE ON project_info BEGIN
+    INSERT INTO project_fts(project_fts, rowid, {", ".join(SEARCH_PROJECT_FIELDS)})
+    VALUES ('delete', old.dossier_id, {", ".join(f"old.{name}" for name in SEARCH_PROJECT_FIELDS)});
+END;
+"""
+
+# Longueur minimale d'un préfixe (`lil*`) : en deçà, le mot est cherché entier
+MIN_PREFIX_LENGTH = 3
+# Colonnes ajoutées depuis la création de l'archive (ALTER TABLE à l'ouverture)
+MIGRATIONS = {
+    "files": {
+        "success": "INTEGER NOT NULL DEFAULT 0",
+        "extractor_version": "TEXT",
+    },
+}
+
+# Hachés par requête IN (limite de paramètres SQLite)
+_HASH_BATCH = 500
+# Fichiers candidats examinés par pièce (les plus récents) : un formulaire type
+# peut partager ses seaux avec des milliers de fichiers
+RESUBMISSION_MAX_CANDIDATES = 200
+# Dossiers signalés par pièce redéposée
+RESUBMISSION_MAX_DOSSIERS = 5
+# Marqueurs des termes trouvés dans les extraits
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+# Dossiers rattachés à une page trouvée (un même fichier peut servir à plusieurs dossiers)
+SEARCH_MAX_DOSSIERS_PER_HIT = 5
+
+_DOSSIER_COLUMNS = (
+    "d.id, d.report_id, d.case_type, d.reference, d.address, d.created_at, d.conformity_score, d.total_documents"
+)
+
+
+def match_query(query: str) -> str:
+    """
+    Requête FTS5 à partir de la saisie : chaque mot est cherché tel quel (ET
+    implicite), un `*` final garde la recherche par préfixe (3 lettres au moins).
+    """
+    terms = []
+    for word in re.findall(r'[^\s"]+', query):
+        word, prefix = word.rstrip("*"), word.endswith("*")
+        prefix = prefix and len(word) >= MIN_PREFIX_LENGTH
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+class DossierArchive:
+    """Accès à la base SQLite de l'archive (une connexion par thread)."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        # Connexions de tous les threads, fermées ensemble par close()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        with self._write_lock:
+            conn = self._connection()
+            conn.executescript(SCHEMA)
+            self._migrate(conn)
+            indexed = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pages_fts'"
+            ).fetchone()
+            conn.executescript(SEARCH_SCHEMA)
+            if indexed is None:
+                # Archive antérieure à la recherche : indexation initiale
+                conn.execute("INSERT INTO pages_fts(pages_fts) VALUES ('rebuild')")
+                conn.execute("INSERT INTO project_fts(project_fts) VALUES ('rebuild')")
+
+    @staticmethod
+    def _migrate(conn: sqlite3.Connection) -> None:
+        # Archive antérieure : colonnes manquantes ajoutées. Les fichiers déjà
+        # archivés, sans version d'extraction, ne sont plus réutilisés.
+        for table, columns in MIGRATIONS.items():
+            existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for name, definition in columns.items():
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread=False : seul close() l'utilise depuis un autre thread
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """Transaction d'écriture (un seul écrivain à la fois)."""
+        with self._write_lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # ------------------------------------------------------------------ écriture
+
+    def save_result(self, result: AnalysisResult, case_type: str, extractor_version: str) -> int:
+        """
+        Archive un dossier analysé ; renvoie l'id du dossier.
+
+        Un fichier déjà archivé (même SHA-256) n'est pas réécrit, sauf si son
+        extraction n'est pas réutilisable (échec, texte vide, autre version) ;
+        un rapport déjà archivé (même report_id) renvoie le dossier existant.
+        """
+        report = result.report
+        if report.report_id is None:
+            raise ValueError("Rapport sans report_id")
+
+        with self._write() as conn:
+            row = conn.execute("SELECT id FROM dossiers WHERE report_id = ?", (report.report_id,)).fetchone()
+            if row is not None:
+                return row["id"]
+
+            file_ids: Dict[str, int] = {}
+            for extracted in result.files:
+                file_ids.setdefault(extracted.filename, self._save_file(conn, extracted, extractor_version))
+
+            info = report.project_info
+            cursor = conn.execute(
+                "INSERT INTO dossiers (report_id, case_type, reference, address, created_at,"
+                " conformity_score, total_documents, report_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    report.report_id,
+                    case_type,
+                    info.reference,
+                    info.address,
+                    time.time(),
+                    report.conformity_score,
+                    report.total_documents,
+                    report.model_dump_json(),
+                ),
+            )
+            dossier_id = cursor.lastrowid
+
+            conn.executemany(
+                "INSERT INTO dossier_documents (dossier_id, file_id, filename, document_type, status, confidence)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        dossier_id,
+                        file_ids.get(doc.filename),
+                        doc.filename,
+                        doc.document_type.value,
+                        doc.status.value,
+                        doc.confidence,
+                    )
+                    for doc in report.documents_conformes + report.documents_non_conformes + report.documents_doublons
+                ],
+            )
+            conn.execute(
+                f"INSERT INTO project_info (dossier_id, {', '.join(PROJECT_FIELDS)})"
+                f" VALUES (?, {', '.join('?' for _ in PROJECT_FIELDS)})",
+                (dossier_id, *(getattr(info, name) for name in PROJECT_FIELDS)),
+            )
+            conn.executemany(
+                "INSERT INTO compliance_issues (dossier_id, code, title, severity, message, evidence, related_documents)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        dossier_id,
+                        issue.code,
+                        issue.title,
+                        issue.severity,
+                        issue.message,
+                        issue.evidence,
+                        json.dumps(issue.related_documents, ensure_ascii=False),
+                    )
+                    for issue in report.compliance_issues
+                ],
+            )
+            return dossier_id
+
+    @staticmethod
+    def _save_file(conn: sqlite3.Connection, extracted: ExtractedFile, extractor_version: str) -> int:
+        success = extracted.success and bool(extracted.text.strip())
+        row = conn.execute(
+            "SELECT id, success, extractor_version FROM files WHERE content_hash = ?", (extracted.content_hash,)
+        ).fetchone()
+        if row is not None:
+            if row["success"] and row["extractor_version"] == extractor_version:
+                return row["id"]
+            # Extraction archivée inutilisable : remplacée par celle-ci (les
+            # pièces des dossiers qui y renvoient gardent le même file_id)
+            file_id = row["id"]
+            old = conn.execute("SELECT signature FROM file_signatures WHERE file_id = ?", (file_id,)).fetchone()
+            if old is not None:
+                # Seaux retrouvés par leur clé (pas d'index sur file_id)
+                conn.executemany(
+                    "DELETE FROM lsh_buckets WHERE band = ? AND bucket = ? AND file_id = ?",
+                    [
+                        (band, bucket, file_id)
+                        for band, bucket in near_duplicates.lsh_buckets(near_duplicates.unpack(old["signature"]))
+                    ],
+                )
+                conn.execute("DELETE FROM file_signatures WHERE file_id = ?", (file_id,))
+            conn.execute("DELETE FROM pages WHERE file_id = ?", (file_id,))
+            conn.execute(
+                "UPDATE files SET size = ?, page_count = ?, extracted_at = ?, success = ?, extractor_version = ?"
+                " WHERE id = ?",
+                (extracted.size, len(extracted.pages), time.time(), success, extractor_version, file_id),
+            )
+        else:
+            cursor = conn.execute(
+                "INSERT INTO files (content_hash, size, page_count, extracted_at, success, extractor_version)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (extracted.content_hash, extracted.size, len(extracted.pages), time.time(), success, extractor_version),
+            )
+            file_id = cursor.lastrowid
+        conn.executemany(
+            "INSERT INTO pages (file_id, page_no, text) VALUES (?, ?, ?)",
+            [(file_id, page_no, text) for page_no, text in enumerate(extracted.pages, start=1)],
+        )
+        if extracted.signature is not None:
+            conn.execute(
+                "INSERT INTO file_signatures (file_id, signature) VALUES (?, ?)",
+                (file_id, near_duplicates.pack(extracted.signature)),
+            )
+            conn.executemany(
+                "INSERT INTO lsh_buckets (band, bucket, file_id) VALUES (?, ?, ?)",
+                [(band, bucket, file_id) for band, bucket in near_duplicates.lsh_buckets(extracted.signature)],
+            )
+        return file_id
+
+    # ------------------------------------------------------------------ lecture
+
+    def list_dossiers(
+        self,
+        limit: int = 50,
+        cursor: Optional[int] = None,
+        reference: Optional[str] = None,
+        case_type: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Dossiers du plus récent au plus ancien ; renvoie (page, curseur suivant)."""
+        clauses, params = [], []
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(cursor)
+        if reference:
+            clauses.append("reference = ?")
+            params.append(reference)
+        if case_type:
+            clauses.append("case_type = ?")
+            params.append(case_type)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connection().execute(
+            "SELECT id, report_id, case_type, reference, address, created_at, conformity_score, total_documents"
+            f" FROM dossiers {where} ORDER BY id DESC LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+        return self._page([dict(row) for row in rows], limit)
+
+    def list_issues(
+        self,
+        code: str,
+        limit: int = 50,
+        cursor: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Dossiers présentant un écart donné (code), du plus récent au plus ancien."""
+        params: List[Any] = [code]
+        where = "WHERE i.code = ?"
+        if cursor is not None:
+            where += " AND d.id < ?"
+            params.append(cursor)
+        rows = self._connection().execute(
+            "SELECT d.id, d.report_id, d.case_type, d.reference, d.address, d.created_at,"
+            " d.conformity_score, d.total_documents, i.severity, i.message"
+            f" FROM compliance_issues i JOIN dossiers d ON d.id = i.dossier_id {where}"
+            " ORDER BY d.id DESC LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+        return self._page([dict(row) for row in rows], limit)
+
+    @staticmethod
+    def _page(items: List[Dict[str, Any]], limit: int) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        if len(items) > limit:
+            items = items[:limit]
+            return items, items[-1]["id"]
+        return items, None
+
+    def known_hashes(self, hashes: Iterable[str], extractor_version: str) -> Set[str]:
+        """Parmi ces SHA-256, ceux dont l'extraction archivée est réutilisable."""
+        hashes = list(dict.fromkeys(hashes))
+        conn = self._connection()
+        known: Set[str] = set()
+        for start in range(0, len(hashes), _HASH_BATCH):
+            batch = hashes[start:start + _HASH_BATCH]
+            known.update(
+                row["content_hash"]
+                for row in conn.execute(
+                    f"SELECT content_hash FROM files WHERE content_hash IN ({', '.join('?' for _ in batch)})"
+                    " AND success = 1 AND extractor_version = ?",
+                    (*batch, extractor_version),
+                )
+            )
+        return known
+
+    def get_extracted(self, content_hash: str, filename: str, extractor_version: str) -> Optional[ExtractedFile]:
+        """
+        Extraction archivée d'un fichier, sous le nom qu'il porte dans le nouveau
+        dossier ; None si elle n'est pas réutilisable (échec, texte vide, autre
+        version d'extraction).
+        """
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT id, size FROM files WHERE content_hash = ? AND success = 1 AND extractor_version = ?",
+            (content_hash, extractor_version),
+        ).fetchone()
+        if row is None:
+            return None
+        pages = [
+            page["text"]
+            for page in conn.execute("SELECT text FROM pages WHERE file_id = ? ORDER BY page_no", (row["id"],))
+        ]
+        if not any(page.strip() for page in pages):
+            return None
+        extracted = ExtractedFile(
+            filename=filename,
+            content_hash=content_hash,
+            size=row["size"],
+            pages=pages,
+            success=True,
+        )
+        signature = conn.execute("SELECT signature FROM file_signatures WHERE file_id = ?", (row["id"],)).fetchone()
+        # Fichier archivé avant les signatures : calculée à la volée. Une
+        # signature archivée d'un texte devenu trop court (MIN_SHINGLES relevé) est ignorée
+        if signature is None:
+            extracted.signature = near_duplicates.fingerprint(extracted.text)
+        elif near_duplicates.has_enough_shingles(extracted.text):
+            extracted.signature = near_duplicates.unpack(signature["signature"])
+        return extracted
+
+    def flag_resubmissions(self, result: AnalysisResult) -> None:
+        """
+        Renseigne `resubmitted_in` des pièces du rapport déjà présentes (même
+        contenu ou quasi-copie) dans des dossiers archivés.
+
+        À appeler avant save_result : le dossier ne doit pas se trouver lui-même.
+        """
+        report = result.report
+        documents = {
+            doc.filename: doc
+            for doc in report.documents_conformes + report.documents_non_conformes + report.documents_doublons
+        }
+        conn = self._connection()
+        for extracted in result.files:
+            doc = documents.get(extracted.filename)
+            if doc is None or extracted.signature is None:
+                continue
+            buckets = near_duplicates.lsh_buckets(extracted.signature)
+            candidates = conn.execute(
+                "SELECT DISTINCT b.file_id, s.signature FROM lsh_buckets b"
+                " JOIN file_signatures s ON s.file_id = b.file_id"
+                f" WHERE {' OR '.join('(b.band = ? AND b.bucket = ?)' for _ in buckets)}"
+                " ORDER BY b.file_id DESC LIMIT ?",
+                (*(value for bucket in buckets for value in bucket), RESUBMISSION_MAX_CANDIDATES),
+            ).fetchall()
+            file_ids = [
+                row["file_id"]
+                for row in candidates
+                if near_duplicates.similarity(extracted.signature, near_duplicates.unpack(row["signature"]))
+                >= near_duplicates.RESUBMISSION_THRESHOLD
+            ]
+            if not file_ids:
+                continue
+            doc.resubmitted_in = [
+                row["report_id"]
+                for row in conn.execute(
+                    "SELECT DISTINCT d.id, d.report_id FROM dossier_documents dd JOIN dossiers d ON d.id = dd.dossier_id"
+                    f" WHERE dd.file_id IN ({', '.join('?' for _ in file_ids)}) ORDER BY d.id DESC LIMIT ?",
+                    (*file_ids, RESUBMISSION_MAX_DOSSIERS),
+                )
+            ]
+
+    def get_dossier(self, dossier_id: int) -> Optional[Dict[str, Any]]:
+        """Dossier avec ses pièces (fichier, pages) et ses écarts."""
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT id, report_id, case_type, reference, address, created_at, conformity_score, total_documents"
+            " FROM dossiers WHERE id = ?",
+            (dossier_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        dossier = dict(row)
+        dossier["documents"] = [
+            dict(doc)
+            for doc in conn.execute(
+                "SELECT dd.filename, dd.document_type, dd.status, dd.confidence,"
+                " f.content_hash, f.size, f.page_count"
+                " FROM dossier_documents dd LEFT JOIN files f ON f.id = dd.file_id"
+                " WHERE dd.dossier_id = ? ORDER BY dd.id",
+                (dossier_id,),
+            )
+        ]
+        info = conn.execute(
+            f"SELECT {', '.join(PROJECT_FIELDS)} FROM project_info WHERE dossier_id = ?", (dossier_id,)
+        ).fetchone()
+        dossier["project_info"] = ProjectInfo(**dict(info)) if info else ProjectInfo()
+        dossier["compliance_issues"] = [
+            {**dict(issue), "related_documents": json.loads(issue["related_documents"])}
+            for issue in conn.execute(
+                "SELECT code, title, severity, message, evidence, related_documents"
+                " FROM compliance_issues WHERE dossier_id = ? ORDER BY id",
+                (dossier_id,),
+            )
+        ]
+        return dossier
+
+    def get_report(self, report_id: str) -> Optional[AnalysisReport]:
+        """
+        Rapport archivé, texte complet des pièces compris (reconstitué depuis les pages).
+        """
+        conn = self._connection()
+        row = conn.execute("SELECT id, report_json FROM dossiers WHERE report_id = ?", (report_id,)).fetchone()
+        if row is None:
+            return None
+        report = AnalysisReport.model_validate_json(row["report_json"])
+        texts: Dict[str, str] = {}
+        for doc in conn.execute(
+            "SELECT filename, file_id FROM dossier_documents WHERE dossier_id = ? AND file_id IS NOT NULL",
+            (row["id"],),
+        ):
+            pages = conn.execute(
+                "SELECT text FROM pages WHERE file_id = ? ORDER BY page_no", (doc["file_id"],)
+            ).fetchall()
+            texts[doc["filename"]] = "\n".join(page["text"] for page in pages if page["text"].strip())
+        for doc in report.documents_conformes + report.documents_non_conformes:
+            doc.full_text = texts.get(doc.filename) or doc.full_text
+        return report
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Pages et dossiers correspondant à la requête, du plus pertinent au moins pertinent (BM25).
+
+        Chaque index renvoie ses `offset + limit` meilleurs résultats (tri
+        top-N dans FTS5), fusionnés ensuite ; les pages trouvées sont
+        rattachées aux dossiers les plus récents qui contiennent le fichier.
+        """
+        expression = match_query(query)
+        if not expression:
+            return []
+        conn = self._connection()
+        window = offset + limit
+        hits: List[Dict[str, Any]] = []
+        for row in conn.execute(
+            f"SELECT rowid, rank, snippet(project_fts, -1, ?, ?, '…', 12) AS snippet,"
+            f" {', '.join(f'highlight(project_fts, {i}, ?, ?) AS {name}' for i, name in enumerate(SEARCH_PROJECT_FIELDS[:2]))}"
+            " FROM project_fts WHERE project_fts MATCH ? ORDER BY rank LIMIT ?",
+            (HIGHLIGHT_START, HIGHLIGHT_END) * 3 + (expression, window),
+        ):
+            hits.append({
+                "kind": "project",
+                "score": row["rank"],
+                "snippet": row["snippet"],
+                "address": row["address"],
+                "reference": row["reference"],
+                "dossier_id": row["rowid"],
+            })
+        for row in conn.execute(
+            "SELECT p.file_id, p.page_no, f.content_hash, pages_fts.rank AS rank,"
+            " snippet(pages_fts, 0, ?, ?, '…', 24) AS snippet"
+            " FROM pages_fts JOIN pages p ON p.id = pages_fts.rowid JOIN files f ON f.id = p.file_id"
+            " WHERE pages_fts MATCH ? ORDER BY pages_fts.rank LIMIT ?",
+            (HIGHLIGHT_START, HIGHLIGHT_END, expression, window),
+        ):
+            hits.append({
+                "kind": "page",
+                "score": row["rank"],
+                "snippet": row["snippet"],
+                "file_id": row["file_id"],
+                "content_hash": row["content_hash"],
+                "page_no": row["page_no"],
+            })
+
+        # BM25 FTS5 : plus le score est bas, plus le résultat est pertinent
+        hits.sort(key=lambda hit: hit["score"])
+        hits = hits[offset:window]
+        for hit in hits:
+            hit["score"] = round(-hit["score"], 6)
+            if hit["kind"] == "project":
+                hit["dossiers"] = [
+                    dict(row)
+                    for row in conn.execute(
+                        f"SELECT {_DOSSIER_COLUMNS} FROM dossiers d WHERE d.id = ?", (hit.pop("dossier_id"),)
+                    )
+                ]
+            else:
+                rows = conn.execute(
+                    f"SELECT {_DOSSIER_COLUMNS}, dd.filename FROM dossier_documents dd"
+                    " JOIN dossiers d ON d.id = dd.dossier_id WHERE dd.file_id = ?"
+                    " ORDER BY d.id DESC LIMIT ?",
+                    (hit.pop("file_id"), SEARCH_MAX_DOSSIERS_PER_HIT),
+                ).fetchall()
+                hit["filename"] = rows[0]["filename"] if rows else None
+                hit["dossiers"] = [{k: row[k] for k in row.keys() if k != "filename"} for row in rows]
+        return hits
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connection()
+        return {
+            "path": self.path,
+            "dossiers": conn.execute("SELECT COUNT(*) FROM dossiers").fetchone()[0],
+            "files": conn.execute("SELECT COUNT(*) FROM files").fetchone()[0],
+        }
+
+    def close(self) -> None:
+        """Ferme les connexions de tous les threads (arrêt du processus)."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
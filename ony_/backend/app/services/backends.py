@@ -0,0 +1,224 @@
+"""
+Bibliothèques lourdes chargées à la demande (PyMuPDF, pypdf, python-docx,
+Pillow, pytesseract, httpx, PyYAML).
+
+Importées en tête de module, elles ralentissaient le démarrage de chaque
+worker (plusieurs centaines de ms avant de servir la moindre requête) alors
+qu'un worker qui ne reçoit que du chat n'en utilise aucune. Le registre les
+importe au premier usage, une seule fois par processus, et garde le temps de
+chargement et l'erreur éventuelle (GET /api/health).
+
+warm_up() les charge toutes et les vérifie (rendu PyMuPDF, langues
+Tesseract...) : appelé au démarrage si WARM_UP_BACKENDS est activé, il
+retarde la disponibilité du worker plutôt que la première analyse.
+
+La configuration de Tesseract (TESSERACT_CMD) est appliquée au chargement
+de pytesseract, plus à l'import.
+"""
+from __future__ import annotations
+
+import importlib
+import io
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("aqua_verify")
+
+# Binaire tesseract si absent du PATH ; sous Windows, emplacement de
+# l'installateur officiel s'il existe
+TESSERACT_CMD = os.getenv("TESSERACT_CMD")
+_WINDOWS_TESSERACT_CMD = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+# Langues attendues par l'OCR (cf. TextExtractor._ocr_image)
+OCR_LANGUAGES = ("fra", "eng")
+
+
+class BackendUnavailable(ImportError):
+    """Bibliothèque absente ou inutilisable dans ce processus."""
+
+
+@dataclass
+class Backend:
+    """
+    Bibliothèque chargée à la demande.
+
+    Args:
+        name: Nom dans le registre
+        module: Module à importer
+        configure: Réglages appliqués juste après l'import
+        self_test: Vérification de bon fonctionnement (warm_up) ; renvoie un
+            détail affiché dans le bilan, lève une exception en cas d'échec
+    """
+    name: str
+    module: str
+    configure: Optional[Callable[[Any], None]] = None
+    self_test: Optional[Callable[[Any], Any]] = None
+    load_s: Optional[float] = None
+    error: Optional[str] = None
+    _module: Any = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def load(self) -> Any:
+        """Module importé (une seule fois) ; BackendUnavailable s'il est absent."""
+        if self._module is not None:
+            return self._module
+        with self._lock:
+            if self._module is None and self.error is None:
+                start = time.perf_counter()
+                try:
+                    module = importlib.import_module(self.module)
+                    if self.configure is not None:
+                        self.configure(module)
+                    self._module = module
+                except Exception as e:
+                    self.error = f"{e.__class__.__name__}: {e}"
+                    logger.warning("Bibliothèque %s indisponible: %s", self.name, self.error)
+                self.load_s = round(time.perf_counter() - start, 4)
+        if self._module is None:
+            raise BackendUnavailable(f"{self.name} indisponible ({self.error})")
+        return self._module
+
+    def available(self) -> bool:
+        try:
+            self.load()
+            return True
+        except BackendUnavailable:
+            return False
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+
+def _configure_tesseract(pytesseract: Any) -> None:
+    cmd = TESSERACT_CMD
+    if cmd is None and os.name == "nt" and os.path.exists(_WINDOWS_TESSERACT_CMD):
+        cmd = _WINDOWS_TESSERACT_CMD
+    if cmd:
+        pytesseract.pytesseract.tesseract_cmd = cmd
+
+
+def _test_fitz(fitz: Any) -> str:
+    # Rendu d'une page : c'est le chemin de l'OCR
+    doc = fitz.open()
+    try:
+        page = doc.new_page(width=200, height=200)
+        page.insert_text((20, 50), "Aqua Verify")
+        if "Aqua" not in page.get_text():
+            raise RuntimeError("texte natif non relu")
+        page.get_pixmap().tobytes("png")
+    finally:
+        doc.close()
+    return fitz.VersionBind
+
+
+def _test_pypdf(pypdf: Any) -> str:
+    writer = pypdf.PdfWriter()
+    writer.add_blank_page(width=200, height=200)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    if len(pypdf.PdfReader(io.BytesIO(buffer.getvalue())).pages) != 1:
+        raise RuntimeError("PDF de test non relu")
+    return pypdf.__version__
+
+
+def _test_docx(docx: Any) -> str:
+    document = docx.Document()
+    document.add_paragraph("Aqua Verify")
+    buffer = io.BytesIO()
+    document.save(buffer)
+    docx.Document(io.BytesIO(buffer.getvalue()))
+    return "ok"
+
+
+def _test_pil(image_module: Any) -> str:
+    image_module.new("L", (8, 8), color=255).tobytes()
+    return image_module.__version__ if hasattr(image_module, "__version__") else "ok"
+
+
+def _test_tesseract(pytesseract: Any) -> Dict[str, Any]:
+    # Binaire présent, et langues de l'OCR installées (sinon texte vide ou erreur par page)
+    version = str(pytesseract.get_tesseract_version())
+    languages = set(pytesseract.get_languages(config=""))
+    missing = [lang for lang in OCR_LANGUAGES if lang not in languages]
+    if missing:
+        raise RuntimeError(f"langues Tesseract manquantes : {', '.join(missing)}")
+    return {"version": version, "languages": sorted(languages & set(OCR_LANGUAGES))}
+
+
+def _test_yaml(yaml: Any) -> str:
+    if yaml.safe_load("a: 1") != {"a": 1}:
+        raise RuntimeError("YAML de test non relu")
+    return yaml.__version__
+
+
+BACKENDS: Dict[str, Backend] = {
+    backend.name: backend
+    for backend in (
+        Backend("fitz", "fitz", self_test=_test_fitz),
+        Backend("pypdf", "pypdf", self_test=_test_pypdf),
+        Backend("docx", "docx", self_test=_test_docx),
+        Backend("PIL", "PIL.Image", self_test=_test_pil),
+        Backend("pytesseract", "pytesseract", configure=_configure_tesseract, self_test=_test_tesseract),
+        Backend("httpx", "httpx"),
+        Backend("yaml", "yaml", self_test=_test_yaml),
+    )
+}
+# PyMuPDF est optionnel (repli pypdf, sans OCR) : son absence n'est pas une erreur
+OPTIONAL_BACKENDS = ("fitz",)
+# Bilan du dernier préchargement (GET /api/health)
+_last_warm_up: Optional[Dict[str, Any]] = None
+
+
+def load(name: str) -> Any:
+    """Module de la bibliothèque `name` ; BackendUnavailable si elle est absente."""
+    return BACKENDS[name].load()
+
+
+def available(name: str) -> bool:
+    return BACKENDS[name].available()
+
+
+def warm_up(names: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Charge et vérifie les bibliothèques (toutes par défaut).
+
+    Returns:
+        {"ok": bool, "took_s": float, "backends": {nom: {"ok", "load_s", "detail" | "error"}}}
+        `ok` est faux si une bibliothèque obligatoire manque ou échoue à son test.
+    """
+    global _last_warm_up
+    start = time.perf_counter()
+    results: Dict[str, Any] = {}
+    ok = True
+    for name in names or list(BACKENDS):
+        backend = BACKENDS[name]
+        result: Dict[str, Any] = {"ok": False}
+        try:
+            module = backend.load()
+            result["detail"] = backend.self_test(module) if backend.self_test else None
+            result["ok"] = True
+        except Exception as e:
+            result["error"] = backend.error or f"{e.__class__.__name__}: {e}"
+            if name not in OPTIONAL_BACKENDS:
+                ok = False
+            log = logger.info if name in OPTIONAL_BACKENDS else logger.error
+            log("Préchargement de %s en échec: %s", name, result["error"])
+        result["load_s"] = backend.load_s
+        results[name] = result
+    _last_warm_up = {"ok": ok, "took_s": round(time.perf_counter() - start, 4), "backends": results}
+    return _last_warm_up
+
+
+def snapshot() -> Dict[str, Any]:
+    """État du registre : chargées ou non, temps de chargement, erreurs, dernier préchargement."""
+    return {
+        "backends": {
+            name: {"loaded": backend.loaded, "load_s": backend.load_s, "error": backend.error}
+            for name, backend in BACKENDS.items()
+        },
+        "warm_up": _last_warm_up,
+    }
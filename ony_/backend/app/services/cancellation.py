@@ -0,0 +1,108 @@
+"""
+Annulation coopérative des analyses.
+
+Un onglet fermé ou un dossier renvoyé laissait l'OCR tourner jusqu'à la
+dernière page pour un résultat jeté. Le jeton d'annulation est consulté par
+TextExtractor entre deux pages et avant chaque appel OCR ; il porte aussi
+l'échéance de la requête, transmise à Tesseract (processus enfant) comme
+délai maximal.
+
+AnalysisCancelled hérite de BaseException (comme asyncio.CancelledError) :
+les `except Exception` de l'extraction, qui basculent sur pypdf ou ignorent
+une page en erreur, ne l'interceptent pas.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class CancelReason:
+    """Origines d'une annulation."""
+    DISCONNECT = "disconnect"  # client parti (onglet fermé, requête abandonnée)
+    CLIENT = "client"  # DELETE /api/jobs/{id}
+    DEADLINE = "deadline"  # échéance de la requête dépassée
+    SHUTDOWN = "shutdown"  # arrêt du processus worker
+
+
+class AnalysisCancelled(BaseException):
+    """Levée au premier point de contrôle suivant l'annulation."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancellationToken:
+    """Drapeau d'annulation partagé entre la requête et le thread d'analyse."""
+
+    def __init__(self, deadline_s: Optional[float] = None) -> None:
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+        self.deadline = time.monotonic() + deadline_s if deadline_s else None
+        # Points de contrôle franchis, pour estimer le travail évité
+        self.pages = 0
+        self.ocr_pages = 0
+
+    def cancel(self, reason: str) -> bool:
+        """Demande l'annulation ; False si elle était déjà demandée."""
+        if self._event.is_set():
+            return False
+        self.reason = reason
+        self._event.set()
+        return True
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel(CancelReason.DEADLINE)
+        return self._event.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Secondes avant l'échéance (None = pas d'échéance)."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def checkpoint(self, kind: Optional[str] = None) -> None:
+        """Lève AnalysisCancelled si l'annulation est demandée, sinon compte le point franchi."""
+        if self.cancelled:
+            raise AnalysisCancelled(self.reason or CancelReason.CLIENT)
+        if kind == "page":
+            self.pages += 1
+        elif kind == "ocr":
+            self.ocr_pages += 1
+
+    def wait(self, timeout: float) -> bool:
+        """Attend l'annulation au plus `timeout` secondes (échéance comprise)."""
+        remaining = self.remaining()
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+        self._event.wait(timeout)
+        return self.cancelled
+
+
+class CancellationStats:
+    """Analyses annulées par origine et travail évité (pages non lues, OCR non faits)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._by_reason: Dict[str, int] = {}
+        self._freed_pages = 0
+        self._freed_ocr_pages = 0
+
+    def record(self, token: CancellationToken, pages: int, scanned_pages: int) -> None:
+        with self._lock:
+            reason = token.reason or CancelReason.CLIENT
+            self._by_reason[reason] = self._by_reason.get(reason, 0) + 1
+            self._freed_pages += max(0, pages - token.pages)
+            self._freed_ocr_pages += max(0, scanned_pages - token.ocr_pages)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "cancelled": dict(self._by_reason),
+                "freed_pages": self._freed_pages,
+                "freed_ocr_pages": self._freed_ocr_pages,
+            }
@@ -2,9 +2,9 @@
 Service de chatbot rule-based
 Système de FAQ dynamique basé sur le rapport d'analyse
 """
-import re
 from typing import Optional, List
 from ..models.document import AnalysisReport, DocumentType
+from .intent_router import Intent, IntentRouter
 
 
 class ChatbotService:
@@ -73,9 +73,48 @@ class ChatbotService:
         (r"(?:aide|help|comment|que\s*peux.tu)", "help"),
     ]
     
-    def __init__(self):
-        """Initialise le chatbot"""
-        self.report: Optional[AnalysisReport] = None
+    # Formulations canoniques par intention, pour la résolution floue (fautes de frappe).
+    # Les intentions qui ont besoin d'un groupe capturé (explain_document) n'en ont pas.
+    CANONICAL_QUESTIONS = {
+        "get_missing_docs": [
+            "quels documents manquent",
+            "quels sont les documents manquants",
+            "qu'est-ce qui manque dans mon dossier",
+            "quels documents dois-je fournir",
+        ],
+        "get_conformity_status": [
+            "mon dossier est-il complet",
+            "est-ce que je suis en règle",
+            "quel est le score de conformité",
+            "mon dossier est-il conforme",
+        ],
+        "get_compliance_issues": [
+            "quels sont les problèmes",
+            "qu'est-ce qui n'est pas conforme",
+            "que dois-je corriger",
+            "quelles sont les non-conformités",
+        ],
+        "get_present_docs": [
+            "quels documents ai-je fournis",
+            "quels sont les documents présents",
+            "documents que j'ai déposés",
+        ],
+        "get_project_info": [
+            "quelle est la surface du projet",
+            "informations sur le projet",
+            "quel type de projet",
+        ],
+        "greet": ["bonjour", "salut"],
+        "thank": ["merci beaucoup"],
+        "goodbye": ["au revoir"],
+        "help": ["aide", "que peux-tu faire"],
+    }
+
+    _router: Optional[IntentRouter] = None
+
+    def __init__(self, report: Optional[AnalysisReport] = None):
+        """Initialise le chatbot (optionnellement avec le rapport de la session)"""
+        self.report: Optional[AnalysisReport] = report
     
     def set_report(self, report: AnalysisReport):
         """Définit le rapport d'analyse pour le contexte"""
@@ -95,18 +134,27 @@ class ChatbotService:
         if report:
             self.report = report
         
-        message_lower = message.lower().strip()
-        
-        # Chercher un pattern correspondant
-        for pattern, handler_name in self.QUESTION_PATTERNS:
-            match = re.search(pattern, message_lower)
-            if match:
-                handler = getattr(self, f"_handle_{handler_name}", None)
-                if handler:
-                    return handler(match)
+        intent = self.detect_intent(message)
+        if intent:
+            handler = getattr(self, f"_handle_{intent.handler}", None)
+            if handler:
+                return handler(intent.match)
         
         # Réponse par défaut
         return self._handle_unknown()
+
+    @classmethod
+    def detect_intent(cls, message: str) -> Optional[Intent]:
+        """
+        Retourne l'intention reconnue (handler, match, confiance) ou None.
+
+        Permet aux routes de savoir quel type de question est posé
+        sans générer la réponse rule-based.
+        """
+        if cls._router is None:
+            # Compilé une seule fois pour toutes les instances
+            cls._router = IntentRouter(cls.QUESTION_PATTERNS, cls.CANONICAL_QUESTIONS)
+        return cls._router.resolve(message)
     
     def _handle_get_missing_docs(self, match) -> str:
         """Répond sur les documents manquants"""
@@ -0,0 +1,145 @@
+"""
+Disjoncteur (circuit breaker) pour les appels à un service externe lent ou instable.
+
+Utilisé devant Jan.ai : quand le modèle est tombé ou bloqué, on ne veut pas
+que chaque requête attende le timeout complet avant de retomber sur le
+chatbot rule-based.
+
+États :
+- closed    : appels autorisés, résultats comptabilisés sur une fenêtre glissante
+- open      : appels refusés immédiatement pendant `open_duration_s`
+- half_open : quelques appels de test autorisés ; un succès referme le circuit,
+              un échec le rouvre
+"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+
+class CircuitOpenError(RuntimeError):
+    """Levée quand un appel est refusé parce que le circuit est ouvert."""
+
+
+class CircuitBreaker:
+    """Disjoncteur basé sur le taux d'échec et le taux d'appels lents."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        slow_call_threshold_s: float = 20.0,
+        slow_call_rate_threshold: float = 0.8,
+        window_size: int = 20,
+        min_calls: int = 4,
+        open_duration_s: float = 30.0,
+        half_open_max_calls: int = 1,
+    ) -> None:
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_threshold_s = slow_call_threshold_s
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.min_calls = min_calls
+        self.open_duration_s = open_duration_s
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        # Fenêtre glissante : (succès, lent)
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=window_size)
+        self._times_opened = 0
+
+    @property
+    def state(self) -> str:
+        """État courant (bascule open -> half_open une fois le délai écoulé)."""
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_duration_s:
+            self._state = self.HALF_OPEN
+            self._half_open_in_flight = 0
+        return self._state
+
+    def is_open(self) -> bool:
+        """Vrai si les appels doivent être court-circuités (sans consommer d'essai)."""
+        state = self.state
+        if state == self.OPEN:
+            return True
+        return state == self.HALF_OPEN and self._half_open_in_flight >= self.half_open_max_calls
+
+    def allow_request(self) -> bool:
+        """Réserve un appel ; à appeler juste avant l'appel réel."""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+            self._half_open_in_flight += 1
+            return True
+        return False
+
+    def record_success(self, latency_s: float) -> None:
+        slow = latency_s >= self.slow_call_threshold_s
+        if self._state == self.HALF_OPEN:
+            self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+            if slow:
+                self._open()
+            else:
+                self._close()
+            return
+        self._calls.append((True, slow))
+        self._evaluate()
+
+    def record_failure(self) -> None:
+        if self._state == self.HALF_OPEN:
+            self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+            self._open()
+            return
+        self._calls.append((False, False))
+        self._evaluate()
+
+    def release(self) -> None:
+        """Libère un appel réservé abandonné (client parti) sans le comptabiliser."""
+        if self._state == self.HALF_OPEN:
+            self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+
+    def _evaluate(self) -> None:
+        total = len(self._calls)
+        if total < self.min_calls:
+            return
+        failures = sum(1 for ok, _ in self._calls if not ok)
+        slow = sum(1 for _, is_slow in self._calls if is_slow)
+        if failures / total >= self.failure_rate_threshold or slow / total >= self.slow_call_rate_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._half_open_in_flight = 0
+        self._times_opened += 1
+        self._calls.clear()
+
+    def _close(self) -> None:
+        self._state = self.CLOSED
+        self._half_open_in_flight = 0
+        self._calls.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """État du disjoncteur, pour diagnostic (endpoint /jan/status)."""
+        state = self.state
+        total = len(self._calls)
+        failures = sum(1 for ok, _ in self._calls if not ok)
+        retry_in = 0.0
+        if state == self.OPEN:
+            retry_in = max(0.0, self.open_duration_s - (time.monotonic() - self._opened_at))
+        return {
+            "name": self.name,
+            "state": state,
+            "window_calls": total,
+            "window_failures": failures,
+            "times_opened": self._times_opened,
+            "retry_in_s": round(retry_in, 1),
+        }
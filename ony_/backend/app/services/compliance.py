@@ -12,11 +12,14 @@ from dataclasses import dataclass
 from typing import Dict, List, Optional, Any
 import os
 
-import yaml
-
+from . import backends
 from ..models.document import ProjectInfo, ComplianceIssue, Document, DocumentType
 
 
+# app/services/ -> app/data/rules.yml
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "rules.yml")
+
+
 @dataclass(frozen=True)
 class _RuleConfig:
     required_fields: List[str]
@@ -29,17 +32,13 @@ class ComplianceEngine:
     """
 
     def __init__(self, rules_path: Optional[str] = None):
-        if rules_path is None:
-            # app/services/ -> app/data/rules.yml
-            base_dir = os.path.dirname(os.path.dirname(__file__))
-            rules_path = os.path.join(base_dir, "data", "rules.yml")
-        self.rules_path = rules_path
+        self.rules_path = rules_path or DEFAULT_RULES_PATH
         self._rules = self._load_rules()
 
     def _load_rules(self) -> Dict[str, Any]:
         try:
             with open(self.rules_path, "r", encoding="utf-8") as f:
-                return yaml.safe_load(f) or {}
+                return backends.load("yaml").safe_load(f) or {}
         except FileNotFoundError:
             return {}
 
@@ -0,0 +1,172 @@
+"""
+Historique de conversation borné pour le chat.
+
+Les derniers échanges sont conservés mot pour mot dans un budget de tokens
+fixe ; les plus anciens sont condensés dans un résumé glissant, lui aussi
+borné. Le coût du prompt reste ainsi constant quelle que soit la longueur
+de la conversation, tout en gardant le contexte des questions de suivi
+("et pour le PC3 ?").
+
+Le résumé est extractif (question + début de réponse) : il ne coûte aucun
+appel supplémentaire au modèle local.
+
+Avec plusieurs workers, l'historique est lu et réécrit dans l'état partagé
+(SharedState) : le message suivant peut arriver sur un autre processus.
+Les méthodes sont bloquantes (SQLite) : à appeler hors de la boucle asyncio.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, List, Optional, Tuple
+
+from .shared_state import SharedState
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation grossière (≈ 4 caractères par token pour le français)."""
+    return len(text) // 4 + 1
+
+
+def _shorten(text: str, max_chars: int, collapse_spaces: bool = True) -> str:
+    if collapse_spaces:
+        text = re.sub(r"\s+", " ", text).strip()
+    if len(text) <= max_chars:
+        return text
+    return text[: max_chars - 1].rstrip() + "…"
+
+
+@dataclass
+class Conversation:
+    """Historique d'une session : résumé glissant + derniers tours verbatim."""
+    summary_lines: Deque[str] = field(default_factory=deque)
+    turns: Deque[Tuple[str, str]] = field(default_factory=deque)  # (role, content)
+
+    @property
+    def summary(self) -> str:
+        return "\n".join(self.summary_lines)
+
+    def recent_messages(self) -> List[dict]:
+        return [{"role": role, "content": content} for role, content in self.turns]
+
+
+def _from_data(data: dict) -> Conversation:
+    """Conversation relue depuis l'état partagé (JSON)."""
+    return Conversation(
+        summary_lines=deque(data["summary_lines"]),
+        turns=deque((role, content) for role, content in data["turns"]),
+    )
+
+
+class ConversationStore:
+    """Historiques par session, compactés à chaque ajout."""
+
+    def __init__(
+        self,
+        recent_token_budget: int = 800,
+        summary_token_budget: int = 300,
+        max_sessions: int = 1000,
+        shared: Optional[SharedState] = None,
+        shared_ttl_s: float = 24 * 3600,
+    ) -> None:
+        self.recent_token_budget = recent_token_budget
+        self.summary_token_budget = summary_token_budget
+        self.max_sessions = max_sessions
+        self.shared = shared
+        self.shared_ttl_s = shared_ttl_s
+        self._sessions: "OrderedDict[str, Conversation]" = OrderedDict()
+        # Appels depuis plusieurs threads du pool
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Conversation]:
+        if self.shared is not None:
+            # L'état partagé fait foi : un autre worker a pu compléter l'historique
+            data = self.shared.get("conversation", session_id)
+            if data is None:
+                with self._lock:
+                    self._sessions.pop(session_id, None)
+                return None
+            conversation = _from_data(data)
+            self._remember(session_id, conversation)
+            return conversation
+        with self._lock:
+            conversation = self._sessions.get(session_id)
+            if conversation is not None:
+                self._sessions.move_to_end(session_id)
+            return conversation
+
+    def append(self, session_id: str, user_message: str, assistant_message: str) -> Conversation:
+        """Ajoute un échange puis compacte l'historique de la session."""
+        if self.shared is not None:
+            # Lecture, ajout et écriture dans une même transaction : deux workers
+            # qui complètent la même session ne perdent pas d'échange
+            data = self.shared.update(
+                "conversation",
+                session_id,
+                lambda current: self._append_data(current, user_message, assistant_message),
+                ttl_s=self.shared_ttl_s,
+            )
+            conversation = _from_data(data)
+            self._remember(session_id, conversation)
+            return conversation
+
+        with self._lock:
+            conversation = self._sessions.get(session_id)
+            if conversation is None:
+                conversation = Conversation()
+                self._store(session_id, conversation)
+            else:
+                self._sessions.move_to_end(session_id)
+            self._add_turn(conversation, user_message, assistant_message)
+        return conversation
+
+    def _append_data(self, data: Optional[dict], user_message: str, assistant_message: str) -> dict:
+        conversation = _from_data(data) if data is not None else Conversation()
+        self._add_turn(conversation, user_message, assistant_message)
+        return {"summary_lines": list(conversation.summary_lines), "turns": list(conversation.turns)}
+
+    def _add_turn(self, conversation: Conversation, user_message: str, assistant_message: str) -> None:
+        # Un tour isolé ne peut pas dépasser la moitié du budget verbatim
+        max_turn_chars = self.recent_token_budget * 2
+        conversation.turns.append(("user", _shorten(user_message, max_turn_chars, collapse_spaces=False)))
+        conversation.turns.append(("assistant", _shorten(assistant_message, max_turn_chars, collapse_spaces=False)))
+        self._compact(conversation)
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self.shared is not None:
+            self.shared.delete("conversation", session_id)
+
+    def _remember(self, session_id: str, conversation: Conversation) -> None:
+        with self._lock:
+            self._store(session_id, conversation)
+
+    def _store(self, session_id: str, conversation: Conversation) -> None:
+        # Appelé sous self._lock
+        self._sessions[session_id] = conversation
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def _compact(self, conversation: Conversation) -> None:
+        # 1) Les tours les plus anciens sortent du budget verbatim, par échange complet
+        while len(conversation.turns) > 2 and self._turns_tokens(conversation) > self.recent_token_budget:
+            _, question = conversation.turns.popleft()
+            _, answer = conversation.turns.popleft()
+            conversation.summary_lines.append(
+                f"- Q: {_shorten(question, 160)} → R: {_shorten(answer, 240)}"
+            )
+
+        # 2) Le résumé garde les lignes les plus récentes dans son propre budget
+        while len(conversation.summary_lines) > 1 and (
+            estimate_tokens(conversation.summary) > self.summary_token_budget
+        ):
+            conversation.summary_lines.popleft()
+
+    @staticmethod
+    def _turns_tokens(conversation: Conversation) -> int:
+        return sum(estimate_tokens(content) for _, content in conversation.turns)
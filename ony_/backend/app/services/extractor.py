@@ -1,108 +1,269 @@
 """
 Service d'extraction de texte des documents PDF et Word
+
+PyMuPDF, pypdf, python-docx, Pillow et pytesseract sont chargés au premier
+usage (registre `backends`) : importer ce module ne coûte rien.
+
+Les erreurs sont journalisées (logger "aqua_verify") et comptées dans les
+métriques ; la durée des passes texte et OCR est relevée dans ExtractionStats.
+
+Avec un suivi mémoire (MemoryTracker), chaque page est un point de contrôle
+du budget : en mode dégradé, le rendu OCR passe en niveaux de gris à plus
+basse résolution, une page à la fois dans le processus.
 """
 from __future__ import annotations
 
-from typing import Tuple, List
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, ContextManager, Optional, Tuple, List
 import io
+import logging
+import time
+
+from . import backends
+from .cancellation import CancellationToken
+from .memory import MemoryBudgetExceeded, MemoryTracker
+from .metrics import EXTRACTION_FALLBACKS, OCR_PAGES
 
-# PDF: on privilégie PyMuPDF si dispo, sinon fallback pypdf (pur Python)
-try:
-    import fitz  # type: ignore  # PyMuPDF
-except Exception:  # pragma: no cover
-    fitz = None  # type: ignore
+logger = logging.getLogger("aqua_verify")
 
-from pypdf import PdfReader
-from docx import Document as DocxDocument
-from PIL import Image
-import pytesseract
 
-# Sur Windows, on peut pointer explicitement vers le binaire tesseract pour éviter
-# les soucis de PATH. Adapte ce chemin si Tesseract est installé ailleurs.
-try:  # pragma: no cover - dépend de l'environnement
-    pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-except Exception as e:  # pragma: no cover
-    print(f"Impossible de configurer pytesseract_cmd: {e}")
+# Rappel de progression : progress(stage, **infos), ex. progress("ocr", page=3, pages=12)
+ProgressCallback = Callable[..., None]
+# Créneau de travail à obtenir avant de traiter chaque page (ordonnancement équitable)
+PageSlot = Callable[[], ContextManager[None]]
+# À incrémenter quand l'extraction change au point de rendre caducs les textes archivés
+EXTRACTION_REVISION = 1
+
+
+@dataclass
+class ExtractionStats:
+    """Déroulé de l'extraction d'un fichier (métriques par étape et par chemin)."""
+    path: str = ""  # "native" | "ocr" (au moins une page OCRisée) | "pypdf" | "docx"
+    pages: int = 0
+    ocr_pages: int = 0
+    text_s: float = 0.0  # passe texte (PyMuPDF, pypdf ou python-docx)
+    ocr_s: float = 0.0  # rendu des pages + Tesseract
 
 
 class TextExtractor:
     """Extracteur de texte pour PDF et Word"""
     
     @staticmethod
-    def _ocr_image(image: Image.Image) -> str:
+    def version(ocr_dpi: int) -> str:
+        """
+        Version de l'extraction dans ce processus : révision du code, moteur PDF
+        (PyMuPDF ou pypdf), OCR disponible ou non, résolution de rendu. Une
+        extraction archivée sous une autre version n'est pas réutilisée.
+
+        Charge PyMuPDF, Pillow et pytesseract s'ils ne l'étaient pas.
+        """
+        pdf = "fitz" if backends.available("fitz") else "pypdf"
+        ocr = backends.available("fitz") and backends.available("PIL") and backends.available("pytesseract")
+        return f"{EXTRACTION_REVISION}:{pdf}:{'ocr' if ocr else 'no-ocr'}:{ocr_dpi}dpi"
+
+    @staticmethod
+    def _ocr_image(image: Any, timeout: Optional[float] = None) -> str:
         """
         Effectue un OCR sur une image via Tesseract.
         On suppose que Tesseract est installé sur la machine (binaire système).
+        `timeout` (secondes) borne le processus tesseract : il est tué à l'échéance.
         """
         try:
             # Langue française prioritaire (à ajuster si besoin).
-            text = pytesseract.image_to_string(image, lang="fra+eng")
+            # pytesseract : timeout=0 signifie "pas de limite", d'où le plancher.
+            text = backends.load("pytesseract").image_to_string(
+                image, lang="fra+eng", timeout=max(timeout, 0.01) if timeout is not None else 0
+            )
             return text or ""
         except Exception as e:  # pragma: no cover - dépend du binaire système
-            print(f"Erreur OCR Tesseract: {e}")
+            logger.warning("Erreur OCR Tesseract: %s", e)
+            EXTRACTION_FALLBACKS.inc(reason="ocr_error")
             return ""
     
     @staticmethod
-    def extract_from_pdf(file_content: bytes) -> Tuple[str, bool]:
+    def probe_pdf(file_content: bytes) -> Tuple[int, int]:
+        """
+        Estimation rapide du coût d'un PDF, sans extraire le texte.
+        
+        Une page sans police n'a pas de texte natif : elle partira en OCR.
+        Sans PyMuPDF, pas d'OCR (pypdf) : aucune page n'est comptée comme scannée.
+        
+        Returns:
+            Tuple (nombre de pages, pages à passer en OCR)
+        """
+        # PDF: on privilégie PyMuPDF si dispo, sinon fallback pypdf (pur Python)
+        if backends.available("fitz"):
+            try:
+                doc = backends.load("fitz").open(stream=file_content, filetype="pdf")
+                try:
+                    return len(doc), sum(1 for page in doc if not page.get_fonts())
+                finally:
+                    doc.close()
+            except Exception:
+                pass
+        try:
+            return len(backends.load("pypdf").PdfReader(io.BytesIO(file_content)).pages), 0
+        except Exception:
+            return 0, 0
+    
+    @staticmethod
+    def _join_pages(pages: List[str]) -> str:
+        return "\n".join(page for page in pages if page.strip())
+    
+    @staticmethod
+    def extract_from_pdf(
+        file_content: bytes,
+        progress: Optional[ProgressCallback] = None,
+        page_slot: Optional[PageSlot] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> Tuple[str, bool]:
         """
         Extrait le texte d'un fichier PDF.
         
         Args:
             file_content: Contenu binaire du fichier PDF
+            progress: Rappel appelé à chaque page ("extracting") et avant chaque OCR ("ocr")
+            page_slot: Créneau obtenu avant le traitement de chaque page
+            cancel_token: Jeton consulté entre deux pages et avant chaque OCR
             
         Returns:
             Tuple (texte extrait, succès)
         """
+        pages, success = TextExtractor.extract_pdf_pages(file_content, progress, page_slot, cancel_token)
+        return TextExtractor._join_pages(pages), success
+    
+    @staticmethod
+    def extract_pdf_pages(
+        file_content: bytes,
+        progress: Optional[ProgressCallback] = None,
+        page_slot: Optional[PageSlot] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        stats: Optional[ExtractionStats] = None,
+        memory: Optional[MemoryTracker] = None,
+    ) -> Tuple[List[str], bool]:
+        """
+        Extrait le texte d'un fichier PDF, page par page.
+        
+        Args:
+            memory: Suivi mémoire de l'analyse (budget consulté à chaque page)
+        
+        Returns:
+            Tuple (texte de chaque page, "" si rien n'a été lu ; succès)
+        """
+        slot = page_slot or nullcontext
+        stats = stats if stats is not None else ExtractionStats()
+        
         # 1) PyMuPDF (meilleur rendu) si disponible
-        if fitz is not None:
+        if backends.available("fitz"):
             try:
-                doc = fitz.open(stream=file_content, filetype="pdf")
-                text_parts: List[str] = []
-
-                for page_num in range(len(doc)):
-                    page = doc[page_num]
-                    text = page.get_text()
-                    if text and text.strip():
-                        # Texte natif disponible : on l'utilise tel quel
-                        text_parts.append(text)
-                    else:
-                        # Pas de texte extrait → tentative d'OCR sur l'image de la page
-                        try:
-                            pix = page.get_pixmap()
-                            img_bytes = pix.tobytes("png")
-                            image = Image.open(io.BytesIO(img_bytes))
-                            ocr_text = TextExtractor._ocr_image(image)
-                            if ocr_text and ocr_text.strip():
-                                text_parts.append(ocr_text)
-                        except Exception as e:  # pragma: no cover - dépend du runtime
-                            print(f"Erreur génération image pour OCR (PyMuPDF): {e}")
-
-                doc.close()
+                doc = backends.load("fitz").open(stream=file_content, filetype="pdf")
+                pages: List[str] = []
+                page_count = len(doc)
+
+                try:
+                    for page_num in range(page_count):
+                        if progress:
+                            progress("extracting", page=page_num + 1, pages=page_count)
+                        with slot():
+                            if cancel_token:
+                                cancel_token.checkpoint("page")
+                            if memory:
+                                memory.checkpoint()
+                            start = time.perf_counter()
+                            page = doc[page_num]
+                            text = page.get_text()
+                            stats.text_s += time.perf_counter() - start
+                            stats.pages += 1
+                            if text and text.strip():
+                                # Texte natif disponible : on l'utilise tel quel
+                                pages.append(text)
+                                continue
+                            # Pas de texte extrait → tentative d'OCR sur l'image de la page
+                            pages.append("")
+                            if cancel_token:
+                                cancel_token.checkpoint("ocr")
+                            if progress:
+                                progress("ocr", page=page_num + 1, pages=page_count)
+                            start = time.perf_counter()
+                            try:
+                                with memory.render_slot(cancel_token) if memory else nullcontext():
+                                    image = TextExtractor._render_page(page, memory)
+                                    if memory:
+                                        memory.sample()
+                                    ocr_text = TextExtractor._ocr_image(
+                                        image,
+                                        timeout=cancel_token.remaining() if cancel_token else None,
+                                    )
+                                    image = None
+                                if ocr_text and ocr_text.strip():
+                                    pages[-1] = ocr_text
+                                OCR_PAGES.inc(outcome="text" if pages[-1] else "empty")
+                            except Exception as e:  # pragma: no cover - dépend du runtime
+                                logger.warning("Erreur génération image pour OCR (PyMuPDF): %s", e)
+                                OCR_PAGES.inc(outcome="error")
+                            finally:
+                                stats.ocr_s += time.perf_counter() - start
+                                stats.ocr_pages += 1
+                finally:
+                    doc.close()
+
+                stats.path = "ocr" if stats.ocr_pages else "native"
                 # Si on n'a vraiment rien récupéré, on indiquera un échec
-                if not text_parts:
-                    return "", False
-                return "\n".join(text_parts), True
+                return pages, any(page.strip() for page in pages)
+            except MemoryBudgetExceeded:
+                raise
             except Exception as e:
-                print(f"Erreur extraction PDF (PyMuPDF): {e}")
+                logger.warning("Erreur extraction PDF (PyMuPDF), repli pypdf: %s", e)
+                EXTRACTION_FALLBACKS.inc(reason="pymupdf_error")
+                stats.pages = stats.ocr_pages = 0
+                stats.text_s = stats.ocr_s = 0.0
+        else:
+            EXTRACTION_FALLBACKS.inc(reason="pymupdf_missing")
 
         # 2) Fallback pypdf (pur Python, plus compatible)
+        stats.path = "pypdf"
         try:
-            reader = PdfReader(io.BytesIO(file_content))
-            text_parts: List[str] = []
-            for page in reader.pages:
-                text = page.extract_text() or ""
-                if text.strip():
-                    text_parts.append(text)
+            reader = backends.load("pypdf").PdfReader(io.BytesIO(file_content))
+            pages = []
+            page_count = len(reader.pages)
+            for page_num, page in enumerate(reader.pages):
+                if progress:
+                    progress("extracting", page=page_num + 1, pages=page_count)
+                with slot():
+                    if cancel_token:
+                        cancel_token.checkpoint("page")
+                    if memory:
+                        memory.checkpoint()
+                    start = time.perf_counter()
+                    pages.append(page.extract_text() or "")
+                    stats.text_s += time.perf_counter() - start
+                    stats.pages += 1
 
             # Avec pypdf on ne gère pas l'OCR directement (pas de rendu image ici).
             # Si aucun texte n'est trouvé, on signale un échec pour laisser la couche supérieure décider.
-            if not text_parts:
-                return "", False
-            return "\n".join(text_parts), True
+            return pages, any(page.strip() for page in pages)
+        except MemoryBudgetExceeded:
+            raise
         except Exception as e:
-            print(f"Erreur extraction PDF (pypdf): {e}")
-            return "", False
+            logger.warning("Erreur extraction PDF (pypdf): %s", e)
+            return [], False
     
+    @staticmethod
+    def _render_page(page: Any, memory: Optional[MemoryTracker] = None) -> Any:
+        """
+        Image PIL de la page pour l'OCR, construite directement depuis les
+        pixels du rendu (sans ré-encodage PNG) ; la pixmap est libérée aussitôt.
+        """
+        fitz = backends.load("fitz")
+        dpi = memory.ocr_dpi if memory else None
+        colorspace = fitz.csGRAY if memory and memory.grayscale else fitz.csRGB
+        pix = page.get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False)
+        if memory:
+            memory.rendered()
+        mode = "L" if pix.n == 1 else "RGB"
+        return backends.load("PIL").frombytes(mode, (pix.width, pix.height), pix.samples)
+
     @staticmethod
     def extract_from_docx(file_content: bytes) -> Tuple[str, bool]:
         """
@@ -116,7 +277,7 @@ class TextExtractor:
         """
         try:
             # Ouvrir le document Word depuis les bytes
-            doc = DocxDocument(io.BytesIO(file_content))
+            doc = backends.load("docx").Document(io.BytesIO(file_content))
             text_parts = []
             
             for paragraph in doc.paragraphs:
@@ -134,31 +295,72 @@ class TextExtractor:
             return full_text, True
             
         except Exception as e:
-            print(f"Erreur extraction Word: {e}")
+            logger.warning("Erreur extraction Word: %s", e)
             return "", False
     
     @staticmethod
-    def extract(file_content: bytes, filename: str) -> Tuple[str, bool]:
+    def extract(
+        file_content: bytes,
+        filename: str,
+        progress: Optional[ProgressCallback] = None,
+        page_slot: Optional[PageSlot] = None,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> Tuple[str, bool]:
         """
         Extrait le texte d'un fichier selon son extension.
         
         Args:
             file_content: Contenu binaire du fichier
             filename: Nom du fichier (pour déterminer le type)
+            progress: Rappel de progression par page (PDF uniquement)
+            page_slot: Créneau de travail par page (un fichier Word compte pour une page)
+            cancel_token: Jeton d'annulation (AnalysisCancelled levée au point de contrôle suivant)
             
         Returns:
             Tuple (texte extrait, succès)
         """
+        pages, success = TextExtractor.extract_pages(file_content, filename, progress, page_slot, cancel_token)
+        return TextExtractor._join_pages(pages), success
+    
+    @staticmethod
+    def extract_pages(
+        file_content: bytes,
+        filename: str,
+        progress: Optional[ProgressCallback] = None,
+        page_slot: Optional[PageSlot] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        stats: Optional[ExtractionStats] = None,
+        memory: Optional[MemoryTracker] = None,
+    ) -> Tuple[List[str], bool]:
+        """
+        Comme extract(), mais conserve le texte de chaque page (un fichier Word = une page).
+        
+        Args:
+            stats: Complété avec le chemin suivi, les pages et les durées des passes
+            memory: Suivi mémoire de l'analyse (budget consulté à chaque page)
+        
+        Returns:
+            Tuple (texte de chaque page, succès)
+        """
         filename_lower = filename.lower()
         
         if filename_lower.endswith(".pdf"):
-            return TextExtractor.extract_from_pdf(file_content)
+            return TextExtractor.extract_pdf_pages(file_content, progress, page_slot, cancel_token, stats, memory)
         elif filename_lower.endswith(".docx"):
-            return TextExtractor.extract_from_docx(file_content)
+            with (page_slot or nullcontext)():
+                if cancel_token:
+                    cancel_token.checkpoint("page")
+                if memory:
+                    memory.checkpoint()
+                start = time.perf_counter()
+                text, success = TextExtractor.extract_from_docx(file_content)
+                if stats is not None:
+                    stats.path, stats.pages = "docx", 1
+                    stats.text_s += time.perf_counter() - start
+            return [text], success
         elif filename_lower.endswith(".doc"):
             # Les fichiers .doc anciens ne sont pas supportés par python-docx
             # On retourne une chaîne vide mais on ne considère pas ça comme un échec
-            return "", True
+            return [], True
         else:
-            return "", False
-
+            return [], False
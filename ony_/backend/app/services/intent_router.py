@@ -0,0 +1,157 @@
+"""
+Routeur d'intentions du chatbot rule-based.
+
+1) Les patterns regex sont compilés en une seule expression (un groupe nommé
+   par pattern) résolue en une passe, en conservant la priorité de la liste :
+   le premier pattern qui correspond gagne, comme avec la boucle de re.search.
+2) En l'absence de correspondance exacte, un index de trigrammes de caractères
+   sur des formulations canoniques résout les questions mal orthographiées
+   ("qels documants manquent ?") avec un score de confiance. Les trigrammes
+   ne portent que sur les mots pleins : "quels sont les délais" partageait
+   "quels sont les" avec "quels sont les problèmes" et passait pour une
+   question sur les non-conformités.
+
+Une intention floue ne sert qu'au chatbot rule-based ; seule une
+correspondance exacte (Intent.exact) peut court-circuiter le modèle.
+
+Chaque question résolue localement est un appel au modèle évité.
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+
+# Groupe capturant non nommé : "(" non échappé, non suivi de "?"
+_UNNAMED_GROUP = re.compile(r"(?<!\\)\((?!\?)")
+
+
+class IntentMatch:
+    """Vue sur la correspondance d'un pattern dans l'expression combinée (même API que re.Match.group)."""
+
+    def __init__(self, match: Optional["re.Match[str]"], index: int) -> None:
+        self._match = match
+        self._index = index
+
+    def group(self, number: int = 0) -> Optional[str]:
+        if self._match is None:
+            return None
+        if number == 0:
+            return self._match.group(f"p{self._index}")
+        return self._match.group(f"p{self._index}_g{number}")
+
+
+class Intent(NamedTuple):
+    """Intention résolue : nom du handler, correspondance, confiance (1.0 si regex exacte)."""
+    handler: str
+    match: Optional[IntentMatch]
+    confidence: float
+
+    @property
+    def exact(self) -> bool:
+        """Résolue par un pattern, pas par l'index flou."""
+        return self.match is not None
+
+
+# Mots-outils (normalisés) ignorés par l'index flou ; la négation ("ne", "pas") est gardée
+STOP_WORDS = frozenset(
+    "a ai au aux c ca ce ces cet cette d de des du elle en est et il ils j je l la le les leur leurs "
+    "m ma me mes mon nos notre on ou par pour qu que quel quelle quelles quels qui s sa se ses son "
+    "sont sur t ta te tes ton tu un une vos votre vous y".split()
+)
+
+
+def normalize(text: str) -> str:
+    """Minuscules, sans accents, ponctuation remplacée par des espaces."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^a-z0-9]+", " ", text)
+    return text.strip()
+
+
+def content_words(text: str) -> List[str]:
+    """Mots normalisés, sans les mots-outils."""
+    return [word for word in normalize(text).split() if word not in STOP_WORDS]
+
+
+def trigrams(text: str) -> Set[str]:
+    """Trigrammes de caractères des mots pleins, mots bornés par des espaces."""
+    words = content_words(text)
+    if not words:
+        return set()
+    padded = f"  {' '.join(words)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Index inversé trigramme -> formulations, similarité de Dice."""
+
+    def __init__(self, phrases: Sequence[Tuple[str, str]]) -> None:
+        # phrases : (formulation, intention)
+        self._labels: List[str] = []
+        self._sizes: List[int] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        for phrase, label in phrases:
+            grams = trigrams(phrase)
+            phrase_id = len(self._labels)
+            self._labels.append(label)
+            self._sizes.append(len(grams))
+            for gram in grams:
+                self._postings[gram].append(phrase_id)
+
+    def best(self, text: str) -> Optional[Tuple[str, float]]:
+        grams = trigrams(text)
+        if not grams:
+            return None
+        overlap: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for phrase_id in self._postings.get(gram, ()):
+                overlap[phrase_id] += 1
+        if not overlap:
+            return None
+        phrase_id, common = max(
+            overlap.items(),
+            key=lambda item: 2 * item[1] / (len(grams) + self._sizes[item[0]]),
+        )
+        return self._labels[phrase_id], 2 * common / (len(grams) + self._sizes[phrase_id])
+
+
+class IntentRouter:
+    """Expression combinée pour les patterns + index flou pour les fautes de frappe."""
+
+    def __init__(
+        self,
+        patterns: Sequence[Tuple[str, str]],
+        canonical_questions: Dict[str, Sequence[str]],
+        min_confidence: float = 0.7,
+    ) -> None:
+        self._handlers = [handler for _, handler in patterns]
+        branches = []
+        for index, (pattern, _) in enumerate(patterns):
+            counter = iter(range(1, 100))
+            named = _UNNAMED_GROUP.sub(lambda _m: f"(?P<p{index}_g{next(counter)}>", pattern)
+            # Le préfixe paresseux fait essayer chaque pattern à toutes les positions
+            # avant de passer au suivant : on garde la priorité de la liste.
+            branches.append(f"[\\s\\S]*?(?P<p{index}>{named})")
+        self._combined = re.compile("^(?:" + "|".join(branches) + ")")
+
+        self._index = TrigramIndex(
+            [(phrase, handler) for handler, phrases in canonical_questions.items() for phrase in phrases]
+        )
+        self.min_confidence = min_confidence
+
+    def resolve(self, message: str) -> Optional[Intent]:
+        text = message.lower().strip()
+        match = self._combined.match(text)
+        if match:
+            # Le groupe englobant du pattern est le dernier refermé
+            index = int((match.lastgroup or "p0")[1:])
+            return Intent(self._handlers[index], IntentMatch(match, index), 1.0)
+
+        best = self._index.best(text)
+        if best and best[1] >= self.min_confidence:
+            return Intent(best[0], None, round(best[1], 3))
+        return None
@@ -6,20 +6,77 @@ exposé via une API compatible OpenAI (chat completions).
 
 L'objectif est de pouvoir expliquer les résultats du moteur de règles
 sans que Jan.ai ne prenne de décisions de conformité.
+
+Le client HTTP (pool de connexions) est propre à chaque processus : il est
+ouvert au démarrage de l'application (open) et fermé à l'arrêt (aclose),
+jamais créé à l'import du module — un processus worker forké ne doit pas
+hériter des connexions de son parent. httpx n'est importé qu'à l'ouverture.
 """
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
 import os
-from typing import List, Dict, Any
+import time
+from typing import TYPE_CHECKING, AsyncIterator, List, Dict, Any, Optional
+
+from . import backends
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .llm_scheduler import LLMPriority, LLMScheduler
+from .metrics import JAN_CHAT_SECONDS
+from .model_router import LLMRequestKind, ModelRoute, ModelRouter, RoutingRule
+from .single_flight import SingleFlight
 
-import httpx
+if TYPE_CHECKING:
+    import httpx
 
 
 JAN_API_BASE_URL = os.getenv("JAN_API_BASE_URL", "http://127.0.0.1:1337/v1")
 JAN_API_KEY = os.getenv("JAN_API_KEY", "defichallenge")
 JAN_MODEL_NAME = os.getenv("JAN_MODEL_NAME", "Qwen3-Zero-Coder-Reasoning-0_8B-NEO-EX-D_AU-IQ4_XS-imat")
 
+# Timeouts séparés : un Jan.ai arrêté doit être détecté en quelques secondes (connexion),
+# alors qu'une génération sur CPU peut légitimement être longue (lecture).
+JAN_CONNECT_TIMEOUT_S = float(os.getenv("JAN_CONNECT_TIMEOUT_S", "3"))
+JAN_READ_TIMEOUT_S = float(os.getenv("JAN_READ_TIMEOUT_S", "60"))
+
+# Disjoncteur : au-delà de ces seuils, les appels sont court-circuités (fallback immédiat)
+JAN_BREAKER_FAILURE_RATE = float(os.getenv("JAN_BREAKER_FAILURE_RATE", "0.5"))
+JAN_BREAKER_SLOW_CALL_S = float(os.getenv("JAN_BREAKER_SLOW_CALL_S", "30"))
+JAN_BREAKER_SLOW_CALL_RATE = float(os.getenv("JAN_BREAKER_SLOW_CALL_RATE", "0.8"))
+JAN_BREAKER_OPEN_S = float(os.getenv("JAN_BREAKER_OPEN_S", "30"))
+
+# Admission : le modèle local ne sert qu'une génération à la fois, les autres patientent
+JAN_MAX_CONCURRENCY = int(os.getenv("JAN_MAX_CONCURRENCY", "1"))
+JAN_MAX_QUEUE = int(os.getenv("JAN_MAX_QUEUE", "16"))
+
+# Routage par classe d'appel : petit modèle pour les pings et questions courtes,
+# grand modèle pour les explications de dossier (par défaut, les deux = JAN_MODEL_NAME).
+JAN_MODEL_SMALL = os.getenv("JAN_MODEL_SMALL", JAN_MODEL_NAME)
+JAN_MODEL_LARGE = os.getenv("JAN_MODEL_LARGE", JAN_MODEL_NAME)
+# Question courte (texte de l'utilisateur seul, hors contexte du dossier) : petit modèle
+JAN_SHORT_QUESTION_CHARS = int(os.getenv("JAN_SHORT_QUESTION_CHARS", "300"))
+JAN_SMALL_SLO_P95_S = float(os.getenv("JAN_SMALL_SLO_P95_S", "10"))
+JAN_LARGE_SLO_P95_S = float(os.getenv("JAN_LARGE_SLO_P95_S", "40"))
+
+
+def build_default_router() -> ModelRouter:
+    """Routes "small" / "large" ; la route "large" se replie sur "small" si son SLO n'est pas tenu."""
+    return ModelRouter(
+        routes=[
+            ModelRoute(name="small", model=JAN_MODEL_SMALL, slo_p95_s=JAN_SMALL_SLO_P95_S),
+            ModelRoute(name="large", model=JAN_MODEL_LARGE, slo_p95_s=JAN_LARGE_SLO_P95_S, downgrade_to="small"),
+        ],
+        rules=[
+            RoutingRule(route="small", kind=LLMRequestKind.PING),
+            RoutingRule(route="large", kind=LLMRequestKind.EXPLAIN),
+            RoutingRule(route="small", kind=LLMRequestKind.ANSWER, max_question_chars=JAN_SHORT_QUESTION_CHARS),
+        ],
+        default_route="large",
+    )
+
 
 class JanAIClient:
     """Client minimal pour appeler un modèle Jan.ai compatible OpenAI."""
@@ -28,32 +85,223 @@ class JanAIClient:
         self.base_url = JAN_API_BASE_URL.rstrip("/")
         self.api_key = JAN_API_KEY
         self.model = JAN_MODEL_NAME
-        self._client = httpx.AsyncClient(
-            base_url=self.base_url,
-            headers={
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            },
-            timeout=60.0,
+        self._client: Optional[httpx.AsyncClient] = None
+        self.breaker = CircuitBreaker(
+            name="jan",
+            failure_rate_threshold=JAN_BREAKER_FAILURE_RATE,
+            slow_call_threshold_s=JAN_BREAKER_SLOW_CALL_S,
+            slow_call_rate_threshold=JAN_BREAKER_SLOW_CALL_RATE,
+            open_duration_s=JAN_BREAKER_OPEN_S,
         )
+        self.scheduler = LLMScheduler(max_concurrency=JAN_MAX_CONCURRENCY, max_queue=JAN_MAX_QUEUE)
+        # Les prompts identiques concurrents partagent une seule génération
+        self.single_flight = SingleFlight()
+        self.router = build_default_router()
 
-    async def chat(self, messages: List[Dict[str, str]]) -> str:
+    def open(self) -> None:
+        """Ouvre le client HTTP du processus (démarrage de l'application)."""
+        if self._client is None:
+            httpx = backends.load("httpx")
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+                timeout=httpx.Timeout(
+                    JAN_READ_TIMEOUT_S,
+                    connect=JAN_CONNECT_TIMEOUT_S,
+                ),
+            )
+
+    async def aclose(self) -> None:
+        """Ferme les connexions (arrêt de l'application)."""
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+    def _http(self) -> httpx.AsyncClient:
+        # Ouverture à la demande si l'application n'a pas démarré par son lifespan (scripts)
+        if self._client is None:
+            self.open()
+        return self._client
+
+    def is_available(self) -> bool:
+        """Faux quand le disjoncteur est ouvert : les routes passent alors directement au fallback."""
+        return not self.breaker.is_open()
+
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        kind: str = LLMRequestKind.ANSWER,
+        question: Optional[str] = None,
+    ) -> str:
         """
         Envoie un échange de type chat au modèle Jan.ai et retourne le texte de réponse.
 
         Args:
             messages: liste de dicts {"role": "system"|"user"|"assistant", "content": "..."}
+            priority: priorité dans la file d'attente du modèle
+            kind: classe d'appel (LLMRequestKind), utilisée pour choisir le modèle
+            question: texte de l'utilisateur seul, dont la longueur choisit le
+                modèle (à défaut, celle de tout le prompt)
+
+        Raises:
+            CircuitOpenError: Jan.ai considéré indisponible
+            LLMQueueFullError: file d'attente pleine
+        """
+        route = self._select_route(messages, kind, question)
+        payload: Dict[str, Any] = {
+            "model": route.model,
+            "messages": messages,
+            "temperature": 0.1,
+        }
+        # Inutile de faire la queue si le circuit est ouvert
+        if self.breaker.is_open():
+            raise CircuitOpenError("Jan.ai indisponible (circuit ouvert)")
+
+        async def call() -> str:
+            async with self.scheduler.slot(priority):
+                start = time.monotonic()
+                content = await self._post_chat(payload)
+                self.router.record(route, time.monotonic() - start)
+                return content
+
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            content = await self.single_flight.do(self._payload_key(payload), call)
+            outcome = "ok"
+            return content
+        except CircuitOpenError:
+            outcome = "circuit_open"
+            raise
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            JAN_CHAT_SECONDS.observe(time.perf_counter() - start, route=route.name, outcome=outcome)
+
+    def _select_route(self, messages: List[Dict[str, str]], kind: str, question: Optional[str]) -> ModelRoute:
+        if question is not None:
+            return self.router.select(kind, len(question))
+        return self.router.select(kind, sum(len(m.get("content") or "") for m in messages))
+
+    @staticmethod
+    def _payload_key(payload: Dict[str, Any]) -> str:
+        """Hash du prompt complet (modèle, messages, paramètres)."""
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def _post_chat(self, payload: Dict[str, Any]) -> str:
+        """Appel HTTP non streaming, comptabilisé par le disjoncteur."""
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("Jan.ai indisponible (circuit ouvert)")
+
+        start = time.monotonic()
+        try:
+            # Important : ne PAS commencer le chemin par "/" sinon on perd le préfixe /v1
+            response = await self._http().post("chat/completions", json=payload)
+            response.raise_for_status()
+            data = response.json()
+            # Le format exact peut varier selon ta version de Jan.ai → à adapter si besoin
+            content = data["choices"][0]["message"]["content"]
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Annulation (client parti) : ni succès ni échec
+            self.breaker.release()
+            raise
+        self.breaker.record_success(time.monotonic() - start)
+        return content
+
+    async def chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+        kind: str = LLMRequestKind.ANSWER,
+        question: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Variante streaming de `chat` : produit les morceaux de texte au fil de la génération.
+
+        Jan.ai renvoie des server-sent events ("data: {...}") au format OpenAI,
+        terminés par "data: [DONE]". Fermer le générateur ferme la connexion HTTP,
+        ce qui interrompt la génération côté Jan.ai. Le créneau de l'ordonnanceur
+        est conservé jusqu'à la fin du flux.
+
+        Comme pour `chat`, la durée est relevée (JAN_CHAT_SECONDS) et, pour un
+        flux mené à son terme, transmise au routeur (SLO de la route).
         """
+        route = self._select_route(messages, kind, question)
         payload: Dict[str, Any] = {
-            "model": self.model,
+            "model": route.model,
             "messages": messages,
             "temperature": 0.1,
+            "stream": True,
         }
-        # Important : ne PAS commencer le chemin par "/" sinon on perd le préfixe /v1
-        response = await self._client.post("chat/completions", json=payload)
-        response.raise_for_status()
-        data = response.json()
-        # Le format exact peut varier selon ta version de Jan.ai → à adapter si besoin
-        return data["choices"][0]["message"]["content"]
+        if self.breaker.is_open():
+            raise CircuitOpenError("Jan.ai indisponible (circuit ouvert)")
+
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            async with self.scheduler.slot(priority):
+                generation_start = time.monotonic()
+                async for content in self._post_chat_stream(payload):
+                    yield content
+                self.router.record(route, time.monotonic() - generation_start)
+            outcome = "ok"
+        except CircuitOpenError:
+            outcome = "circuit_open"
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            # Flux interrompu (client parti) : durée sans signification pour le SLO
+            outcome = "cancelled"
+            raise
+        finally:
+            JAN_CHAT_SECONDS.observe(time.perf_counter() - start, route=route.name, outcome=outcome)
+
+    async def _post_chat_stream(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """Appel HTTP streaming, comptabilisé par le disjoncteur."""
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("Jan.ai indisponible (circuit ouvert)")
+
+        # Pour le disjoncteur, la latence mesurée est le temps jusqu'au premier morceau
+        start = time.monotonic()
+        first_chunk_latency = None
+        try:
+            async with self._http().stream("POST", "chat/completions", json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except ValueError:
+                        continue
+                    choices = chunk.get("choices") or []
+                    if not choices:
+                        continue
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        if first_chunk_latency is None:
+                            first_chunk_latency = time.monotonic() - start
+                        yield content
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Générateur fermé (client déconnecté) ou tâche annulée
+            self.breaker.release()
+            raise
+        self.breaker.record_success(
+            first_chunk_latency if first_chunk_latency is not None else time.monotonic() - start
+        )
 
 
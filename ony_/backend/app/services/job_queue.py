@@ -0,0 +1,550 @@
+"""
+File de jobs d'analyse asynchrones.
+
+POST /api/analyze garde la connexion HTTP ouverte pendant toute l'extraction
+(OCR compris) : plusieurs minutes sur un gros dossier scanné, sans aucun retour.
+Ici le dossier est mis en file et un pool de workers le traite hors de la
+boucle asyncio. Chaque étape (extraction, OCR page n/m, identification,
+évaluation) est publiée comme événement de progression, consultable par
+polling (GET /api/jobs/{id}) ou en flux SSE (GET /api/jobs/{id}/events).
+
+Les jobs en cours se partagent les créneaux de travail page par page via
+le FairWorkScheduler (voie rapide pour les petits dossiers, équité entre
+clients) ; un job démarré ne bloque donc pas les suivants.
+
+La file est bornée (`max_queued`) : au-delà, submit lève JobQueueFullError
+avec une attente estimée (429 + Retry-After côté API) plutôt que d'accumuler
+des dossiers, et leurs fichiers, que les workers ne traiteront pas avant
+longtemps.
+
+Un job peut être annulé (DELETE /api/jobs/{id}, échéance, ou départ du
+dernier client abonné au flux SSE si `cancel_on_disconnect`) : l'extraction
+s'arrête à la page suivante.
+
+Avec plusieurs processus workers, un job n'existe que dans le processus qui
+l'a reçu. Son état et ses événements sont recopiés dans l'état partagé
+(SharedState) : les autres processus servent GET, le flux SSE et DELETE
+(demande d'annulation relevée par le processus propriétaire).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import itertools
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from .cancellation import AnalysisCancelled, CancellationStats, CancellationToken, CancelReason
+from .memory import MemoryGovernor
+from .pipeline import AnalysisResult, DossierFile, close_files, file_names, run_analysis
+from .shared_state import SharedState
+from .work_scheduler import FairWorkScheduler, JobCost, Lane
+
+
+logger = logging.getLogger("aqua_verify")
+
+
+class JobStatus:
+    """États d'un job d'analyse."""
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    FINISHED = {DONE, FAILED, CANCELLED}
+
+
+class AnalysisJob:
+    """Un dossier à analyser et son historique d'événements de progression."""
+
+    def __init__(
+        self,
+        files: List[DossierFile],
+        case_type: str,
+        cost: JobCost,
+        lane: str,
+        client_id: str = "anonymous",
+        session_id: Optional[str] = None,
+        deadline_s: Optional[float] = None,
+        cancel_on_disconnect: bool = False,
+        memo_key: Optional[str] = None,
+    ) -> None:
+        self.job_id = uuid.uuid4().hex
+        self.memo_key = memo_key
+        self.case_type = case_type
+        self.cost = cost
+        self.lane = lane
+        self.client_id = client_id
+        self.session_id = session_id
+        self.filenames = [name for item in files for name in file_names(item)]
+        self.files: Optional[List[DossierFile]] = files  # libéré une fois traité
+        self.status = JobStatus.QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.report_id: Optional[str] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        # L'échéance court dès la soumission (attente en file comprise)
+        self.cancel_token = CancellationToken(deadline_s)
+        self.cancel_on_disconnect = cancel_on_disconnect
+        self.subscribers = 0
+        # Appelé à chaque événement (recopie vers l'état partagé)
+        self.on_event: Optional[Callable[["AnalysisJob", Dict[str, Any]], None]] = None
+        # Remplacé à chaque événement : les abonnés attendent le suivant
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in JobStatus.FINISHED
+
+    @property
+    def last_event(self) -> Optional[Dict[str, Any]]:
+        return self.events[-1] if self.events else None
+
+    def info(self) -> Dict[str, Any]:
+        """État du job (champs d'AnalysisJobInfo, rapport exclu)."""
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "case_type": self.case_type,
+            "files": self.filenames,
+            "lane": self.lane,
+            "estimated_pages": self.cost.pages,
+            "estimated_scanned_pages": self.cost.scanned_pages,
+            "progress": self.last_event,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "report_id": self.report_id,
+            "error": self.error,
+            "cancel_reason": self.cancel_token.reason,
+        }
+
+    def publish(self, stage: str, **info: Any) -> Dict[str, Any]:
+        """Ajoute un événement (depuis la boucle asyncio) et réveille les abonnés."""
+        event = {"seq": len(self.events), "stage": stage, "at": round(time.time(), 3), **info}
+        self.events.append(event)
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        if self.on_event is not None:
+            self.on_event(self, event)
+        return event
+
+    async def wait_for_event(self, seq: int, timeout: Optional[float] = None) -> bool:
+        """Attend qu'un événement de numéro >= seq existe ; False si le délai expire."""
+        changed = self._changed
+        if len(self.events) > seq:
+            return True
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return len(self.events) > seq
+
+
+# Appelé (dans le pool de threads) quand un job aboutit : conserve le rapport, renvoie son id
+ResultCallback = Callable[[AnalysisJob, AnalysisResult], str]
+
+
+class JobQueueFullError(RuntimeError):
+    """File de jobs pleine : la soumission est refusée (à traduire en 429)."""
+
+    def __init__(self, retry_after_s: int) -> None:
+        super().__init__(f"File d'analyses pleine, réessayer dans {retry_after_s}s")
+        self.retry_after_s = retry_after_s
+
+
+class JobManager:
+    """
+    Pool de workers asyncio déléguant l'analyse (bloquante) à un pool de threads.
+
+    `max_active` jobs tournent en même temps ; le travail CPU réel est borné
+    page par page par le scheduler. Au-delà, les jobs attendent en file,
+    ceux de la voie rapide en tête, `max_queued` au plus.
+    """
+
+    # Relevé des demandes d'annulation venues des autres processus
+    REMOTE_CANCEL_POLL_S = 1.0
+    # Flux SSE servi par un autre processus : fréquence de lecture des
+    # événements, et durée de validité de sa marque de présence
+    REMOTE_EVENTS_POLL_S = 0.5
+    REMOTE_WATCH_TTL_S = 5.0
+    # Conservation de l'état d'un job dans l'état partagé
+    SHARED_TTL_S = 24 * 3600
+
+    def __init__(
+        self,
+        on_result: ResultCallback,
+        scheduler: FairWorkScheduler,
+        cancellations: CancellationStats,
+        max_active: int = 8,
+        max_jobs: int = 200,
+        max_queued: int = 50,
+        disconnect_grace_s: float = 15.0,
+        shared: Optional[SharedState] = None,
+        memory: Optional[MemoryGovernor] = None,
+    ) -> None:
+        self.on_result = on_result
+        self.shared = shared
+        self.memory = memory
+        # Écritures vers l'état partagé dans l'ordre des événements, hors boucle asyncio
+        self._mirror_executor = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-mirror") if shared is not None else None
+        )
+        self._closed = False
+        self.scheduler = scheduler
+        self.cancellations = cancellations
+        self.disconnect_grace_s = disconnect_grace_s
+        self.workers = max(1, max_active)
+        self.max_jobs = max_jobs
+        self.max_queued = max(0, max_queued)
+        self._rejected = 0
+        # Durée moyenne (glissante) d'un job, pour estimer l'attente (Retry-After)
+        self._run_time_ema_s = 30.0
+        self._jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._queue: Optional["asyncio.PriorityQueue[Tuple[int, int, AnalysisJob]]"] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._tasks: List["asyncio.Task[None]"] = []
+        # Vérifications d'abandon en attente (client déconnecté du flux d'événements)
+        self._abandon_checks: Set["asyncio.Future[None]"] = set()
+        self._seq = itertools.count()
+        # Attente en file (soumission -> démarrage) par voie
+        self._queue_waits: Dict[str, Deque[float]] = {lane: deque(maxlen=500) for lane in Lane.ALL}
+
+    def _ensure_workers(self) -> "asyncio.PriorityQueue[Tuple[int, int, AnalysisJob]]":
+        # Démarrage paresseux : il faut une boucle asyncio en cours d'exécution
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="analysis"
+            )
+            self._tasks = [
+                asyncio.create_task(self._worker(self._queue)) for _ in range(self.workers)
+            ]
+            if self.shared is not None:
+                self._tasks.append(asyncio.create_task(self._watch_remote_cancels()))
+        return self._queue
+
+    def _register(self, job: AnalysisJob) -> None:
+        if self.shared is not None:
+            job.on_event = self._mirror
+        self._jobs[job.job_id] = job
+        self._evict()
+
+    def _mirror(self, job: AnalysisJob, event: Dict[str, Any]) -> None:
+        if self._closed:
+            return
+        info = job.info()
+
+        def write() -> None:
+            try:
+                self.shared.append_job_event(job.job_id, event)
+                self.shared.set("job", job.job_id, info, ttl_s=self.SHARED_TTL_S)
+            except Exception:
+                logger.exception("Recopie du job %s vers l'état partagé impossible", job.job_id)
+
+        self._mirror_executor.submit(write)
+
+    async def _watch_remote_cancels(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.REMOTE_CANCEL_POLL_S)
+            running = [job_id for job_id, job in self._jobs.items() if not job.finished]
+            if not running:
+                continue
+            try:
+                requests = await loop.run_in_executor(
+                    self._mirror_executor, self.shared.take_cancel_requests, running
+                )
+            except Exception:
+                logger.exception("Lecture des demandes d'annulation impossible")
+                continue
+            for job_id, reason in requests.items():
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    self.cancel(job, reason)
+
+    def submit(
+        self,
+        files: List[DossierFile],
+        cost: JobCost,
+        case_type: str = "PC",
+        client_id: str = "anonymous",
+        session_id: Optional[str] = None,
+        deadline_s: Optional[float] = None,
+        cancel_on_disconnect: bool = False,
+        memo_key: Optional[str] = None,
+    ) -> AnalysisJob:
+        """
+        Met un dossier en file et renvoie le job (statut "queued").
+
+        Raises:
+            JobQueueFullError: `max_queued` jobs attendent déjà (fichiers laissés à l'appelant)
+        """
+        queue = self._ensure_workers()
+        queued = self.queued
+        if queued >= self.max_queued:
+            self._rejected += 1
+            raise JobQueueFullError(self.estimate_wait_s(queued))
+        lane = self.scheduler.lane_for(cost)
+        job = AnalysisJob(
+            files,
+            case_type,
+            cost,
+            lane,
+            client_id=client_id,
+            session_id=session_id,
+            deadline_s=deadline_s,
+            cancel_on_disconnect=cancel_on_disconnect,
+            memo_key=memo_key,
+        )
+        self._register(job)
+        job.publish(
+            JobStatus.QUEUED,
+            position=queued + 1,
+            files=len(job.filenames),
+            lane=lane,
+            pages=cost.pages,
+            scanned_pages=cost.scanned_pages,
+        )
+        rank = 0 if lane == Lane.FAST else 1
+        queue.put_nowait((rank, next(self._seq), job))
+        return job
+
+    @property
+    def queued(self) -> int:
+        """Jobs en attente (un job annulé en file n'en fait plus partie)."""
+        return sum(1 for job in self._jobs.values() if job.status == JobStatus.QUEUED)
+
+    def estimate_wait_s(self, queued: int) -> int:
+        """Estimation grossière de l'attente d'un nouveau job (Retry-After)."""
+        return max(1, int(round((queued / self.workers + 1) * self._run_time_ema_s)))
+
+    def submit_cached(
+        self,
+        filenames: List[str],
+        report_id: str,
+        case_type: str = "PC",
+        client_id: str = "anonymous",
+        session_id: Optional[str] = None,
+    ) -> AnalysisJob:
+        """Job d'un dossier déjà analysé : terminé d'emblée avec le rapport existant."""
+        job = AnalysisJob(
+            [(filename, b"") for filename in filenames],
+            case_type,
+            JobCost(pages=0, scanned_pages=0, units=0.0),
+            Lane.FAST,
+            client_id=client_id,
+            session_id=session_id,
+        )
+        job.files = None
+        job.report_id = report_id
+        job.status = JobStatus.DONE
+        job.started_at = job.finished_at = job.created_at
+        self._register(job)
+        job.publish(JobStatus.DONE, report_id=report_id, cached=True)
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        return self._jobs.get(job_id)
+
+    def remote_info(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """État d'un job exécuté par un autre processus (bloquant : lecture SQLite)."""
+        return self.shared.get("job", job_id) if self.shared is not None else None
+
+    def request_remote_cancel(self, job_id: str, reason: str = CancelReason.CLIENT) -> None:
+        """Transmet l'annulation au processus qui exécute le job (bloquant)."""
+        self.shared.request_cancel(job_id, reason)
+
+    async def remote_events(self, job_id: str, start: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        """Comme events(), pour un job d'un autre processus : lecture du journal partagé."""
+        loop = asyncio.get_running_loop()
+        seq = start
+        while True:
+            # Marque de présence : le processus propriétaire ne considère pas le job abandonné
+            await loop.run_in_executor(
+                None, self.shared.set, "job_watch", job_id, True, self.REMOTE_WATCH_TTL_S
+            )
+            for event in await loop.run_in_executor(None, self.shared.job_events, job_id, seq):
+                yield event
+                seq = event["seq"] + 1
+                if event["stage"] in JobStatus.FINISHED:
+                    return
+            await asyncio.sleep(self.REMOTE_EVENTS_POLL_S)
+
+    def cancel(self, job: AnalysisJob, reason: str = CancelReason.CLIENT) -> bool:
+        """
+        Demande l'annulation d'un job ; False s'il est déjà terminé.
+
+        Un job en file est clos tout de suite, un job en cours s'arrête
+        au prochain point de contrôle de l'extraction.
+        """
+        if job.finished:
+            return False
+        job.cancel_token.cancel(reason)
+        if job.status == JobStatus.QUEUED:
+            self._finish_cancelled(job)
+        return True
+
+    async def events(self, job: AnalysisJob, start: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        """Rejoue les événements depuis `start`, puis suit le job jusqu'à sa fin."""
+        seq = start
+        job.subscribers += 1
+        try:
+            while True:
+                while seq < len(job.events):
+                    yield job.events[seq]
+                    seq += 1
+                if job.finished:
+                    return
+                # Réveil périodique : l'échéance doit être constatée même sans événement
+                if not await job.wait_for_event(seq, timeout=1.0) and job.cancel_token.cancelled:
+                    self.cancel(job, job.cancel_token.reason or CancelReason.DEADLINE)
+        finally:
+            job.subscribers -= 1
+            if job.subscribers == 0 and job.cancel_on_disconnect and not job.finished:
+                # Laisse le temps à une reconnexion (EventSource) avant d'annuler
+                check = asyncio.ensure_future(self._cancel_if_abandoned(job))
+                self._abandon_checks.add(check)
+                check.add_done_callback(self._abandon_checks.discard)
+
+    async def _cancel_if_abandoned(self, job: AnalysisJob) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.disconnect_grace_s)
+            if job.subscribers or job.finished:
+                return
+            if self.shared is None:
+                break
+            # Lecture SQLite hors de la boucle asyncio
+            watched = await loop.run_in_executor(None, self.shared.get, "job_watch", job.job_id)
+            if not watched:
+                break
+            # Suivi depuis un autre processus : nouvelle vérification plus tard
+        if job.subscribers or job.finished:
+            return
+        logger.info("Job d'analyse %s abandonné par le client : annulation", job.job_id)
+        self.cancel(job, CancelReason.DISCONNECT)
+
+    def _finish_cancelled(self, job: AnalysisJob) -> None:
+        close_files(job.files or [])
+        job.files = None
+        job.status = JobStatus.CANCELLED
+        job.finished_at = time.time()
+        job.error = f"Analyse annulée ({job.cancel_token.reason})"
+        self.cancellations.record(job.cancel_token, job.cost.pages, job.cost.scanned_pages)
+        job.publish(JobStatus.CANCELLED, reason=job.cancel_token.reason)
+
+    def snapshot(self) -> Dict[str, Any]:
+        by_status: Dict[str, int] = {}
+        for job in self._jobs.values():
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        queue_waits: Dict[str, Any] = {}
+        for lane, waits in self._queue_waits.items():
+            samples = sorted(waits)
+            queue_waits[lane] = {
+                "started": len(samples),
+                "wait_avg_s": round(sum(samples) / len(samples), 4) if samples else None,
+                "wait_p95_s": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 4) if samples else None,
+                "wait_max_s": round(samples[-1], 4) if samples else None,
+            }
+        return {
+            "max_active": self.workers,
+            "max_queued": self.max_queued,
+            "queued": self.queued,
+            "rejected": self._rejected,
+            "jobs": by_status,
+            "queue_waits": queue_waits,
+            "pages": self.scheduler.snapshot(),
+        }
+
+    async def shutdown(self, grace_s: float = 10.0) -> None:
+        """
+        Arrêt du processus : annule les jobs, laisse `grace_s` aux analyses en
+        cours pour s'arrêter à la page suivante, puis attend la dernière recopie.
+        """
+        running = [job for job in self._jobs.values() if not job.finished]
+        for job in running:
+            self.cancel(job, CancelReason.SHUTDOWN)
+        deadline = time.monotonic() + grace_s
+        while any(not job.finished for job in running) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        tasks = [*self._tasks, *self._abandon_checks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in running:
+            if not job.finished:
+                self._finish_cancelled(job)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._mirror_executor is not None:
+            self._closed = True
+            self._mirror_executor.shutdown(wait=True)
+
+    def _evict(self) -> None:
+        # On oublie d'abord les jobs terminés les plus anciens
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished][:excess]:
+            del self._jobs[job_id]
+
+    async def _worker(self, queue: "asyncio.PriorityQueue[Tuple[int, int, AnalysisJob]]") -> None:
+        while True:
+            _, _, job = await queue.get()
+            try:
+                await self._run(job)
+            finally:
+                queue.task_done()
+
+    async def _run(self, job: AnalysisJob) -> None:
+        if job.finished:
+            return  # annulé pendant l'attente en file
+        if job.cancel_token.cancelled:
+            self._finish_cancelled(job)  # échéance dépassée en file
+            return
+        loop = asyncio.get_running_loop()
+        job.status = JobStatus.RUNNING
+        job.started_at = time.time()
+        self._queue_waits[job.lane].append(job.started_at - job.created_at)
+        job.publish(JobStatus.RUNNING)
+
+        def progress(stage: str, **info: Any) -> None:
+            # Appelé depuis le thread d'analyse : publication sur la boucle asyncio
+            loop.call_soon_threadsafe(lambda: job.publish(stage, **info))
+
+        files, job.files = job.files or [], None
+        token = job.cancel_token
+        page_slot = partial(self.scheduler.slot, job.client_id, job.lane, token)
+        try:
+            result = await loop.run_in_executor(
+                self._executor,
+                partial(run_analysis, files, job.case_type, progress, page_slot, token, memory=self.memory),
+            )
+            if result is None:
+                raise ValueError("Aucun fichier valide trouvé (formats acceptés: PDF, DOCX)")
+            job.report_id = await loop.run_in_executor(self._executor, self.on_result, job, result)
+        except AnalysisCancelled:
+            self._finish_cancelled(job)
+            return
+        except Exception as e:
+            logger.exception("Job d'analyse %s en échec", job.job_id)
+            job.error = str(e) or e.__class__.__name__
+            job.status = JobStatus.FAILED
+            job.finished_at = time.time()
+            job.publish(JobStatus.FAILED, error=job.error)
+            return
+        finally:
+            close_files(files)
+            self._run_time_ema_s = 0.8 * self._run_time_ema_s + 0.2 * (time.time() - job.started_at)
+
+        job.status = JobStatus.DONE
+        job.finished_at = time.time()
+        job.publish(JobStatus.DONE, report_id=job.report_id)
@@ -0,0 +1,149 @@
+"""
+Ordonnanceur des appels au modèle local (Jan.ai).
+
+Le modèle local ne sert en pratique qu'une génération à la fois : sans limite,
+dix chats simultanés partent tous en timeout ensemble. L'ordonnanceur limite
+le nombre d'appels concurrents et fait patienter les autres dans une file
+bornée, par priorité (chat interactif avant explications de fond et pings).
+Quand la file est pleine, l'appel est refusé tout de suite (LLMQueueFullError)
+pour que la route réponde 429 / Retry-After au lieu d'attendre un timeout.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Deque, Dict, List
+
+
+class LLMPriority(IntEnum):
+    """Priorité d'un appel (plus petit = servi en premier)."""
+    INTERACTIVE = 0  # chat utilisateur
+    BACKGROUND = 1  # explications pré-générées
+    PING = 2  # diagnostics
+
+
+class LLMQueueFullError(RuntimeError):
+    """File d'attente pleine : l'appel est refusé (à traduire en 429)."""
+
+    def __init__(self, retry_after_s: int) -> None:
+        super().__init__(f"File d'attente LLM pleine, réessayer dans {retry_after_s}s")
+        self.retry_after_s = retry_after_s
+
+
+class LLMScheduler:
+    """Limite de concurrence + file de priorité bornée, avec métriques d'attente."""
+
+    def __init__(self, max_concurrency: int = 1, max_queue: int = 16) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self._in_flight = 0
+        # Tas de [priorité, ordre d'arrivée, future]
+        self._waiters: List[List[Any]] = []
+        self._seq = itertools.count()
+
+        # Métriques
+        self._rejected = 0
+        self._service_time_ema_s = 10.0
+        self._wait_samples: Dict[LLMPriority, Deque[float]] = {p: deque(maxlen=200) for p in LLMPriority}
+        self._wait_counts: Dict[LLMPriority, int] = {p: 0 for p in LLMPriority}
+        self._wait_max_s: Dict[LLMPriority, float] = {p: 0.0 for p in LLMPriority}
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    @asynccontextmanager
+    async def slot(self, priority: LLMPriority = LLMPriority.INTERACTIVE) -> AsyncIterator[None]:
+        """Réserve un créneau d'appel au modèle pour la durée du bloc `async with`."""
+        queued_at = time.monotonic()
+        await self._acquire(priority)
+        started_at = time.monotonic()
+        self._record_wait(priority, started_at - queued_at)
+        try:
+            yield
+        finally:
+            service_time = time.monotonic() - started_at
+            self._service_time_ema_s = 0.8 * self._service_time_ema_s + 0.2 * service_time
+            self._release()
+
+    def estimate_wait_s(self) -> int:
+        """Estimation grossière de l'attente pour un nouvel arrivant (Retry-After)."""
+        rounds = (len(self._waiters) + self._in_flight) / self.max_concurrency
+        return max(1, int(round(rounds * self._service_time_ema_s)))
+
+    async def _acquire(self, priority: LLMPriority) -> None:
+        if self._in_flight < self.max_concurrency and not self._waiters:
+            self._in_flight += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            # File pleine : on évince le dernier arrivé de plus basse priorité s'il est
+            # moins prioritaire que nous, sinon c'est nous qui sommes refusés.
+            worst = max(self._waiters, key=lambda e: (e[0], e[1]), default=None)
+            if worst is None or worst[0] <= priority:
+                self._rejected += 1
+                raise LLMQueueFullError(self.estimate_wait_s())
+            self._waiters.remove(worst)
+            heapq.heapify(self._waiters)
+            self._rejected += 1
+            worst[2].set_exception(LLMQueueFullError(self.estimate_wait_s()))
+
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        entry = [int(priority), next(self._seq), future]
+        heapq.heappush(self._waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Le créneau nous avait été attribué juste avant l'annulation : on le rend
+                self._release()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        while self._waiters and self._in_flight < self.max_concurrency:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._in_flight += 1
+            future.set_result(None)
+
+    def _record_wait(self, priority: LLMPriority, wait_s: float) -> None:
+        self._wait_samples[priority].append(wait_s)
+        self._wait_counts[priority] += 1
+        self._wait_max_s[priority] = max(self._wait_max_s[priority], wait_s)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Profondeur de file et temps d'attente (moyenne / p95 sur les 200 derniers appels)."""
+        waits: Dict[str, Dict[str, float]] = {}
+        for priority in LLMPriority:
+            samples = sorted(self._wait_samples[priority])
+            p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))] if samples else 0.0
+            waits[priority.name.lower()] = {
+                "count": self._wait_counts[priority],
+                "avg_s": round(sum(samples) / len(samples), 3) if samples else 0.0,
+                "p95_s": round(p95, 3),
+                "max_s": round(self._wait_max_s[priority], 3),
+            }
+        depth_by_priority = {p.name.lower(): 0 for p in LLMPriority}
+        for prio, _, _ in self._waiters:
+            depth_by_priority[LLMPriority(prio).name.lower()] += 1
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "queue_depth": len(self._waiters),
+            "queue_depth_by_priority": depth_by_priority,
+            "rejected": self._rejected,
+            "service_time_ema_s": round(self._service_time_ema_s, 3),
+            "wait": waits,
+        }
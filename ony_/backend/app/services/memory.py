@@ -0,0 +1,210 @@
+"""
+Mémoire consommée par chaque analyse, et budget au-delà duquel elle se dégrade.
+
+Un gros scan fait enfler le worker : pixmap rendue, image pour Tesseract,
+contenu des fichiers et texte extrait coexistent, jusqu'à ce que le noyau tue
+le processus sans qu'on sache quel dossier en était la cause.
+
+Chaque analyse relève, aux points de contrôle de l'extraction (page, rendu
+OCR), la croissance du RSS du processus depuis son début (mémoire native :
+MuPDF, Pillow) et, si MEMORY_TRACK_PYTHON est activé, celle des allocations
+Python (tracemalloc). Les pics sont publiés dans les métriques et journalisés
+avec le nom des fichiers.
+
+Avec un budget :
+- au-delà de `degrade_ratio` du budget, l'analyse passe en mode dégradé
+  (journalisé avec les fichiers en cause) : pages rendues en niveaux de gris
+  à `degraded_ocr_scale` × `ocr_dpi`, et une seule page rendue et OCRisée à
+  la fois dans le processus, toutes analyses dégradées confondues. Un
+  résultat dont des pages ont été OCRisées ainsi n'est ni mémorisé ni
+  archivé : le même dossier sera réanalysé normalement ;
+- au-delà du budget, MemoryBudgetExceeded arrête l'analyse (413) plutôt que
+  de laisser le worker se faire tuer.
+
+Les mesures sont celles du processus : des analyses simultanées dans le même
+worker se comptent mutuellement leur croissance (estimation prudente).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Iterator, List, Optional
+
+from .cancellation import CancellationToken
+from .metrics import MEMORY_DEGRADATIONS, REQUEST_MEMORY_PEAK_BYTES
+
+logger = logging.getLogger("aqua_verify")
+
+MB = 1024 * 1024
+# Attente du rendu sérialisé entre deux consultations du jeton d'annulation
+RENDER_WAIT_S = 0.5
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):  # Windows
+    _PAGE_SIZE = 0
+
+
+def rss_bytes() -> Optional[int]:
+    """RSS courant du processus (Linux), None si indisponible."""
+    if not _PAGE_SIZE:
+        return None
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemoryBudgetExceeded(Exception):
+    """Analyse arrêtée : sa croissance mémoire dépasse le budget."""
+
+    def __init__(self, used: int, budget: int) -> None:
+        super().__init__(
+            f"Budget mémoire de l'analyse dépassé ({used // MB} Mo utilisés, budget {budget // MB} Mo)"
+        )
+        self.used = used
+        self.budget = budget
+
+
+class MemoryGovernor:
+    """
+    Réglages de suivi et de budget mémoire, partagés par les analyses du processus.
+
+    Args:
+        budget_bytes: Croissance mémoire tolérée par analyse (None = illimité)
+        degrade_ratio: Fraction du budget à partir de laquelle l'analyse se dégrade
+        ocr_dpi: Résolution de rendu des pages pour l'OCR
+        degraded_ocr_scale: Résolution en mode dégradé, en fraction de `ocr_dpi`
+        track_python: Suit aussi les allocations Python (tracemalloc, ralentit
+            toutes les allocations du processus)
+    """
+
+    def __init__(
+        self,
+        budget_bytes: Optional[int] = None,
+        degrade_ratio: float = 0.6,
+        ocr_dpi: int = 72,
+        degraded_ocr_scale: float = 0.6,
+        track_python: bool = False,
+    ) -> None:
+        self.budget_bytes = budget_bytes
+        self.degrade_ratio = degrade_ratio
+        self.ocr_dpi = ocr_dpi
+        self.degraded_ocr_dpi = max(1, round(ocr_dpi * min(degraded_ocr_scale, 1.0)))
+        # Sans RSS (Windows), le budget ne peut s'appuyer que sur tracemalloc
+        self.track_python = track_python or (budget_bytes is not None and rss_bytes() is None)
+        if self.track_python and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        # Rendu + OCR d'une seule page à la fois pour les analyses dégradées
+        self._render_lock = threading.Lock()
+
+    def track(self, filenames: List[str]) -> "MemoryTracker":
+        return MemoryTracker(self, filenames)
+
+
+class MemoryTracker:
+    """Suivi mémoire d'une analyse (un seul thread d'analyse)."""
+
+    def __init__(self, governor: MemoryGovernor, filenames: List[str]) -> None:
+        self.governor = governor
+        self.filenames = filenames
+        self.degraded = False
+        # Pages OCRisées en mode dégradé : le résultat ne doit pas être réutilisé
+        self.degraded_pages = 0
+        self.peak_rss = 0  # croissance maximale relevée, en octets
+        self.peak_python = 0
+        self._rss_start = rss_bytes()
+        self._python_start = tracemalloc.get_traced_memory()[0] if governor.track_python else None
+
+    @property
+    def ocr_dpi(self) -> int:
+        return self.governor.degraded_ocr_dpi if self.degraded else self.governor.ocr_dpi
+
+    @property
+    def grayscale(self) -> bool:
+        return self.degraded
+
+    def rendered(self) -> None:
+        """Une page vient d'être rendue pour l'OCR (avec les réglages courants)."""
+        if self.degraded:
+            self.degraded_pages += 1
+
+    def sample(self) -> int:
+        """Relève la mémoire ; renvoie la croissance depuis le début de l'analyse."""
+        if self._rss_start is not None:
+            rss = rss_bytes()
+            if rss is not None:
+                self.peak_rss = max(self.peak_rss, rss - self._rss_start)
+        if self._python_start is not None:
+            current = tracemalloc.get_traced_memory()[0]
+            self.peak_python = max(self.peak_python, current - self._python_start)
+        return max(self.peak_rss, self.peak_python)
+
+    def checkpoint(self) -> None:
+        """
+        Relève la mémoire et applique le budget : passe en mode dégradé, ou
+        lève MemoryBudgetExceeded.
+        """
+        used = self.sample()
+        budget = self.governor.budget_bytes
+        if budget is None:
+            return
+        if used >= budget:
+            MEMORY_DEGRADATIONS.inc(action="rejected")
+            logger.error(
+                "Analyse arrêtée, budget mémoire dépassé (+%d Mo, budget %d Mo) : %s",
+                used // MB, budget // MB, self._label(),
+            )
+            raise MemoryBudgetExceeded(used, budget)
+        if not self.degraded and used >= budget * self.governor.degrade_ratio:
+            self.degraded = True
+            MEMORY_DEGRADATIONS.inc(action="degraded")
+            logger.warning(
+                "Analyse en mode mémoire dégradé (+%d Mo, budget %d Mo ; OCR %d dpi en gris, "
+                "une page à la fois) : %s",
+                used // MB, budget // MB, self.ocr_dpi, self._label(),
+            )
+
+    def render_slot(self, cancel_token: Optional[CancellationToken] = None) -> ContextManager[None]:
+        """Créneau de rendu + OCR d'une page : exclusif dans le processus en mode dégradé."""
+        if not self.degraded:
+            return nullcontext()
+        return self._exclusive(cancel_token)
+
+    @contextmanager
+    def _exclusive(self, cancel_token: Optional[CancellationToken]) -> Iterator[None]:
+        lock = self.governor._render_lock
+        while not lock.acquire(timeout=RENDER_WAIT_S):
+            if cancel_token:
+                cancel_token.checkpoint("ocr")
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def finish(self) -> None:
+        """Publie les pics de l'analyse (métriques, journal)."""
+        self.sample()
+        if self._rss_start is not None:
+            REQUEST_MEMORY_PEAK_BYTES.observe(self.peak_rss, kind="rss")
+        if self._python_start is not None:
+            REQUEST_MEMORY_PEAK_BYTES.observe(self.peak_python, kind="python")
+        logger.info(
+            "Pic mémoire de l'analyse : RSS +%s, Python +%s%s : %s",
+            _mb(self.peak_rss if self._rss_start is not None else None),
+            _mb(self.peak_python if self._python_start is not None else None),
+            f" ({self.degraded_pages} pages OCRisées en mode dégradé)" if self.degraded_pages else "",
+            self._label(),
+        )
+
+    def _label(self) -> str:
+        names = ", ".join(self.filenames[:5])
+        return names + (f" (+{len(self.filenames) - 5} fichiers)" if len(self.filenames) > 5 else "")
+
+
+def _mb(value: Any) -> str:
+    return "n/d" if value is None else f"{value / MB:.1f} Mo"
@@ -0,0 +1,236 @@
+"""
+Métriques de latence et compteurs, exposés au format texte Prometheus (GET /metrics).
+
+On ne savait pas où passait le temps d'une analyse : passe texte PyMuPDF,
+OCR, identification, extraction des infos projet, règles, appels Jan.ai.
+Chaque étape alimente un histogramme (par étape, chemin d'extraction et type
+de pièce) ; des compteurs suivent les caches, les pages OCRisées et les
+replis (pypdf, OCR en échec).
+
+Coût : une observation = un appel à perf_counter, une recherche dichotomique
+dans les bornes et quelques additions sous verrou (~2 µs), à l'échelle d'une
+page ou d'un fichier — négligeable devant l'extraction, les métriques restent
+actives en production. Pas de dépendance (prometheus_client).
+
+Avec plusieurs workers, chaque processus publie périodiquement son instantané
+dans l'état partagé ; /metrics additionne ceux de tous les processus vivants.
+"""
+from __future__ import annotations
+
+import bisect
+import math
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+# Bornes (secondes) : de la page native (ms) à l'OCR d'un gros scan (minutes)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    """Compteur monotone par jeu d'étiquettes."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> List[Tuple[LabelValues, Any]]:
+        with self._lock:
+            return list(self._values.items())
+
+
+class Histogram(_Metric):
+    """Histogramme à bornes fixes par jeu d'étiquettes."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # étiquettes -> [effectifs par borne (+Inf en dernier), somme]
+        self._values: Dict[LabelValues, List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Mesure la durée du bloc (exception comprise)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> List[Tuple[LabelValues, Any]]:
+        with self._lock:
+            return [(key, [list(counts), total]) for key, (counts, total) in self._values.items()]
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric: Any) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrique déjà déclarée : {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Instantané sérialisable en JSON (publication dans l'état partagé)."""
+        return {
+            name: {"series": [[list(key), value] for key, value in metric.snapshot()]}
+            for name, metric in self._metrics.items()
+        }
+
+    def render(self, snapshots: Iterable[Dict[str, Any]] = ()) -> str:
+        """Texte Prometheus de ce processus, additionné des instantanés des autres workers."""
+        merged: Dict[str, Dict[LabelValues, Any]] = {}
+        for snapshot in [self.snapshot(), *snapshots]:
+            for name, data in snapshot.items():
+                metric = self._metrics.get(name)
+                if metric is None:
+                    continue  # worker d'une autre version
+                series = merged.setdefault(name, {})
+                for key, value in data["series"]:
+                    key = tuple(key)
+                    if metric.kind == "counter":
+                        series[key] = series.get(key, 0.0) + value
+                    elif key in series and len(series[key][0]) == len(value[0]):
+                        counts, total = series[key]
+                        series[key] = [[a + b for a, b in zip(counts, value[0])], total + value[1]]
+                    else:
+                        series[key] = [list(value[0]), value[1]]
+
+        lines: List[str] = []
+        for name, metric in self._metrics.items():
+            # Format 0.0.4 : la famille d'un compteur porte le suffixe _total
+            family = f"{name}_total" if metric.kind == "counter" else name
+            lines.append(f"# HELP {family} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {family} {metric.kind}")
+            for key, value in sorted(merged.get(name, {}).items()):
+                labels = list(zip(metric.labelnames, key))
+                if metric.kind == "counter":
+                    lines.append(f"{family}{_labels(labels)} {_number(value)}")
+                    continue
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip((*metric.buckets, math.inf), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else _number(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: List[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in labels) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def process_key() -> str:
+    """Identifiant du processus dans l'état partagé."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+REGISTRY = MetricsRegistry()
+
+# Convention : le nom de compteur ne porte pas le suffixe _total (ajouté au rendu)
+STAGE_SECONDS = REGISTRY.histogram(
+    "aqua_stage_seconds",
+    "Durée des étapes d'analyse (text, ocr : par fichier ; identify : par pièce ; "
+    "project_info, compliance : par dossier)",
+    ("stage", "path", "document_type"),
+)
+JAN_CHAT_SECONDS = REGISTRY.histogram(
+    "aqua_jan_chat_seconds",
+    "Durée des appels JanAIClient.chat et chat_stream, attente de créneau comprise",
+    ("route", "outcome"),
+)
+OCR_PAGES = REGISTRY.counter("aqua_ocr_pages", "Pages passées en OCR", ("outcome",))
+EXTRACTION_FALLBACKS = REGISTRY.counter(
+    "aqua_extraction_fallbacks",
+    "Replis de l'extraction (pypdf faute de PyMuPDF, OCR en échec...)",
+    ("reason",),
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "aqua_cache_requests",
+    "Consultations des caches (report_memo, extraction, explanation)",
+    ("cache", "result"),
+)
+REQUEST_MEMORY_PEAK_BYTES = REGISTRY.histogram(
+    "aqua_request_memory_peak_bytes",
+    "Croissance mémoire maximale d'une analyse (rss : processus ; python : tracemalloc)",
+    ("kind",),
+    buckets=tuple(mb * 1024 * 1024 for mb in (8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)),
+)
+MEMORY_DEGRADATIONS = REGISTRY.counter(
+    "aqua_memory_degradations",
+    "Analyses passées en mode mémoire dégradé (degraded) ou arrêtées par le budget (rejected)",
+    ("action",),
+)
@@ -0,0 +1,131 @@
+"""
+Routage des appels Jan.ai vers un petit ou un grand modèle local.
+
+Un seul JAN_MODEL_NAME servait tout, du ping "pong" à l'explication complète
+d'un dossier. Le routeur choisit un modèle par classe d'appel :
+- petit modèle : pings et questions courtes
+- grand modèle : explications de dossier et questions longues
+
+Une question se mesure à son texte seul : le prompt envoyé reprend aussi le
+résumé du dossier et l'historique, et dépasse toujours quelques milliers de
+caractères, quelle que soit la question.
+
+Chaque route suit sa latence (p95 glissant). Si le p95 dépasse le SLO de la
+route, elle est rétrogradée vers sa route de repli pendant un délai, puis
+retentée.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+
+class LLMRequestKind:
+    """Classes d'appels connues du routeur."""
+    PING = "ping"
+    ANSWER = "answer"  # question de l'utilisateur dans le chat
+    EXPLAIN = "explain"  # explication globale du dossier
+
+
+@dataclass
+class ModelRoute:
+    """Un modèle cible avec son objectif de latence."""
+    name: str
+    model: str
+    slo_p95_s: float
+    downgrade_to: Optional[str] = None  # route de repli si le SLO n'est pas tenu
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=50))
+    downgraded_until: float = 0.0
+    downgrades: int = 0
+
+    def p95(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        samples = sorted(self.latencies)
+        return samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+
+@dataclass(frozen=True)
+class RoutingRule:
+    """Règle : pour `kind` (ou tous si None) et une question d'au plus `max_question_chars`, utiliser `route`."""
+    route: str
+    kind: Optional[str] = None
+    max_question_chars: Optional[int] = None
+
+    def matches(self, kind: str, question_chars: int) -> bool:
+        if self.kind is not None and self.kind != kind:
+            return False
+        if self.max_question_chars is not None and question_chars > self.max_question_chars:
+            return False
+        return True
+
+
+class ModelRouter:
+    """Choisit la route d'un appel (première règle qui correspond) et suit les latences."""
+
+    def __init__(
+        self,
+        routes: List[ModelRoute],
+        rules: List[RoutingRule],
+        default_route: str,
+        min_samples: int = 5,
+        downgrade_cooldown_s: float = 120.0,
+    ) -> None:
+        self.routes: Dict[str, ModelRoute] = {r.name: r for r in routes}
+        self.rules = rules
+        self.default_route = default_route
+        self.min_samples = min_samples
+        self.downgrade_cooldown_s = downgrade_cooldown_s
+
+    def select(self, kind: str, question_chars: int) -> ModelRoute:
+        """
+        Route à utiliser pour un appel, après application des rétrogradations.
+
+        `question_chars` : longueur de la question de l'utilisateur (à défaut, du prompt).
+        """
+        name = self.default_route
+        for rule in self.rules:
+            if rule.matches(kind, question_chars):
+                name = rule.route
+                break
+
+        route = self.routes[name]
+        seen = {route.name}
+        # Suit la chaîne de repli tant que la route est rétrogradée
+        while route.downgrade_to and route.downgraded_until > time.monotonic():
+            fallback = self.routes.get(route.downgrade_to)
+            if fallback is None or fallback.name in seen:
+                break
+            seen.add(fallback.name)
+            route = fallback
+        return route
+
+    def record(self, route: ModelRoute, latency_s: float) -> None:
+        """Enregistre une latence ; rétrograde la route si son p95 dépasse le SLO."""
+        route.latencies.append(latency_s)
+        if route.downgrade_to is None or len(route.latencies) < self.min_samples:
+            return
+        p95 = route.p95()
+        if p95 is not None and p95 > route.slo_p95_s:
+            route.downgraded_until = time.monotonic() + self.downgrade_cooldown_s
+            route.downgrades += 1
+            # On repart de zéro à la ré-activation pour ne pas re-rétrograder sur d'anciens échantillons
+            route.latencies.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        routes: Dict[str, Any] = {}
+        for route in self.routes.values():
+            p95 = route.p95()
+            routes[route.name] = {
+                "model": route.model,
+                "slo_p95_s": route.slo_p95_s,
+                "p95_s": round(p95, 3) if p95 is not None else None,
+                "samples": len(route.latencies),
+                "downgraded": route.downgraded_until > now,
+                "downgrades": route.downgrades,
+            }
+        return {"default_route": self.default_route, "routes": routes}
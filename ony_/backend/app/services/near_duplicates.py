@@ -0,0 +1,189 @@
+"""
+Détection des quasi-doublons (MinHash + LSH).
+
+Un dossier contient souvent la même pièce en plusieurs exemplaires (ex.
+`117 Avis DEA.pdf` scanné et `117 Avis DEA.docx`) : chacun était identifié,
+fouillé par extract_project_info, et comptait dans le score de complétude.
+
+Chaque fichier extrait reçoit une signature MinHash de ses 5-grammes de mots
+(64 valeurs). Une seule fonction de hachage par shingle, répartie en 64
+compartiments (one permutation hashing, compartiments vides densifiés) : le
+coût est linéaire dans la longueur du texte, négligeable devant l'OCR.
+
+- Dans un dossier : les fichiers dont la similarité estimée (Jaccard) atteint
+  NEAR_DUPLICATE_THRESHOLD forment un groupe ; seule la meilleure variante
+  (texte le plus propre, puis le plus long) est analysée, les autres y sont
+  rattachées. Le texte seul ne suffit pas : deux plans différents (PC2, PC3)
+  partagent souvent l'essentiel de leur texte (cartouche), l'appelant ne
+  regroupe que des variantes compatibles (même type identifié ou même nom).
+- Entre dossiers : les signatures sont découpées en BANDS bandes indexées
+  dans l'archive (LSH) ; une pièce redéposée est retrouvée sans comparer
+  toute l'archive.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import struct
+import unicodedata
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+SIGNATURE_SIZE = 64
+BANDS = 16
+ROWS = SIGNATURE_SIZE // BANDS
+SHINGLE_WORDS = 5
+# En deçà, le texte est trop court pour une signature fiable : un cartouche
+# ou un en-tête type (quelques dizaines de mots) ne doit pas suffire à
+# rapprocher deux pièces
+MIN_SHINGLES = 60
+# Similarité (Jaccard estimé) à partir de laquelle deux pièces sont la même
+NEAR_DUPLICATE_THRESHOLD = 0.8
+# Entre dossiers, seuil plus strict : les formulaires types (CERFA) partagent
+# beaucoup de texte d'un dossier à l'autre
+RESUBMISSION_THRESHOLD = 0.9
+
+Signature = Tuple[int, ...]
+
+_BIN_BITS = 6  # 2^6 = SIGNATURE_SIZE compartiments
+_VALUE_BITS = 64 - _BIN_BITS
+_VALUE_MASK = (1 << _VALUE_BITS) - 1
+_PACK = struct.Struct(f"<{SIGNATURE_SIZE}Q")
+_WORD = re.compile(r"\w{2,}")
+
+
+def _words(text: str) -> List[str]:
+    # Sans accents ni casse : OCR et texte natif d'une même pièce coïncident mieux
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    normalized = "".join(c for c in normalized if not unicodedata.combining(c))
+    return _WORD.findall(normalized)
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+def has_enough_shingles(text: str) -> bool:
+    """Texte assez long pour une signature (cf. MIN_SHINGLES)."""
+    return len(_words(text)) - SHINGLE_WORDS + 1 >= MIN_SHINGLES
+
+
+def fingerprint(text: str) -> Optional[Signature]:
+    """Signature MinHash du texte, None s'il est trop court."""
+    words = _words(text)
+    shingles = len(words) - SHINGLE_WORDS + 1
+    if shingles < MIN_SHINGLES:
+        return None
+    bins: List[Optional[int]] = [None] * SIGNATURE_SIZE
+    for i in range(shingles):
+        h = _hash64(" ".join(words[i:i + SHINGLE_WORDS]).encode("utf-8"))
+        index, value = h >> _VALUE_BITS, h & _VALUE_MASK
+        current = bins[index]
+        if current is None or value < current:
+            bins[index] = value
+    # Densification : un compartiment vide reprend le plus proche à droite,
+    # décalé de la distance (même règle pour tous les textes)
+    signature = []
+    for index in range(SIGNATURE_SIZE):
+        for distance in range(SIGNATURE_SIZE):
+            value = bins[(index + distance) % SIGNATURE_SIZE]
+            if value is not None:
+                signature.append(value + (distance << _VALUE_BITS))
+                break
+    return tuple(signature)
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    """Jaccard estimé : part des compartiments égaux."""
+    return sum(1 for x, y in zip(a, b) if x == y) / SIGNATURE_SIZE
+
+
+def pack(signature: Signature) -> bytes:
+    return _PACK.pack(*signature)
+
+
+def unpack(data: bytes) -> Signature:
+    return _PACK.unpack(data)
+
+
+def lsh_buckets(signature: Signature) -> List[Tuple[int, int]]:
+    """(bande, seau) de la signature ; deux pièces proches partagent au moins un seau."""
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(struct.pack(f"<{ROWS}Q", *rows), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, "big", signed=True)))  # INTEGER SQLite signé
+    return buckets
+
+
+def text_quality(text: str) -> Tuple[float, int]:
+    """
+    Clé de qualité d'une variante : part de mots « propres » (lettres
+    seulement) parmi les tokens — le bruit d'OCR la fait baisser — puis longueur.
+    """
+    tokens = text.split()
+    if not tokens:
+        return 0.0, 0
+    clean = sum(1 for token in tokens if token.strip(".,;:!?()«»\"'").isalpha())
+    return clean / len(tokens), len(text)
+
+
+def group_near_duplicates(
+    signatures: Sequence[Optional[Signature]],
+    texts: Sequence[str],
+    threshold: float = NEAR_DUPLICATE_THRESHOLD,
+    compatible: Optional[Callable[[int, int], bool]] = None,
+) -> Dict[int, Tuple[int, float]]:
+    """
+    Quasi-doublons d'un dossier.
+
+    Args:
+        compatible: compatible(i, j) faux interdit de regrouper les pièces i et
+            j, quelle que soit leur similarité ; vérifié pour chaque paire de
+            deux groupes avant de les fusionner
+
+    Returns:
+        index d'un doublon -> (index de la variante gardée, similarité)
+    """
+    parent = list(range(len(signatures)))
+    members: Dict[int, List[int]] = {i: [i] for i in range(len(signatures))}
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Candidats par seaux LSH, confirmés par la similarité estimée
+    seen: Dict[Tuple[int, int], List[int]] = {}
+    for i, signature in enumerate(signatures):
+        if signature is None:
+            continue
+        candidates = set()
+        for bucket in lsh_buckets(signature):
+            candidates.update(seen.setdefault(bucket, []))
+            seen[bucket].append(i)
+        for j in candidates:
+            root_i, root_j = find(i), find(j)
+            if root_i == root_j or similarity(signature, signatures[j]) < threshold:
+                continue
+            if compatible is not None and not all(
+                compatible(a, b) for a in members[root_i] for b in members[root_j]
+            ):
+                continue
+            parent[root_i] = root_j
+            members[root_j].extend(members.pop(root_i))
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(signatures)):
+        groups.setdefault(find(i), []).append(i)
+
+    duplicates: Dict[int, Tuple[int, float]] = {}
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        kept = max(members, key=lambda i: text_quality(texts[i]))
+        for i in members:
+            if i != kept:
+                duplicates[i] = (kept, similarity(signatures[i], signatures[kept]))
+    return duplicates
@@ -0,0 +1,118 @@
+"""
+Réponses Jan.ai "en attente" pour le chat avec budget de latence.
+
+Quand Jan.ai dépasse le budget, /chat renvoie la réponse rule-based tout de suite
+et la génération continue en tâche de fond. Le client récupère ensuite la
+réponse enrichie via l'identifiant fourni (polling ou attente longue).
+
+Avec plusieurs workers, la génération tourne dans le processus qui a servi
+/chat ; son état et sa réponse sont recopiés dans l'état partagé pour que
+/chat/upgrades réponde depuis n'importe quel processus. Les accès à l'état
+partagé (SQLite) se font hors de la boucle asyncio.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .shared_state import SharedState
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+class PendingAnswerStore:
+    """Registre en mémoire des générations Jan.ai poursuivies après la réponse HTTP."""
+
+    # Attente longue sur une génération d'un autre processus : fréquence de lecture
+    SHARED_POLL_S = 0.25
+
+    def __init__(self, ttl_s: float = 600.0, max_entries: int = 256, shared: Optional[SharedState] = None) -> None:
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.shared = shared
+        # id -> (tâche, instant de création)
+        self._entries: "OrderedDict[str, Tuple[asyncio.Task[str], float]]" = OrderedDict()
+
+    async def add(self, task: "asyncio.Task[str]") -> str:
+        """Enregistre une génération en cours et retourne son identifiant."""
+        self._purge()
+        answer_id = uuid.uuid4().hex
+        self._entries[answer_id] = (task, time.monotonic())
+        if self.shared is not None:
+            # Visible des autres processus avant que le client ne reçoive l'identifiant
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                None, self.shared.set, "pending_answer", answer_id, {"status": PENDING}, self.ttl_s
+            )
+            task.add_done_callback(
+                lambda done: loop.run_in_executor(None, self._share_outcome, answer_id, done)
+            )
+        while len(self._entries) > self.max_entries:
+            _, (old_task, _) = self._entries.popitem(last=False)
+            old_task.cancel()
+        return answer_id
+
+    def get(self, answer_id: str) -> Optional["asyncio.Task[str]"]:
+        self._purge()
+        entry = self._entries.get(answer_id)
+        return entry[0] if entry else None
+
+    async def wait(self, answer_id: str, timeout_s: float) -> Optional["asyncio.Task[str]"]:
+        """Attend (au plus `timeout_s`) la fin de la génération ; None si inconnue."""
+        task = self.get(answer_id)
+        if task is None:
+            return None
+        if not task.done() and timeout_s > 0:
+            await asyncio.wait({task}, timeout=timeout_s)
+        return task
+
+    async def result(self, answer_id: str, timeout_s: float) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        (statut, réponse) après au plus `timeout_s` d'attente ; None si inconnue.
+
+        Statut : "pending", "done" (réponse fournie) ou "failed".
+        """
+        task = await self.wait(answer_id, timeout_s)
+        if task is not None:
+            return _outcome(task)
+        if self.shared is None:
+            return None
+        # Génération lancée par un autre processus
+        deadline = time.monotonic() + timeout_s
+        loop = asyncio.get_running_loop()
+        while True:
+            entry = await loop.run_in_executor(None, self.shared.get, "pending_answer", answer_id)
+            if entry is None:
+                return None
+            if entry["status"] != PENDING or time.monotonic() >= deadline:
+                return entry["status"], entry.get("content")
+            await asyncio.sleep(min(self.SHARED_POLL_S, max(0.0, deadline - time.monotonic())))
+
+    def _share_outcome(self, answer_id: str, task: "asyncio.Task[str]") -> None:
+        # Hors de la boucle asyncio (écriture SQLite)
+        status, content = _outcome(task)
+        self.shared.set("pending_answer", answer_id, {"status": status, "content": content}, ttl_s=self.ttl_s)
+
+    def _purge(self) -> None:
+        """Supprime les entrées expirées (et annule les générations encore en cours)."""
+        now = time.monotonic()
+        while self._entries:
+            answer_id, (task, created_at) = next(iter(self._entries.items()))
+            if now - created_at < self.ttl_s:
+                break
+            task.cancel()
+            del self._entries[answer_id]
+
+
+def _outcome(task: "asyncio.Task[str]") -> Tuple[str, Optional[str]]:
+    if not task.done():
+        return PENDING, None
+    if task.cancelled() or task.exception() is not None:
+        return FAILED, None
+    return DONE, task.result()
@@ -0,0 +1,275 @@
+"""
+Chaîne d'analyse d'un dossier : extraction du texte puis analyse rule-based.
+
+Partagée par /api/analyze (synchrone) et par les jobs d'analyse (/api/jobs),
+qui y branchent un rappel de progression. Le résultat garde, en plus du
+rapport, le texte de chaque page de chaque fichier (archivage, recherche).
+
+Chaque fichier extrait reçoit une signature MinHash. Les pièces sont
+identifiées d'abord : seules les variantes de même type identifié (ou de même
+nom au suffixe près, ex. scan PDF et .docx) peuvent être des quasi-doublons ;
+elles ne sont analysées qu'une fois (meilleure variante), les autres sont
+rattachées au rapport dans `documents_doublons`.
+
+Un fichier du dossier est soit un upload (nom, contenu), soit un fichier déjà
+extrait (ExtractedFile relu depuis l'archive par son SHA-256) : ce dernier
+n'est ni relu ni repassé en OCR. Une archive ZIP (ZipDossier) apporte ses
+membres au fil de leur décompression.
+
+Avec un MemoryGovernor, la croissance mémoire de chaque analyse est suivie
+(métriques, journal) et bornée par son budget (voir memory.py).
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import posixpath
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from ..models.document import AnalysisReport, Document, DocumentType
+from .analyzer import DocumentAnalyzer
+from .cancellation import CancellationToken
+from .extractor import ExtractionStats, PageSlot, ProgressCallback, TextExtractor
+from .memory import MemoryGovernor, MemoryTracker
+from .metrics import STAGE_SECONDS
+from .near_duplicates import Signature, fingerprint, group_near_duplicates
+from .zip_dossier import ZipDossier
+
+
+@dataclass
+class ExtractedFile:
+    """Texte extrait d'un fichier, page par page."""
+    filename: str
+    content_hash: str  # SHA-256 du contenu
+    size: int
+    pages: List[str]
+    success: bool
+    signature: Optional[Signature] = field(default=None, repr=False)  # MinHash du texte
+    # Déroulé de l'extraction (None : extraction relue depuis l'archive)
+    extraction: Optional[ExtractionStats] = field(default=None, repr=False)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(page for page in self.pages if page.strip())
+
+
+@dataclass
+class AnalysisResult:
+    """Rapport d'analyse et extraction dont il est issu."""
+    report: AnalysisReport
+    files: List[ExtractedFile]
+    # Pages OCRisées en mode mémoire dégradé : résultat ni mémorisé ni archivé
+    degraded: bool = False
+
+
+# Fichier d'un dossier : upload (nom, contenu), extraction déjà connue ou archive ZIP
+DossierFile = Union[Tuple[str, bytes], ExtractedFile, ZipDossier]
+# Membres décompressés d'avance pendant l'extraction du précédent
+ZIP_PREFETCH = 2
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".doc")
+
+
+def is_supported(filename: str) -> bool:
+    return filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def file_names(item: DossierFile) -> List[str]:
+    """Noms des pièces apportées au dossier (membres pour une archive)."""
+    if isinstance(item, ZipDossier):
+        return item.filenames
+    return [item.filename if isinstance(item, ExtractedFile) else item[0]]
+
+
+def close_files(files: List[DossierFile]) -> None:
+    """Libère les archives (fichiers temporaires) d'un dossier traité ou abandonné."""
+    for item in files:
+        if isinstance(item, ZipDossier):
+            item.close()
+
+
+def _expand(
+    files: List[DossierFile],
+    cancel_token: Optional[CancellationToken] = None,
+) -> Iterator[Union[Tuple[str, bytes], ExtractedFile]]:
+    for item in files:
+        if isinstance(item, ZipDossier):
+            members = item.prefetch(ZIP_PREFETCH, cancel_token)
+            try:
+                yield from members
+            finally:
+                members.close()
+        else:
+            yield item
+
+
+def probe_files(files: List[DossierFile]) -> Tuple[int, int]:
+    """
+    Estimation rapide du travail d'extraction d'un dossier.
+
+    Returns:
+        Tuple (pages à lire, pages à passer en OCR) ; un fichier Word compte pour
+        une page, un fichier déjà extrait ne compte pas, une archive est
+        estimée d'après la taille de ses membres
+    """
+    pages = scanned = 0
+    for item in files:
+        if isinstance(item, ExtractedFile):
+            continue
+        if isinstance(item, ZipDossier):
+            file_pages = item.estimate_pages()
+            pages += file_pages
+            scanned += file_pages
+            continue
+        filename, content = item
+        if filename.lower().endswith(".pdf"):
+            file_pages, file_scanned = TextExtractor.probe_pdf(content)
+            pages += file_pages
+            scanned += file_scanned
+        elif is_supported(filename):
+            pages += 1
+    return pages, scanned
+
+
+def extract_files(
+    files: List[DossierFile],
+    progress: Optional[ProgressCallback] = None,
+    page_slot: Optional[PageSlot] = None,
+    cancel_token: Optional[CancellationToken] = None,
+    memory: Optional[MemoryTracker] = None,
+) -> List[ExtractedFile]:
+    """
+    Extrait le texte de chaque fichier supporté.
+
+    Args:
+        files: Uploads (nom_fichier, contenu_binaire) et fichiers déjà extraits
+        progress: Rappel de progression ; reçoit en plus le fichier courant
+        page_slot: Créneau de travail à obtenir pour chaque page
+        cancel_token: Jeton d'annulation (AnalysisCancelled entre deux pages)
+        memory: Suivi mémoire (MemoryBudgetExceeded au-delà du budget)
+
+    Returns:
+        Texte extrait de chaque fichier supporté
+    """
+    supported = [item for item in files if isinstance(item, ZipDossier) or is_supported(file_names(item)[0])]
+    total = sum(len(file_names(item)) for item in supported)
+    extracted: List[ExtractedFile] = []
+    for index, item in enumerate(_expand(supported, cancel_token)):
+        if isinstance(item, ExtractedFile):
+            extracted.append(item)
+            continue
+        filename, content = item
+        file_progress = None
+        if progress:
+            def file_progress(stage: str, _filename=filename, _index=index, **info) -> None:
+                progress(stage, file=_filename, file_index=_index + 1, files=total, **info)
+
+            file_progress("extracting")
+        stats = ExtractionStats()
+        pages, success = TextExtractor.extract_pages(
+            content, filename, file_progress, page_slot, cancel_token, stats, memory
+        )
+        extracted_file = ExtractedFile(
+            filename=filename,
+            content_hash=hashlib.sha256(content).hexdigest(),
+            size=len(content),
+            pages=pages,
+            success=success,
+            extraction=stats,
+        )
+        extracted_file.signature = fingerprint(extracted_file.text)
+        extracted.append(extracted_file)
+    return extracted
+
+
+def run_analysis(
+    files: List[DossierFile],
+    case_type: str = "PC",
+    progress: Optional[ProgressCallback] = None,
+    page_slot: Optional[PageSlot] = None,
+    cancel_token: Optional[CancellationToken] = None,
+    memory: Optional[MemoryGovernor] = None,
+) -> Optional[AnalysisResult]:
+    """
+    Extrait puis analyse un dossier complet (bloquant : à exécuter hors de la boucle asyncio).
+
+    Args:
+        memory: Budget mémoire ; l'analyse se dégrade puis lève MemoryBudgetExceeded
+
+    Returns:
+        Rapport d'analyse et texte extrait, ou None si aucun fichier n'est dans un format accepté
+    """
+    tracker = memory.track([name for item in files for name in file_names(item)]) if memory else None
+    try:
+        extracted = extract_files(files, progress, page_slot, cancel_token, tracker)
+        if not extracted:
+            return None
+        if cancel_token:
+            cancel_token.checkpoint()
+        texts = [f.text for f in extracted]
+        analyzer = DocumentAnalyzer(case_type=case_type)
+        identified = analyzer.identify_documents([(f.filename, texts[i]) for i, f in enumerate(extracted)], progress)
+        duplicates = group_near_duplicates(
+            [f.signature for f in extracted], texts, compatible=_same_piece(extracted, identified),
+        )
+        kept = [i for i in range(len(extracted)) if i not in duplicates]
+        report = analyzer.analyze_documents(
+            [(extracted[i].filename, texts[i]) for i in kept], progress, [identified[i] for i in kept],
+        )
+        _link_duplicates(report, extracted, texts, duplicates)
+        _observe_extraction(report, extracted)
+        return AnalysisResult(report=report, files=extracted, degraded=bool(tracker and tracker.degraded_pages))
+    finally:
+        if tracker:
+            tracker.finish()
+
+
+def _same_piece(
+    extracted: List[ExtractedFile], identified: List[Tuple[DocumentType, float]]
+) -> Callable[[int, int], bool]:
+    """Variantes possibles d'une même pièce : même type identifié, ou même nom sans l'extension."""
+    stems = [os.path.splitext(posixpath.basename(f.filename.replace("\\", "/")))[0].lower() for f in extracted]
+
+    def compatible(i: int, j: int) -> bool:
+        type_i, type_j = identified[i][0], identified[j][0]
+        return (type_i == type_j and type_i != DocumentType.AUTRE) or stems[i] == stems[j]
+
+    return compatible
+
+
+def _observe_extraction(report: AnalysisReport, extracted: List[ExtractedFile]) -> None:
+    """Durées d'extraction par chemin, rattachées au type de pièce identifié."""
+    types = {
+        doc.filename: doc.document_type.value
+        for doc in report.documents_conformes + report.documents_non_conformes + report.documents_doublons
+    }
+    for item in extracted:
+        stats = item.extraction
+        if stats is None or not stats.path:
+            continue
+        document_type = types.get(item.filename, "")
+        STAGE_SECONDS.observe(stats.text_s, stage="text", path=stats.path, document_type=document_type)
+        if stats.ocr_pages:
+            STAGE_SECONDS.observe(stats.ocr_s, stage="ocr", path=stats.path, document_type=document_type)
+
+
+def _link_duplicates(
+    report: AnalysisReport,
+    extracted: List[ExtractedFile],
+    texts: List[str],
+    duplicates: Dict[int, Tuple[int, float]],
+) -> None:
+    """Rattache chaque quasi-doublon à la variante analysée (même type de pièce)."""
+    analyzed = {doc.filename: doc for doc in report.documents_conformes + report.documents_non_conformes}
+    for index, (kept_index, similarity) in sorted(duplicates.items()):
+        kept = analyzed[extracted[kept_index].filename]
+        report.documents_doublons.append(Document(
+            filename=extracted[index].filename,
+            document_type=kept.document_type,
+            status=kept.status,
+            confidence=kept.confidence,
+            extracted_text=texts[index][:1000] or None,
+            duplicate_of=kept.filename,
+            similarity=round(similarity, 3),
+        ))
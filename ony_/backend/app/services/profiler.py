@@ -0,0 +1,292 @@
+"""
+Profilage à la demande d'une analyse (/api/analyze), par échantillonnage.
+
+Un dossier anormalement lent (expression régulière qui s'emballe, plan
+vectoriel énorme) ne se reproduit pas toujours hors production. Sur demande
+authentifiée (PROFILING_TOKEN), la requête est profilée : un thread relève
+toutes les PROFILE_INTERVAL_S la pile des threads qui travaillent pour elle
+et ne garde que les piles qui traversent le code de l'application.
+
+Threads échantillonnés : celui de la boucle asyncio, et ceux du pool qui
+exécutent un appel de la requête passé par profiled_call (résolution des
+fichiers, extraction et OCR, archivage), le temps de cet appel. La boucle
+est partagée : ses piles peuvent appartenir à d'autres requêtes du worker
+(signalé dans les métadonnées du profil, `shared_threads`). Les threads lancés
+par l'analyse elle-même (décompression ZIP d'avance) ne sont pas suivis.
+
+Le profil est enregistré sous un identifiant (en-tête X-Profile-Id) au format
+speedscope (https://www.speedscope.app), un profil par thread ; il est aussi
+téléchargeable en piles repliées (« folded », flamegraph.pl / speedscope).
+
+Sans demande de profilage, rien ne tourne : aucun coût.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+# Seules les piles passant par ce répertoire (code de l'application) sont gardées
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+Frame = Tuple[str, str, int]  # (fonction, fichier, ligne de définition)
+Stack = Tuple[Frame, ...]  # de la racine vers la feuille
+T = TypeVar("T")
+
+# Échantillonneur de la requête en cours (propagé aux threads du pool par run_in_threadpool)
+_current: ContextVar[Optional["SamplingProfiler"]] = ContextVar("aqua_verify_profiler", default=None)
+
+
+class SamplingProfiler:
+    """
+    Échantillonneur des piles des threads rattachés à une requête.
+
+    Args:
+        interval_s: Intervalle entre deux relevés
+        max_duration_s: Au-delà, l'échantillonnage s'arrête de lui-même
+    """
+
+    def __init__(self, interval_s: float = 0.005, max_duration_s: float = 300.0) -> None:
+        self.interval_s = interval_s
+        self.max_duration_s = max_duration_s
+        # (nom du thread, pile) -> nombre d'échantillons
+        self.samples: Counter = Counter()
+        self.started_at = 0.0
+        self.duration_s = 0.0
+        # Threads partagés avec d'autres requêtes (boucle asyncio)
+        self.shared_threads: List[str] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Threads échantillonnés : ident -> nombre d'appels en cours
+        self._attached: Dict[int, int] = {}
+        self._attached_lock = threading.Lock()
+        self._token: Any = None
+
+    def start(self) -> None:
+        """
+        Démarre l'échantillonnage, à appeler depuis la tâche de la requête : le
+        thread appelant (boucle asyncio) est suivi, et les appels profiled_call
+        de cette tâche le sont aussi.
+        """
+        self.started_at = time.time()
+        self.shared_threads = [threading.current_thread().name]
+        self._attach(threading.get_ident())
+        self._token = _current.set(self)
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        self.duration_s = round(time.time() - self.started_at, 4)
+
+    @contextmanager
+    def attached(self) -> Iterator[None]:
+        """Échantillonne le thread courant le temps du bloc."""
+        ident = threading.get_ident()
+        self._attach(ident)
+        try:
+            yield
+        finally:
+            with self._attached_lock:
+                self._attached[ident] -= 1
+                if not self._attached[ident]:
+                    del self._attached[ident]
+
+    def _attach(self, ident: int) -> None:
+        with self._attached_lock:
+            self._attached[ident] = self._attached.get(ident, 0) + 1
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + self.max_duration_s
+        while not self._stop.wait(self.interval_s) and time.monotonic() < deadline:
+            with self._attached_lock:
+                attached = set(self._attached)
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident not in attached:
+                    continue
+                stack = _stack(frame)
+                if stack is not None:
+                    self.samples[(names.get(ident, str(ident)), stack)] += 1
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.samples.values())
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        """Profil au format speedscope (un profil « sampled » par thread)."""
+        frames: List[Dict[str, Any]] = []
+        index: Dict[Frame, int] = {}
+        by_thread: Dict[str, List[Tuple[List[int], int]]] = {}
+        for (thread_name, stack), count in sorted(self.samples.items()):
+            ids = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                ids.append(index[frame])
+            by_thread.setdefault(thread_name, []).append((ids, count))
+
+        profiles = []
+        for thread_name, stacks in sorted(by_thread.items(), key=lambda item: -sum(c for _, c in item[1])):
+            weights = [count * self.interval_s for _, count in stacks]
+            profiles.append({
+                "type": "sampled",
+                "name": thread_name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 6),
+                "samples": [ids for ids, _ in stacks],
+                "weights": [round(weight, 6) for weight in weights],
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "aqua_verify",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+
+def profiled_call(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Appelle func ; si la requête appelante est profilée, le thread est
+    échantillonné pendant l'appel. S'utilise via run_in_threadpool(profiled_call, func, ...).
+    """
+    profiler = _current.get()
+    if profiler is None:
+        return func(*args, **kwargs)
+    with profiler.attached():
+        return func(*args, **kwargs)
+
+
+def _stack(frame: Any) -> Optional[Stack]:
+    stack: List[Frame] = []
+    in_app = False
+    while frame is not None:
+        code = frame.f_code
+        filename = code.co_filename
+        in_app = in_app or filename.startswith(APP_ROOT)
+        stack.append((code.co_name, _short_path(filename), code.co_firstlineno))
+        frame = frame.f_back
+    if not in_app:
+        return None
+    stack.reverse()
+    return tuple(stack)
+
+
+def _short_path(filename: str) -> str:
+    # Chemins lisibles : relatifs à l'application, ou à site-packages / la bibliothèque standard
+    if filename.startswith(APP_ROOT):
+        return os.path.join("app", os.path.relpath(filename, APP_ROOT))
+    marker = f"{os.sep}site-packages{os.sep}"
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return filename
+
+
+def folded(speedscope: Dict[str, Any], interval_s: float) -> str:
+    """
+    Piles repliées (« thread;racine;...;feuille échantillons »), pour flamegraph.pl.
+
+    Les poids speedscope sont des durées (échantillons × `interval_s`, celui
+    enregistré dans les métadonnées du profil).
+    """
+    frames = speedscope["shared"]["frames"]
+    lines = []
+    for profile in speedscope["profiles"]:
+        for ids, weight in zip(profile["samples"], profile["weights"]):
+            names = [profile["name"]] + [f"{frames[i]['name']} ({frames[i]['file']}:{frames[i]['line']})" for i in ids]
+            # flamegraph.pl attend un nombre entier d'échantillons
+            lines.append(f"{';'.join(name.replace(';', ',') for name in names)} {round(weight / interval_s)}")
+    return "\n".join(lines) + "\n"
+
+
+class ProfileStore:
+    """
+    Profils enregistrés sur disque (répertoire partagé entre workers) :
+    `<id>.speedscope.json` et `<id>.meta.json`, les plus anciens supprimés
+    au-delà de `max_profiles`.
+    """
+
+    def __init__(self, directory: str, max_profiles: int = 50) -> None:
+        self.directory = directory
+        self.max_profiles = max_profiles
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def save(self, profile_id: str, profiler: SamplingProfiler, meta: Dict[str, Any]) -> Dict[str, Any]:
+        meta = {
+            "profile_id": profile_id,
+            "created_at": profiler.started_at,
+            "duration_s": profiler.duration_s,
+            "samples": profiler.sample_count,
+            "interval_s": profiler.interval_s,
+            "threads": sorted({thread_name for thread_name, _ in profiler.samples}),
+            "shared_threads": profiler.shared_threads,
+            **meta,
+        }
+        self._write(f"{profile_id}.speedscope.json", profiler.speedscope(f"/api/analyze {profile_id}"))
+        self._write(f"{profile_id}.meta.json", meta)
+        self._purge()
+        return meta
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Profils du plus récent au plus ancien."""
+        profiles = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".meta.json"):
+                try:
+                    with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                        profiles.append(json.load(f))
+                except (OSError, ValueError):
+                    continue  # en cours d'écriture ou supprimé
+        return sorted(profiles, key=lambda meta: meta.get("created_at", 0), reverse=True)
+
+    def speedscope_path(self, profile_id: str) -> Optional[str]:
+        return self._path(profile_id, ".speedscope.json")
+
+    def meta(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        path = self._path(profile_id, ".meta.json")
+        if path is None:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _path(self, profile_id: str, suffix: str) -> Optional[str]:
+        if not all(c in "0123456789abcdef" for c in profile_id) or len(profile_id) != 32:
+            return None
+        path = os.path.join(self.directory, f"{profile_id}{suffix}")
+        return path if os.path.exists(path) else None
+
+    def _write(self, name: str, data: Dict[str, Any]) -> None:
+        # Écriture atomique : un autre worker peut lister pendant ce temps
+        path = os.path.join(self.directory, name)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def _purge(self) -> None:
+        for meta in self.list()[self.max_profiles:]:
+            for suffix in (".speedscope.json", ".meta.json"):
+                try:
+                    os.remove(os.path.join(self.directory, f"{meta['profile_id']}{suffix}"))
+                except OSError:
+                    pass
@@ -8,12 +8,34 @@ réglementation (retrieval à implémenter).
 
 from __future__ import annotations
 
-from typing import List, Dict
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import AsyncIterator, List, Dict, Optional
 
 from .jan_client import JanAIClient
+from .llm_scheduler import LLMPriority
+from .metrics import CACHE_REQUESTS
+from .model_router import LLMRequestKind
+from .shared_state import SharedState
+from .conversation import Conversation
 from ..models.document import AnalysisReport, ComplianceIssue
 
 
+logger = logging.getLogger("aqua_verify")
+
+
+def report_cache_key(report: AnalysisReport) -> str:
+    """
+    Clé stable d'un rapport : son report_id (haché de contenu, déjà calculé
+    à l'analyse) ; à défaut, haché de sa sérialisation JSON.
+    """
+    if report.report_id:
+        return report.report_id
+    return hashlib.sha256(report.model_dump_json().encode("utf-8")).hexdigest()
+
+
 class RAGService:
     """
     Service RAG (squelette) :
@@ -21,11 +43,109 @@ class RAGService:
     - appelle Jan.ai pour produire une explication pédagogique du rapport
     """
 
-    def __init__(self, jan_client: JanAIClient) -> None:
+    def __init__(
+        self,
+        jan_client: JanAIClient,
+        max_cached_explanations: int = 32,
+        shared: Optional[SharedState] = None,
+        shared_ttl_s: float = 24 * 3600,
+    ) -> None:
         self.jan_client = jan_client
         # TODO: brancher ici la base vectorielle / index réglementaire
 
-    async def explain_issues(self, report: AnalysisReport) -> str:
+        # Explications déjà générées (ou en cours) par rapport : clé -> tâche asyncio.
+        # Une tâche en cours est partagée, ce qui évite de lancer deux générations
+        # identiques (pré-génération après /analyze + premier message du chat).
+        self.max_cached_explanations = max_cached_explanations
+        self._explanations: "OrderedDict[str, asyncio.Future[str]]" = OrderedDict()
+        # Avec plusieurs workers, les explications terminées sont recopiées dans
+        # l'état partagé : un autre processus les réutilise sans les régénérer
+        self.shared = shared
+        self.shared_ttl_s = shared_ttl_s
+
+    async def has_explanation(self, report: AnalysisReport) -> bool:
+        """
+        Indique si une explication est disponible (générée ici ou par un autre
+        processus) ou en cours de génération dans ce processus.
+        """
+        key = report_cache_key(report)
+        return key in self._explanations or await self._load_shared(key)
+
+    async def get_explanation(
+        self,
+        report: AnalysisReport,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+    ) -> str:
+        """
+        Retourne l'explication du rapport, en réutilisant une génération
+        terminée ou en attente plutôt que d'en relancer une.
+
+        La priorité n'est utilisée que si la génération doit être lancée.
+        """
+        key = report_cache_key(report)
+        task = self._explanations.get(key)
+        if task is None and self.shared is not None:
+            await self._load_shared(key)
+            task = self._explanations.get(key)
+        CACHE_REQUESTS.inc(cache="explanation", result="miss" if task is None else "hit")
+        if task is None:
+            task = asyncio.ensure_future(self.explain_issues(report, priority=priority))
+            self._remember(key, task)
+            if self.shared is not None:
+                loop = asyncio.get_running_loop()
+                task.add_done_callback(lambda done: loop.run_in_executor(None, self._share, key, done))
+        else:
+            self._explanations.move_to_end(key)
+
+        try:
+            # shield : la déconnexion d'un client ne doit pas annuler la génération partagée
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Génération en échec : on l'oublie pour permettre un nouvel essai
+            if self._explanations.get(key) is task:
+                del self._explanations[key]
+            raise
+
+    def _remember(self, key: str, task: "asyncio.Future[str]") -> None:
+        self._explanations[key] = task
+        while len(self._explanations) > self.max_cached_explanations:
+            self._explanations.popitem(last=False)
+
+    async def _load_shared(self, key: str) -> bool:
+        """Reprend l'explication terminée par un autre processus ; False si absente."""
+        if self.shared is None:
+            return False
+        loop = asyncio.get_running_loop()
+        explanation = await loop.run_in_executor(None, self.shared.get, "explanation", key)
+        if explanation is None:
+            return False
+        # Une génération locale a pu démarrer pendant la lecture : elle est gardée
+        if key not in self._explanations:
+            future: "asyncio.Future[str]" = loop.create_future()
+            future.set_result(explanation)
+            self._remember(key, future)
+        return True
+
+    def _share(self, key: str, task: "asyncio.Future[str]") -> None:
+        # Hors de la boucle asyncio (écriture SQLite) ; les échecs ne sont pas partagés
+        if task.cancelled() or task.exception() is not None:
+            return
+        self.shared.set("explanation", key, task.result(), ttl_s=self.shared_ttl_s)
+
+    async def pregenerate_explanation(self, report: AnalysisReport) -> None:
+        """Génère l'explication en tâche de fond (erreurs journalisées, jamais levées)."""
+        try:
+            await self.get_explanation(report, priority=LLMPriority.BACKGROUND)
+        except Exception as e:
+            logger.warning("Pré-génération de l'explication impossible: %s", e)
+
+    async def explain_issues(
+        self,
+        report: AnalysisReport,
+        priority: LLMPriority = LLMPriority.INTERACTIVE,
+    ) -> str:
         """
         Produit une explication globale des non-conformités à partir du rapport.
 
@@ -82,17 +202,44 @@ class RAGService:
             {"role": "user", "content": user_content},
         ]
 
-        return await self.jan_client.chat(messages)
+        return await self.jan_client.chat(messages, priority=priority, kind=LLMRequestKind.EXPLAIN)
 
-    async def answer(self, report: AnalysisReport, user_message: str) -> str:
+    async def answer(
+        self,
+        report: AnalysisReport,
+        user_message: str,
+        conversation: Optional[Conversation] = None,
+    ) -> str:
         """
         Répond à une question utilisateur en s'appuyant sur le rapport et (plus tard) le retrieval RAG.
 
         Pour le moment, on injecte :
         - un résumé du dossier (score, manquants, infos projet)
+        - l'historique borné de la conversation (résumé + derniers échanges)
         - les non-conformités (ComplianceIssue)
         - la question de l'utilisateur
         """
+        messages = self._build_answer_messages(report, user_message, conversation)
+        return await self.jan_client.chat(messages, kind=LLMRequestKind.ANSWER, question=user_message)
+
+    async def answer_stream(
+        self,
+        report: AnalysisReport,
+        user_message: str,
+        conversation: Optional[Conversation] = None,
+    ) -> AsyncIterator[str]:
+        """Variante streaming de `answer` : produit la réponse morceau par morceau."""
+        messages = self._build_answer_messages(report, user_message, conversation)
+        async for chunk in self.jan_client.chat_stream(messages, kind=LLMRequestKind.ANSWER, question=user_message):
+            yield chunk
+
+    def _build_answer_messages(
+        self,
+        report: AnalysisReport,
+        user_message: str,
+        conversation: Optional[Conversation] = None,
+    ) -> List[Dict[str, str]]:
+        """Construit les messages envoyés à Jan.ai pour répondre à une question."""
         issues: List[ComplianceIssue] = getattr(report, "compliance_issues", []) or []
 
         if issues:
@@ -131,9 +278,18 @@ class RAGService:
                     "Si une information manque, dis-le explicitement."
                 ),
             },
-            {"role": "user", "content": user_content},
         ]
 
-        return await self.jan_client.chat(messages)
+        # Historique : résumé des anciens échanges puis derniers échanges verbatim
+        if conversation is not None:
+            if conversation.summary:
+                messages.append({
+                    "role": "system",
+                    "content": "Résumé des échanges précédents avec l'utilisateur:\n" + conversation.summary,
+                })
+            messages.extend(conversation.recent_messages())
+
+        messages.append({"role": "user", "content": user_content})
+        return messages
 
 
@@ -0,0 +1,164 @@
+"""
+Mémo des rapports complets par empreinte du dossier.
+
+Un instructeur qui renvoie le même dossier relançait extraction et OCR pour
+un rapport identique. La clé du mémo couvre tout ce dont le rapport dépend :
+- les fichiers : (nom, SHA-256 du contenu), triés — le nom compte, il sert
+  à identifier le type de pièce ;
+- le type de dossier (PC / PA) ;
+- la version des règles (empreinte de rules.yml, recalculée dès que le
+  fichier change sur disque) ;
+- la version de l'analyseur (empreinte du code de la chaîne d'analyse) ;
+- la version de l'extraction (moteur PDF, OCR disponible, résolution OCR) :
+  un worker sans Tesseract ne sert pas son rapport à la place d'un rapport OCR.
+
+Modifier les règles, le code ou l'environnement d'extraction change donc la clé : les anciennes entrées ne
+correspondent plus et sortent du LRU d'elles-mêmes.
+
+Le mémo ne garde que clé -> report_id ; le rapport reste dans le ReportStore.
+Avec plusieurs workers, les entrées sont aussi écrites dans l'état partagé
+(SharedState) : un dossier analysé par un processus est reconnu par les autres.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .compliance import DEFAULT_RULES_PATH
+from .metrics import CACHE_REQUESTS
+from .shared_state import SharedState
+
+
+_SERVICES_DIR = os.path.dirname(__file__)
+# Code dont dépend le contenu d'un rapport
+ANALYZER_SOURCES = (
+    os.path.join(_SERVICES_DIR, "analyzer.py"),
+    os.path.join(_SERVICES_DIR, "compliance.py"),
+    os.path.join(_SERVICES_DIR, "extractor.py"),
+    os.path.join(_SERVICES_DIR, "near_duplicates.py"),
+    os.path.join(_SERVICES_DIR, "pipeline.py"),
+    os.path.join(os.path.dirname(_SERVICES_DIR), "models", "document.py"),
+)
+
+
+def content_hash(content: bytes) -> str:
+    """SHA-256 hexadécimal du contenu d'un fichier."""
+    return hashlib.sha256(content).hexdigest()
+
+
+def _hash_files(paths: Iterable[str]) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode("utf-8"))
+        try:
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        except FileNotFoundError:
+            digest.update(b"\0missing")
+    return digest.hexdigest()[:16]
+
+
+class ReportMemo:
+    """LRU empreinte du dossier -> report_id, thread-safe."""
+
+    def __init__(
+        self,
+        max_entries: int = 2000,
+        rules_path: str = DEFAULT_RULES_PATH,
+        analyzer_sources: Tuple[str, ...] = ANALYZER_SOURCES,
+        shared: Optional[SharedState] = None,
+        shared_ttl_s: float = 7 * 24 * 3600,
+    ) -> None:
+        self.max_entries = max_entries
+        self.shared = shared
+        self.shared_ttl_s = shared_ttl_s
+        self.rules_path = rules_path
+        # Le code ne change pas sans redémarrage : empreinte calculée une fois
+        self.analyzer_version = _hash_files(analyzer_sources)
+        self._rules_stat: Optional[Tuple[int, int]] = None
+        self._rules_version = ""
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def rules_version(self) -> str:
+        """Empreinte de rules.yml, recalculée seulement si mtime/taille ont changé."""
+        try:
+            stat = os.stat(self.rules_path)
+            current = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            current = (0, 0)
+        with self._lock:
+            if current != self._rules_stat:
+                self._rules_version = _hash_files([self.rules_path])
+                self._rules_stat = current
+            return self._rules_version
+
+    def key(self, file_hashes: List[Tuple[str, str]], case_type: str, extractor_version: str) -> str:
+        """
+        Clé du dossier à partir des couples (nom de fichier, SHA-256) et de la
+        version d'extraction du processus (`TextExtractor.version`).
+        """
+        digest = hashlib.sha256()
+        for filename, sha in sorted(file_hashes):
+            digest.update(f"{filename}\0{sha}\n".encode("utf-8"))
+        digest.update(
+            f"case={case_type}\0rules={self.rules_version}\0analyzer={self.analyzer_version}"
+            f"\0extractor={extractor_version}".encode("utf-8")
+        )
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            report_id = self._entries.get(key)
+            if report_id is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                CACHE_REQUESTS.inc(cache="report_memo", result="hit")
+                return report_id
+        # Dossier peut-être analysé par un autre worker
+        report_id = self.shared.get("memo", key) if self.shared is not None else None
+        with self._lock:
+            if report_id is None:
+                self.misses += 1
+                CACHE_REQUESTS.inc(cache="report_memo", result="miss")
+                return None
+            self._remember(key, report_id)
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache="report_memo", result="hit")
+            return report_id
+
+    def set(self, key: str, report_id: str) -> None:
+        with self._lock:
+            self._remember(key, report_id)
+        if self.shared is not None:
+            self.shared.set("memo", key, report_id, ttl_s=self.shared_ttl_s)
+
+    def discard(self, key: str) -> None:
+        """Oublie une entrée dont le rapport n'est plus disponible."""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete("memo", key)
+
+    def _remember(self, key: str, report_id: str) -> None:
+        # Appelé sous self._lock
+        self._entries[key] = report_id
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "rules_version": self._rules_version,
+                "analyzer_version": self.analyzer_version,
+            }
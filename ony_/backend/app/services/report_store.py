@@ -0,0 +1,251 @@
+"""
+Stockage des rapports d'analyse côté serveur, par clé (session ou rapport).
+
+Utilisé pour :
+- les sessions : chaque instructeur a son propre contexte (plus de chatbot
+  singleton dont la dernière analyse écrase celle de tout le monde)
+- les rapports : /chat reçoit un `report_id` au lieu du rapport complet
+
+- TTL : une entrée inactive expire
+- LRU + plafond mémoire en octets (taille du rapport sérialisé, texte complet inclus)
+- Débordement disque optionnel (`spill_dir`) : les rapports y sont écrits
+  (écriture atomique) et relus à la demande. Un répertoire partagé rend les
+  entrées visibles de tous les workers ; la version disque fait foi si elle
+  est plus récente que la copie en mémoire.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from ..models.document import AnalysisReport
+
+
+def serialize_report(report: AnalysisReport) -> bytes:
+    """Sérialise un rapport en JSON, y compris `full_text` (exclu du JSON API)."""
+    documents = list(report.documents_conformes) + list(report.documents_non_conformes)
+    payload = {
+        "report": report.model_dump(mode="json"),
+        "full_texts": [doc.full_text for doc in documents],
+    }
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+def compute_report_id(report: AnalysisReport) -> str:
+    """Identifiant de contenu d'un rapport (sert aussi d'ETag)."""
+    unidentified = report.model_copy(update={"report_id": None})
+    return hashlib.sha256(serialize_report(unidentified)).hexdigest()[:32]
+
+
+def deserialize_report(data: bytes) -> AnalysisReport:
+    payload = json.loads(data.decode("utf-8"))
+    report = AnalysisReport.model_validate(payload["report"])
+    documents = list(report.documents_conformes) + list(report.documents_non_conformes)
+    for doc, full_text in zip(documents, payload.get("full_texts") or []):
+        doc.full_text = full_text
+    return report
+
+
+@dataclass
+class _Entry:
+    report: AnalysisReport
+    size_bytes: int
+    last_access: float
+    disk_mtime_ns: int = 0
+
+
+class ReportStore:
+    """Rapports par clé (session, rapport), avec TTL, LRU, plafond en octets et débordement disque."""
+
+    # Fréquence (en écritures) du nettoyage des copies disque expirées
+    DISK_PURGE_EVERY = 100
+
+    def __init__(
+        self,
+        ttl_s: float = 3600.0,
+        max_bytes: int = 256 * 1024 * 1024,
+        max_entries: int = 500,
+        spill_dir: Optional[str] = None,
+    ) -> None:
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.spill_dir = spill_dir
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._writes = 0
+        # Les routes de calcul peuvent tourner dans le threadpool : accès protégés
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------ API
+
+    def set_report(self, key: str, report: AnalysisReport) -> None:
+        data = serialize_report(report)
+        disk_mtime_ns = 0
+        if self.spill_dir:
+            disk_mtime_ns = self._write_disk(key, data)
+            self._writes += 1
+            if self._writes % self.DISK_PURGE_EVERY == 0:
+                self._purge_disk()
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = _Entry(
+                report=report,
+                size_bytes=len(data),
+                last_access=time.monotonic(),
+                disk_mtime_ns=disk_mtime_ns,
+            )
+            self._bytes += len(data)
+            self._enforce_limits()
+
+    def get_report(self, key: str) -> Optional[AnalysisReport]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.last_access > self.ttl_s:
+                self._expire(key)
+                entry = None
+
+            if self.spill_dir:
+                disk_mtime_ns = self._disk_mtime_ns(key)
+                if disk_mtime_ns and (entry is None or disk_mtime_ns > entry.disk_mtime_ns):
+                    # Absent en mémoire, ou mis à jour par un autre worker
+                    entry = self._load_disk(key, disk_mtime_ns)
+
+            if entry is None:
+                return None
+            entry.last_access = now
+            self._entries.move_to_end(key)
+            if self.spill_dir:
+                self._touch_disk(key, entry)
+            return entry.report
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._drop(key)
+        if self.spill_dir:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries_in_memory": len(self._entries),
+                "bytes_in_memory": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "spill_dir": self.spill_dir,
+            }
+
+    # ------------------------------------------------------------ interne
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size_bytes
+
+    def _expire(self, key: str) -> None:
+        # La copie disque éventuelle a son propre TTL (mtime) : un autre worker
+        # a pu la prolonger, on ne la supprime donc pas ici.
+        self._drop(key)
+        self._expirations += 1
+
+    def _purge_disk(self) -> None:
+        """Supprime les copies disque expirées."""
+        now = time.time()
+        try:
+            names = os.listdir(self.spill_dir or "")
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.spill_dir or "", name)
+            try:
+                if now - os.stat(path).st_mtime > self.ttl_s:
+                    os.remove(path)
+            except FileNotFoundError:
+                continue
+
+    def _enforce_limits(self) -> None:
+        now = time.monotonic()
+        # Entrées expirées d'abord (les plus anciennes sont en tête)
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry.last_access <= self.ttl_s:
+                break
+            self._expire(key)
+        # Puis LRU tant que les plafonds sont dépassés (le disque garde une copie si activé)
+        while len(self._entries) > 1 and (
+            self._bytes > self.max_bytes or len(self._entries) > self.max_entries
+        ):
+            key, _ = next(iter(self._entries.items()))
+            self._drop(key)
+            self._evictions += 1
+
+    def _path(self, key: str) -> str:
+        # Le nom de fichier est un hash : pas de traversée de répertoire possible
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_dir or "", f"{digest}.json")
+
+    def _write_disk(self, key: str, data: bytes) -> int:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return os.stat(path).st_mtime_ns
+
+    def _touch_disk(self, key: str, entry: _Entry) -> None:
+        """Prolonge la copie disque d'une entrée active (au plus une fois par demi-TTL)."""
+        if time.time_ns() - entry.disk_mtime_ns < self.ttl_s * 1e9 / 2:
+            return
+        try:
+            os.utime(self._path(key))
+            entry.disk_mtime_ns = os.stat(self._path(key)).st_mtime_ns
+        except FileNotFoundError:
+            pass
+
+    def _disk_mtime_ns(self, key: str) -> int:
+        try:
+            stat = os.stat(self._path(key))
+        except FileNotFoundError:
+            return 0
+        # Le TTL s'applique aussi aux copies disque
+        if time.time() - stat.st_mtime > self.ttl_s:
+            return 0
+        return stat.st_mtime_ns
+
+    def _load_disk(self, key: str, disk_mtime_ns: int) -> Optional[_Entry]:
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            report = deserialize_report(data)
+        except (OSError, ValueError, KeyError):
+            return None
+        self._drop(key)
+        entry = _Entry(
+            report=report,
+            size_bytes=len(data),
+            last_access=time.monotonic(),
+            disk_mtime_ns=disk_mtime_ns,
+        )
+        self._entries[key] = entry
+        self._bytes += len(data)
+        self._enforce_limits()
+        return entry
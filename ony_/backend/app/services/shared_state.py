@@ -0,0 +1,220 @@
+"""
+État partagé entre les processus workers (SQLite en mode WAL).
+
+Avec plusieurs workers uvicorn, deux requêtes d'un même client arrivent sur
+des processus différents : un job créé sur l'un doit être suivi, annulé ou
+lu depuis l'autre, une conversation doit continuer, une réponse Jan.ai
+différée doit être récupérable. Ce qui doit survivre au changement de
+processus passe donc par une base commune :
+- des entrées clé -> valeur (JSON) par espace de noms, avec expiration
+  (conversations, mémo des rapports, réponses différées, état des jobs) ;
+- le journal des événements de chaque job (flux SSE servi par un autre
+  worker que celui qui exécute le job) ;
+- les demandes d'annulation de job adressées au worker propriétaire.
+
+Le reste (caches, créneaux d'OCR, disjoncteur Jan.ai) reste propre à chaque
+processus. Les accès sont brefs (une ligne, index primaire) ; une connexion
+par thread, écritures sérialisées dans le processus. Ce sont des appels
+bloquants (attente de verrou SQLite jusqu'à 10 s) : à faire hors de la boucle
+asyncio. Une mise à jour lecture-modification-écriture (update) se fait dans
+une seule transaction, exclusive entre processus.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_kv_expires_at ON kv(expires_at);
+
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_job_events_created_at ON job_events(created_at);
+
+CREATE TABLE IF NOT EXISTS job_cancels (
+    job_id TEXT PRIMARY KEY,
+    reason TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class SharedState:
+    """Accès à la base d'état partagé (une connexion par thread)."""
+
+    # Fréquence (en écritures) de la purge des entrées expirées
+    PURGE_EVERY = 500
+    # Durée de conservation du journal des événements de job
+    JOB_EVENTS_TTL_S = 24 * 3600
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._writes = 0
+        # Connexions de tous les threads, fermées ensemble par close()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        with self._write_lock:
+            self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread=False : seul close() l'utilise depuis un autre thread
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _execute(self, sql: str, params: Iterable[Any] = ()) -> None:
+        with self._write_lock:
+            self._connection().execute(sql, tuple(params))
+            self._count_write()
+
+    def _count_write(self) -> None:
+        # Appelé sous self._write_lock
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._purge()
+
+    def _purge(self) -> None:
+        # Appelé sous self._write_lock
+        now = time.time()
+        conn = self._connection()
+        conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        conn.execute("DELETE FROM job_events WHERE created_at < ?", (now - self.JOB_EVENTS_TTL_S,))
+
+    # ------------------------------------------------------------------ clé -> valeur
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        row = self._connection().execute(
+            "SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def set(self, namespace: str, key: str, value: Any, ttl_s: Optional[float] = None) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value, ensure_ascii=False), time.time() + ttl_s if ttl_s else None),
+        )
+
+    def update(
+        self,
+        namespace: str,
+        key: str,
+        update: Callable[[Optional[Any]], Any],
+        ttl_s: Optional[float] = None,
+    ) -> Any:
+        """
+        Remplace la valeur par update(valeur actuelle ou None), dans une seule
+        transaction (BEGIN IMMEDIATE) : deux workers qui modifient la même
+        entrée ne s'écrasent pas. Renvoie la nouvelle valeur.
+        """
+        with self._write_lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+                ).fetchone()
+                current = None if row is None or (row[1] is not None and row[1] < time.time()) else json.loads(row[0])
+                value = update(current)
+                conn.execute(
+                    "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (namespace, key, json.dumps(value, ensure_ascii=False), time.time() + ttl_s if ttl_s else None),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._count_write()
+        return value
+
+    def items(self, namespace: str) -> Dict[str, Any]:
+        """Entrées non expirées d'un espace de noms."""
+        return {
+            key: json.loads(value)
+            for key, value in self._connection().execute(
+                "SELECT key, value FROM kv WHERE namespace = ? AND (expires_at IS NULL OR expires_at >= ?)",
+                (namespace, time.time()),
+            )
+        }
+
+    def delete(self, namespace: str, key: str) -> None:
+        self._execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    # ------------------------------------------------------------------ jobs
+
+    def append_job_event(self, job_id: str, event: Dict[str, Any]) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO job_events (job_id, seq, event, created_at) VALUES (?, ?, ?, ?)",
+            (job_id, event["seq"], json.dumps(event, ensure_ascii=False), time.time()),
+        )
+
+    def job_events(self, job_id: str, start: int = 0) -> List[Dict[str, Any]]:
+        """Événements du job à partir du numéro `start`."""
+        return [
+            json.loads(row[0])
+            for row in self._connection().execute(
+                "SELECT event FROM job_events WHERE job_id = ? AND seq >= ? ORDER BY seq", (job_id, start)
+            )
+        ]
+
+    def request_cancel(self, job_id: str, reason: str) -> None:
+        self._execute("INSERT OR REPLACE INTO job_cancels (job_id, reason) VALUES (?, ?)", (job_id, reason))
+
+    def take_cancel_requests(self, job_ids: List[str]) -> Dict[str, str]:
+        """Demandes d'annulation visant ces jobs, retirées de la base."""
+        if not job_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in job_ids)
+        with self._write_lock:
+            conn = self._connection()
+            requests = dict(
+                conn.execute(
+                    f"SELECT job_id, reason FROM job_cancels WHERE job_id IN ({placeholders})", job_ids
+                ).fetchall()
+            )
+            if requests:
+                conn.execute(
+                    f"DELETE FROM job_cancels WHERE job_id IN ({', '.join('?' for _ in requests)})",
+                    list(requests),
+                )
+        return requests
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connection()
+        return {
+            "path": self.path,
+            "entries": dict(conn.execute("SELECT namespace, COUNT(*) FROM kv GROUP BY namespace").fetchall()),
+        }
+
+    def close(self) -> None:
+        """Ferme les connexions de tous les threads (arrêt du processus)."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
@@ -0,0 +1,70 @@
+"""
+Déduplication des appels identiques concurrents ("single-flight").
+
+Quand plusieurs requêtes identiques arrivent pendant qu'une génération est
+en cours (dossier ouvert par plusieurs instructeurs, retry du frontend),
+elles partagent le même appel au lieu d'en relancer un chacune.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Regroupe les appels concurrents ayant la même clé sur une seule exécution."""
+
+    def __init__(self) -> None:
+        self._in_flight: Dict[str, "asyncio.Task[Any]"] = {}
+        # Appelants en attente par clé
+        self._waiters: Dict[str, int] = {}
+        self.calls = 0
+        self.collapsed_calls = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Exécute `fn()` ou rejoint l'exécution en cours pour `key`.
+
+        L'exécution tourne dans sa propre tâche : l'annulation d'un des appelants
+        (client déconnecté) ne la fait pas échouer pour les autres. Quand le
+        dernier appelant est annulé, plus personne n'attend le résultat :
+        l'exécution est annulée (elle libère son créneau du modèle).
+        """
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.collapsed_calls += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1 and not task.done():
+                task.cancel()
+                self._forget(key, task)
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def _forget(self, key: str, task: "asyncio.Task[Any]") -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Évite l'avertissement "exception was never retrieved" si tous les appelants sont partis
+        if task.done() and not task.cancelled():
+            task.exception()
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "collapsed_calls": self.collapsed_calls,
+            "in_flight": len(self._in_flight),
+        }
@@ -0,0 +1,179 @@
+"""
+Ordonnancement équitable du travail d'analyse (extraction / OCR).
+
+Un dossier de 300 pages scannées ne doit pas faire attendre les vérifications
+de deux fichiers des collègues. Le travail est donc découpé à la page :
+chaque page (ou fichier Word) doit obtenir un créneau avant d'être traitée,
+et le nombre de créneaux est borné (capacité CPU).
+
+Attribution des créneaux libres :
+1) deux voies : "fast" pour les petits dossiers (coût estimé sous un seuil),
+   "bulk" pour les autres ; la voie rapide passe en priorité, mais la voie
+   lente obtient au moins un créneau sur `fast_lane_weight + 1` ;
+2) dans chaque voie, tourniquet entre clients : un client avec trois gros
+   dossiers n'obtient pas plus de pages qu'un client avec un seul.
+
+Le coût d'un dossier est estimé avant traitement (pages, pages sans texte
+natif à passer en OCR) par une sonde PyMuPDF qui n'extrait pas le texte.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterator, Optional
+
+from .cancellation import AnalysisCancelled, CancellationToken, CancelReason
+
+
+class Lane:
+    """Voies d'ordonnancement."""
+    FAST = "fast"
+    BULK = "bulk"
+
+    ALL = (FAST, BULK)
+
+
+@dataclass(frozen=True)
+class JobCost:
+    """Coût estimé d'un dossier : pages à lire et pages à passer en OCR."""
+    pages: int
+    scanned_pages: int
+    units: float  # pages natives + pages OCR pondérées
+
+
+class _Waiter:
+    __slots__ = ("client", "lane", "enqueued_at", "granted")
+
+    def __init__(self, client: str, lane: str) -> None:
+        self.client = client
+        self.lane = lane
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+
+
+class FairWorkScheduler:
+    """Créneaux de travail bornés, attribués par voie puis par client (appelé depuis des threads)."""
+
+    # Fréquence de vérification de l'annulation pendant l'attente d'un créneau
+    CANCEL_POLL_S = 0.25
+
+    def __init__(
+        self,
+        capacity: int = 2,
+        ocr_page_cost: float = 10.0,
+        fast_lane_max_units: float = 30.0,
+        fast_lane_weight: int = 4,
+    ) -> None:
+        self.capacity = max(1, capacity)
+        self.ocr_page_cost = ocr_page_cost
+        self.fast_lane_max_units = fast_lane_max_units
+        self.fast_lane_weight = max(1, fast_lane_weight)
+        self._cond = threading.Condition()
+        self._active = 0
+        # voie -> client -> pages en attente (ordre = tourniquet)
+        self._waiting: Dict[str, "OrderedDict[str, Deque[_Waiter]]"] = {
+            lane: OrderedDict() for lane in Lane.ALL
+        }
+        self._fast_streak = 0
+        self._grants: Dict[str, int] = {lane: 0 for lane in Lane.ALL}
+        self._waits: Dict[str, Deque[float]] = {lane: deque(maxlen=500) for lane in Lane.ALL}
+
+    def cost(self, pages: int, scanned_pages: int) -> JobCost:
+        units = (pages - scanned_pages) + scanned_pages * self.ocr_page_cost
+        return JobCost(pages=pages, scanned_pages=scanned_pages, units=units)
+
+    def lane_for(self, cost: JobCost) -> str:
+        return Lane.FAST if cost.units <= self.fast_lane_max_units else Lane.BULK
+
+    @contextmanager
+    def slot(
+        self,
+        client: str,
+        lane: str,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> Iterator[None]:
+        """
+        Bloque jusqu'à l'obtention d'un créneau, le libère en sortie.
+
+        Une analyse annulée pendant l'attente quitte la file (AnalysisCancelled).
+        """
+        waiter = _Waiter(client, lane)
+        with self._cond:
+            self._waiting[lane].setdefault(client, deque()).append(waiter)
+            self._dispatch()
+            while not waiter.granted:
+                if cancel_token is not None and cancel_token.cancelled:
+                    self._withdraw(waiter)
+                    raise AnalysisCancelled(cancel_token.reason or CancelReason.CLIENT)
+                # Sans jeton, seul un créneau libéré réveille l'attente
+                self._cond.wait(self.CANCEL_POLL_S if cancel_token is not None else None)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._dispatch()
+
+    def _withdraw(self, waiter: _Waiter) -> None:
+        # Appelé sous self._cond
+        clients = self._waiting[waiter.lane]
+        queue = clients.get(waiter.client)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            return
+        if not queue:
+            del clients[waiter.client]
+
+    def _next_lane(self) -> Optional[str]:
+        fast_waiting = bool(self._waiting[Lane.FAST])
+        bulk_waiting = bool(self._waiting[Lane.BULK])
+        if fast_waiting and (not bulk_waiting or self._fast_streak < self.fast_lane_weight):
+            self._fast_streak += 1
+            return Lane.FAST
+        if bulk_waiting:
+            self._fast_streak = 0
+            return Lane.BULK
+        return None
+
+    def _dispatch(self) -> None:
+        # Appelé sous self._cond
+        granted = False
+        while self._active < self.capacity:
+            lane = self._next_lane()
+            if lane is None:
+                break
+            clients = self._waiting[lane]
+            client, queue = next(iter(clients.items()))
+            waiter = queue.popleft()
+            if queue:
+                clients.move_to_end(client)
+            else:
+                del clients[client]
+            waiter.granted = True
+            self._active += 1
+            self._grants[lane] += 1
+            self._waits[lane].append(time.monotonic() - waiter.enqueued_at)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            lanes: Dict[str, Any] = {}
+            for lane in Lane.ALL:
+                samples = sorted(self._waits[lane])
+                lanes[lane] = {
+                    "waiting": sum(len(q) for q in self._waiting[lane].values()),
+                    "clients_waiting": len(self._waiting[lane]),
+                    "grants": self._grants[lane],
+                    "wait_avg_s": round(sum(samples) / len(samples), 4) if samples else None,
+                    "wait_p95_s": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 4) if samples else None,
+                    "wait_max_s": round(samples[-1], 4) if samples else None,
+                }
+            return {"capacity": self.capacity, "active": self._active, "lanes": lanes}
@@ -0,0 +1,238 @@
+"""
+Dossiers reçus en archive ZIP.
+
+Les pétitionnaires envoient leur dossier zippé ; il fallait le décompresser
+à la main avant de glisser les fichiers dans l'interface. Une archive est
+désormais un fichier du dossier comme un autre :
+- l'upload est recopié par blocs dans un fichier temporaire (jamais
+  entièrement en mémoire, rien n'est extrait sur disque) ;
+- le répertoire central est contrôlé avant toute décompression (nombre de
+  membres, tailles, taux de compression : protection contre les zip bombs) ;
+- les membres sont décompressés un à un, dans un thread, et passent à
+  l'extraction dès qu'ils sont prêts : l'OCR d'un fichier recouvre la
+  décompression des suivants (file bornée, peu de membres en mémoire).
+
+Arborescence : comme dans `Exemple/`, un dossier est un répertoire
+(« 117 ST MARCEL PC 25 0009/117 Cerfa.pdf »). Le répertoire racine commun
+est retiré ; les sous-répertoires restent dans le nom de la pièce
+(« Plans/117 Masse.pdf »), ils aident à l'identifier. Une archive dont un
+membre porte un chemin absolu ou remontant (« .. ») est refusée.
+"""
+from __future__ import annotations
+
+import hashlib
+import posixpath
+import queue
+import tempfile
+import threading
+import zipfile
+from typing import IO, Callable, Iterator, List, Optional, Tuple
+
+from .cancellation import CancellationToken
+
+
+ZIP_EXTENSION = ".zip"
+# Lecture / recopie par blocs
+_CHUNK = 1024 * 1024
+# Fichiers techniques ajoutés par les systèmes d'exploitation ou les éditeurs
+_IGNORED_PREFIXES = ("__MACOSX/",)
+_IGNORED_NAME_PREFIXES = (".", "~$")
+# Sans sonde (rien n'est décompressé avant l'analyse) : taille moyenne d'une
+# page de PDF scanné, pour estimer le coût du dossier
+ESTIMATED_BYTES_PER_PAGE = 100 * 1024
+# Attente d'un membre décompressé entre deux consultations du jeton d'annulation
+_PREFETCH_WAIT_S = 0.25
+
+
+class ZipLimitError(ValueError):
+    """Archive refusée : limites de taille, de nombre de membres ou de taux de compression."""
+
+
+def is_zip(filename: str) -> bool:
+    return filename.lower().endswith(ZIP_EXTENSION)
+
+
+class ZipDossier:
+    """
+    Archive ZIP d'un dossier, recopiée dans un fichier temporaire.
+
+    Args:
+        filename: Nom de l'archive uploadée
+        source: Flux de l'upload (lu par blocs)
+        supported: Filtre des membres à extraire (extension acceptée)
+        max_members: Nombre maximal de membres extraits
+        max_member_bytes: Taille décompressée maximale d'un membre
+        max_total_bytes: Taille décompressée maximale de l'ensemble
+        max_ratio: Taux de compression maximal d'un membre (décompressé / compressé)
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        source: IO[bytes],
+        supported: Callable[[str], bool],
+        max_members: int = 500,
+        max_member_bytes: int = 200 * 1024 * 1024,
+        max_total_bytes: int = 1024 * 1024 * 1024,
+        max_ratio: float = 100.0,
+    ) -> None:
+        self.filename = filename
+        self.max_member_bytes = max_member_bytes
+        self._file = tempfile.TemporaryFile()
+        digest = hashlib.sha256()
+        try:
+            while True:
+                chunk = source.read(_CHUNK)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                self._file.write(chunk)
+            self.size = self._file.tell()
+            # Empreinte de l'archive entière : clé du mémo sans tout décompresser
+            self.content_hash = digest.hexdigest()
+            self._file.seek(0)
+            try:
+                self._zip = zipfile.ZipFile(self._file)
+            except zipfile.BadZipFile as e:
+                raise ZipLimitError(f"Archive ZIP illisible : {filename}") from e
+            self.members = self._select_members(supported)
+            self._check_limits(max_members, max_total_bytes, max_ratio)
+        except BaseException:
+            self._file.close()
+            raise
+
+    def _select_members(self, supported: Callable[[str], bool]) -> List[Tuple[zipfile.ZipInfo, str]]:
+        infos = [
+            info
+            for info in self._zip.infolist()
+            if not info.is_dir()
+            and not info.filename.startswith(_IGNORED_PREFIXES)
+            and not posixpath.basename(info.filename).startswith(_IGNORED_NAME_PREFIXES)
+            and supported(info.filename)
+        ]
+        for info in infos:
+            if not _is_relative_path(info.filename):
+                raise ZipLimitError(f"Archive {self.filename} : chemin de fichier invalide ({info.filename})")
+        # Répertoire racine commun (le dossier lui-même) retiré des noms
+        directories = [posixpath.dirname(info.filename) for info in infos]
+        root = posixpath.commonpath(directories) if directories else ""
+        members = []
+        for info in infos:
+            name = posixpath.relpath(info.filename, root) if root else info.filename
+            members.append((info, name))
+        return members
+
+    def _check_limits(self, max_members: int, max_total_bytes: int, max_ratio: float) -> None:
+        if not self.members:
+            raise ZipLimitError(f"Aucun fichier PDF ou Word dans l'archive {self.filename}")
+        if len(self.members) > max_members:
+            raise ZipLimitError(f"Archive {self.filename} : plus de {max_members} fichiers")
+        total = 0
+        for info, name in self.members:
+            if info.flag_bits & 0x1:
+                raise ZipLimitError(f"Archive {self.filename} : fichier chiffré ({name})")
+            if info.file_size > self.max_member_bytes:
+                raise ZipLimitError(f"Archive {self.filename} : {name} dépasse la taille maximale")
+            if info.file_size > max_ratio * max(info.compress_size, 1):
+                raise ZipLimitError(f"Archive {self.filename} : taux de compression suspect ({name})")
+            total += info.file_size
+        if total > max_total_bytes:
+            raise ZipLimitError(f"Archive {self.filename} : taille décompressée trop importante")
+
+    @property
+    def filenames(self) -> List[str]:
+        return [name for _, name in self.members]
+
+    def estimate_pages(self) -> int:
+        """
+        Pages estimées d'après les tailles décompressées ; toutes sont
+        supposées à OCRiser (estimation prudente : voie lente).
+        """
+        pages = 0
+        for info, name in self.members:
+            if name.lower().endswith(".pdf"):
+                pages += max(1, round(info.file_size / ESTIMATED_BYTES_PER_PAGE))
+            else:
+                pages += 1
+        return pages
+
+    def iter_files(self) -> Iterator[Tuple[str, bytes]]:
+        """Membres décompressés un à un : (nom dans le dossier, contenu)."""
+        for info, name in self.members:
+            yield name, self._read_member(info, name)
+
+    def _read_member(self, info: zipfile.ZipInfo, name: str) -> bytes:
+        # zipfile s'arrête à la taille déclarée et vérifie le CRC ; le compteur
+        # borne malgré tout la mémoire si l'en-tête local diffère
+        parts, read = [], 0
+        with self._zip.open(info) as member:
+            while True:
+                chunk = member.read(_CHUNK)
+                if not chunk:
+                    break
+                read += len(chunk)
+                if read > min(info.file_size, self.max_member_bytes):
+                    raise ZipLimitError(f"Archive {self.filename} : {name} plus grand que déclaré")
+                parts.append(chunk)
+        return b"".join(parts)
+
+    def prefetch(
+        self,
+        depth: int = 2,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> Iterator[Tuple[str, bytes]]:
+        """
+        Comme iter_files, la décompression tournant dans un thread avec au
+        plus `depth` membres d'avance. Fermer l'itérateur arrête le thread ;
+        une annulation (AnalysisCancelled) est constatée pendant l'attente
+        d'un membre.
+        """
+        ready: "queue.Queue[Tuple[str, object]]" = queue.Queue(maxsize=max(1, depth))
+        stop = threading.Event()
+
+        def put(item: Tuple[str, object]) -> bool:
+            while not stop.is_set():
+                try:
+                    ready.put(item, timeout=_PREFETCH_WAIT_S)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce() -> None:
+            try:
+                for name, content in self.iter_files():
+                    if not put(("file", (name, content))):
+                        return
+            except Exception as e:
+                put(("error", e))
+                return
+            put(("end", None))
+
+        thread = threading.Thread(target=produce, name=f"unzip-{self.content_hash[:8]}", daemon=True)
+        thread.start()
+        try:
+            while True:
+                try:
+                    kind, payload = ready.get(timeout=_PREFETCH_WAIT_S)
+                except queue.Empty:
+                    if cancel_token:
+                        cancel_token.checkpoint()
+                    continue
+                if kind == "end":
+                    return
+                if kind == "error":
+                    raise payload  # type: ignore[misc]
+                yield payload  # type: ignore[misc]
+        finally:
+            stop.set()
+
+    def close(self) -> None:
+        self._zip.close()
+        self._file.close()
+
+
+def _is_relative_path(name: str) -> bool:
+    # Chemin relatif sans remontée (« / » ou « \ » selon l'outil d'archivage)
+    parts = name.replace("\\", "/").split("/")
+    return bool(parts[0]) and ":" not in parts[0] and ".." not in parts
@@ -1,17 +1,57 @@
 """
 Point d'entrée de l'application Aqua Verify Backend
+
+En production, plusieurs processus workers (WEB_WORKERS) : chacun exécute
+le lifespan ci-dessous, ouvre ses propres connexions et les ferme à l'arrêt.
 """
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from app.api import routes
 from app.api.routes import router
 from app.core.config import settings
+from app.services import backends
+
+logger = logging.getLogger("aqua_verify")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Ressources propres au processus : ouvertes au démarrage, fermées à l'arrêt."""
+    # Bases SQLite, répertoires de stockage, pool de jobs : rien n'est ouvert à l'import
+    await run_in_threadpool(routes.open_resources)
+    routes.jan_client.open()
+    if settings.WARM_UP_BACKENDS:
+        # uvicorn n'accepte les connexions qu'une fois ce préchargement terminé
+        report = await run_in_threadpool(backends.warm_up)
+        if report["ok"]:
+            logger.info("Bibliothèques préchargées en %.2f s", report["took_s"])
+        else:
+            # Le worker démarre quand même : les analyses concernées échoueront, /api/health le signale
+            logger.error("Préchargement incomplet : %s", report["backends"])
+    metrics_task = (
+        asyncio.create_task(routes.publish_metrics_periodically()) if routes.shared_state is not None else None
+    )
+    try:
+        yield
+    finally:
+        if metrics_task is not None:
+            metrics_task.cancel()
+        await routes.close_resources()
+        await routes.jan_client.aclose()
 
 
 # Créer l'application FastAPI
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
-    description="API de vérification de conformité des dossiers d'aménagement - Grand Chalon"
+    description="API de vérification de conformité des dossiers d'aménagement - Grand Chalon",
+    lifespan=lifespan,
 )
 
 # Configurer CORS pour le frontend
@@ -34,16 +74,29 @@ async def root():
         "name": settings.APP_NAME,
         "version": settings.APP_VERSION,
         "docs": "/docs",
-        "health": "/api/health"
+        "health": "/api/health",
+        "metrics": "/metrics",
     }
 
 
+# Format d'exposition texte Prometheus 0.0.4
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics():
+    """Histogrammes de latence par étape et compteurs (caches, pages OCR, replis)"""
+    return PlainTextResponse(await run_in_threadpool(routes.metrics_text), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=settings.DEBUG
+        # Rechargement automatique : développement, un seul worker
+        reload=settings.DEBUG and settings.WEB_WORKERS == 1,
+        workers=settings.WEB_WORKERS,
     )
 
@@ -0,0 +1,76 @@
+"""Archive : seules les extractions réussies, de la version courante, sont réutilisées."""
+import hashlib
+import sqlite3
+
+import pytest
+
+from app.services.archive import DossierArchive
+from app.services.pipeline import ExtractedFile, run_analysis
+from app.services.report_store import compute_report_id
+
+VERSION = "1:fitz:ocr:72dpi"
+TEXT = "Notice descriptive du projet : gestion des eaux pluviales par infiltration sur la parcelle. " * 20
+
+
+def _extracted(pages, success=True) -> ExtractedFile:
+    return ExtractedFile(
+        filename="PC4 notice.pdf",
+        content_hash=hashlib.sha256(b"PC4 notice").hexdigest(),
+        size=1000,
+        pages=pages,
+        success=success,
+    )
+
+
+def _save(archive: DossierArchive, extracted: ExtractedFile, version: str = VERSION) -> None:
+    result = run_analysis([extracted], case_type="PC")
+    result.report.report_id = compute_report_id(result.report)
+    archive.save_result(result, "PC", version)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    store = DossierArchive(str(tmp_path / "archive.db"))
+    yield store
+    store.close()
+
+
+def test_failed_extraction_is_not_reused_and_is_replaced(archive):
+    sha = _extracted([]).content_hash
+    _save(archive, _extracted([""], success=False))
+    assert archive.get_extracted(sha, "PC4.pdf", VERSION) is None
+    assert archive.known_hashes([sha], VERSION) == set()
+
+    # Extraction réussie du même fichier : remplace la ligne en échec
+    _save(archive, _extracted([TEXT]))
+    extracted = archive.get_extracted(sha, "PC4.pdf", VERSION)
+    assert extracted is not None and extracted.success
+    assert extracted.pages == [TEXT]
+    assert archive.known_hashes([sha], VERSION) == {sha}
+
+
+def test_extraction_from_another_version_is_not_reused(archive):
+    sha = _extracted([]).content_hash
+    _save(archive, _extracted([TEXT]), version="1:pypdf:no-ocr:72dpi")
+    assert archive.get_extracted(sha, "PC4.pdf", VERSION) is None
+    assert archive.known_hashes([sha], VERSION) == set()
+
+
+def test_archive_without_extractor_version_is_migrated(tmp_path):
+    path = str(tmp_path / "archive.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE files (id INTEGER PRIMARY KEY, content_hash TEXT NOT NULL UNIQUE,"
+        " size INTEGER NOT NULL, page_count INTEGER NOT NULL, extracted_at REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO files (content_hash, size, page_count, extracted_at) VALUES ('abc', 1, 1, 0)")
+    conn.commit()
+    conn.close()
+
+    archive = DossierArchive(path)
+    try:
+        # Extraction d'avant la version : réextraite plutôt que réutilisée
+        assert archive.known_hashes(["abc"], VERSION) == set()
+        assert archive.get_extracted("abc", "PC4.pdf", VERSION) is None
+    finally:
+        archive.close()
@@ -0,0 +1,44 @@
+"""Chat : une explication encore en génération respecte le budget de latence."""
+import asyncio
+
+from app.api import routes
+from app.models.document import AnalysisReport, ChatRequest, ProjectInfo
+
+REPORT = AnalysisReport(
+    project_info=ProjectInfo(),
+    documents_conformes=[],
+    documents_non_conformes=[],
+    documents_manquants=["PC4"],
+    total_documents=0,
+    conformity_score=0.0,
+    report_id="rapport-test",
+)
+
+
+def test_explanation_in_flight_is_hedged(monkeypatch):
+    release = asyncio.Event()
+
+    async def slow_explanation(report, priority=None):
+        await release.wait()
+        return "Explication Jan.ai"
+
+    routes.open_resources()
+    monkeypatch.setattr(routes.rag_service, "explain_issues", slow_explanation)
+
+    async def scenario():
+        # Pré-génération lancée après l'analyse, pas encore terminée
+        pregeneration = asyncio.ensure_future(routes.rag_service.pregenerate_explanation(REPORT))
+        await asyncio.sleep(0)
+        assert await routes.rag_service.has_explanation(REPORT)
+
+        request = ChatRequest(message="Quels sont les problèmes de mon dossier ?", latency_budget_ms=50)
+        reply = await asyncio.wait_for(routes._chat_reply(request, REPORT, None), 1)
+        assert reply.source == "rules" and reply.upgrade_id
+
+        release.set()
+        await pregeneration
+        status, content = await routes.pending_answers.result(reply.upgrade_id, 1)
+        assert (status, content) == ("done", "Explication Jan.ai")
+        await routes.close_resources()
+
+    asyncio.run(scenario())
@@ -0,0 +1,40 @@
+"""Importer l'application ne charge pas les bibliothèques d'extraction et reste rapide."""
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Chargées au premier usage (registre `backends`), jamais à l'import
+LAZY_MODULES = ("fitz", "pypdf", "docx", "pytesseract", "PIL")
+# Import de l'application seule, FastAPI et pydantic déjà chargés (≈ 0,2 s
+# aujourd'hui ; PyMuPDF à lui seul en coûte plusieurs dixièmes)
+IMPORT_BUDGET_S = 1.0
+
+_SCRIPT = f"""
+import json, sys, time
+import fastapi, pydantic, pydantic_settings
+start = time.perf_counter()
+import main
+took = time.perf_counter() - start
+print(json.dumps({{"took_s": took, "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def _import_main() -> dict:
+    # Interpréteur neuf : les autres tests ont pu charger ces bibliothèques
+    output = subprocess.run(
+        [sys.executable, "-c", _SCRIPT], cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_import_does_not_load_extraction_libraries():
+    assert _import_main()["loaded"] == []
+
+
+def test_import_stays_within_budget():
+    # Meilleur de trois : un import isolé peut être ralenti par la machine
+    took = min(_import_main()["took_s"] for _ in range(3))
+    assert took < IMPORT_BUDGET_S, f"import main : {took:.2f} s (budget {IMPORT_BUDGET_S} s)"
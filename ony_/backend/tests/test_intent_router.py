@@ -0,0 +1,33 @@
+"""Intentions du chatbot : fautes de frappe résolues, questions voisines non captées."""
+import pytest
+
+from app.services.chatbot import ChatbotService
+
+
+@pytest.mark.parametrize("question", [
+    "quels sont les délais",
+    "quels sont les coûts",
+    "quels sont les risques",
+    "que dois-je savoir",
+    "quelle est la hauteur du projet",
+    "mon dossier est-il recevable",
+])
+def test_questions_sharing_only_stop_words_are_not_resolved(question):
+    assert ChatbotService.detect_intent(question) is None
+
+
+@pytest.mark.parametrize("question, handler", [
+    ("qels documants manquent ?", "get_missing_docs"),
+    ("quel est le scor de conformite", "get_conformity_status"),
+    ("mon dossie est il complet", "get_conformity_status"),
+    ("que dois je corigé", "get_compliance_issues"),
+])
+def test_misspelled_questions_are_resolved_fuzzily(question, handler):
+    intent = ChatbotService.detect_intent(question)
+    assert intent is not None and intent.handler == handler
+    assert not intent.exact
+
+
+def test_regex_match_is_exact():
+    intent = ChatbotService.detect_intent("Quels sont les problèmes de mon dossier ?")
+    assert intent.handler == "get_compliance_issues" and intent.exact
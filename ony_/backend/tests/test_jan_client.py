@@ -0,0 +1,71 @@
+"""Client Jan.ai : routage des questions, latence des réponses en flux."""
+import asyncio
+import json
+
+import httpx
+
+from app.services.jan_client import JanAIClient
+from app.services.metrics import JAN_CHAT_SECONDS
+from app.services.model_router import LLMRequestKind
+
+# Résumé du dossier et historique : le prompt d'une question est toujours long
+CONTEXT = "Résumé du dossier PC : pièces fournies, infos projet, non-conformités. " * 100
+
+
+def _client(handler) -> JanAIClient:
+    client = JanAIClient()
+    client._client = httpx.AsyncClient(base_url="http://jan.test/v1", transport=httpx.MockTransport(handler))
+    return client
+
+
+def _stream_response(request: httpx.Request) -> httpx.Response:
+    chunks = [{"choices": [{"delta": {"content": word}}]} for word in ("Il ", "manque ", "PC4.")]
+    body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+    return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+
+
+def _observations(route: str, outcome: str) -> int:
+    counts = dict(JAN_CHAT_SECONDS.snapshot()).get((route, outcome))
+    return sum(counts[0]) if counts else 0
+
+
+def _messages(question: str):
+    return [{"role": "system", "content": CONTEXT}, {"role": "user", "content": f"{CONTEXT}\nQuestion : {question}"}]
+
+
+def test_short_question_goes_to_small_model_despite_long_context():
+    client = _client(_stream_response)
+    messages = _messages("Quelles pièces manquent ?")
+    assert client._select_route(messages, LLMRequestKind.ANSWER, "Quelles pièces manquent ?").name == "small"
+    assert client._select_route(messages, LLMRequestKind.ANSWER, "x" * 1000).name == "large"
+
+
+def test_completed_stream_records_latency():
+    client = _client(_stream_response)
+    route = client.router.routes["small"]
+    before = _observations("small", "ok")
+    question = "Quelles pièces manquent ?"
+
+    async def consume():
+        return [chunk async for chunk in client.chat_stream(_messages(question), question=question)]
+
+    assert "".join(asyncio.run(consume())) == "Il manque PC4."
+    assert len(route.latencies) == 1
+    assert _observations("small", "ok") == before + 1
+
+
+def test_interrupted_stream_is_not_recorded_for_the_slo():
+    client = _client(_stream_response)
+    route = client.router.routes["small"]
+    before = _observations("small", "cancelled")
+    question = "Quelles pièces manquent ?"
+
+    async def first_chunk():
+        stream = client.chat_stream(_messages(question), question=question)
+        chunk = await stream.__anext__()
+        await stream.aclose()  # client parti
+        return chunk
+
+    assert asyncio.run(first_chunk()) == "Il "
+    assert len(route.latencies) == 0
+    assert _observations("small", "cancelled") == before + 1
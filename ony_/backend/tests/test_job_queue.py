@@ -0,0 +1,73 @@
+"""File de jobs : bornée, une soumission de trop est refusée ; un job abandonné est annulé."""
+import asyncio
+
+import pytest
+
+from app.services.cancellation import CancellationStats
+from app.services.job_queue import AnalysisJob, JobManager, JobQueueFullError, JobStatus
+from app.services.shared_state import SharedState
+from app.services.work_scheduler import FairWorkScheduler, JobCost, Lane
+
+COST = JobCost(pages=1, scanned_pages=0, units=1.0)
+
+
+def test_submit_beyond_max_queued_is_refused():
+    async def scenario():
+        manager = JobManager(
+            on_result=lambda job, result: "report",
+            scheduler=FairWorkScheduler(),
+            cancellations=CancellationStats(),
+            max_active=1,
+            max_queued=2,
+        )
+        try:
+            # Soumis sans rendre la main : aucun worker n'a encore pris de job
+            first = manager.submit([("PC1.pdf", b"")], COST)
+            manager.submit([("PC2.pdf", b"")], COST)
+            with pytest.raises(JobQueueFullError) as error:
+                manager.submit([("PC3.pdf", b"")], COST)
+            assert error.value.retry_after_s >= 1
+            assert manager.snapshot()["rejected"] == 1
+
+            # Un job annulé en file libère sa place
+            manager.cancel(first)
+            assert first.status == JobStatus.CANCELLED
+            manager.submit([("PC3.pdf", b"")], COST)
+        finally:
+            await manager.shutdown(grace_s=1.0)
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_job_is_cancelled_unless_watched_elsewhere(tmp_path):
+    shared = SharedState(str(tmp_path / "shared.db"))
+
+    async def scenario():
+        manager = JobManager(
+            on_result=lambda job, result: "report",
+            scheduler=FairWorkScheduler(),
+            cancellations=CancellationStats(),
+            max_active=1,
+            disconnect_grace_s=0.05,
+            shared=shared,
+        )
+        try:
+            # Job en file, jamais démarré : seul l'abandon peut le clore
+            job = AnalysisJob([("PC1.pdf", b"")], "PC", COST, Lane.FAST, cancel_on_disconnect=True)
+
+            # Flux suivi depuis un autre worker : le job est gardé
+            shared.set("job_watch", job.job_id, True, ttl_s=60)
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(manager._cancel_if_abandoned(job), 0.2)
+            assert job.status == JobStatus.QUEUED
+
+            shared.delete("job_watch", job.job_id)
+            await asyncio.wait_for(manager._cancel_if_abandoned(job), 1)
+            assert job.status == JobStatus.CANCELLED
+        finally:
+            await manager.shutdown(grace_s=1.0)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        shared.close()
@@ -0,0 +1,58 @@
+"""Quasi-doublons d'un dossier : le texte commun d'un cartouche ne suffit pas."""
+import hashlib
+
+from app.services.near_duplicates import MIN_SHINGLES, fingerprint, similarity
+from app.services.pipeline import ExtractedFile, run_analysis
+
+# Cartouche commun à tous les plans d'un même cabinet (adresse, maître
+# d'ouvrage, architecte, échelles, mentions légales...)
+CARTOUCHE = " ".join(
+    f"Projet de construction d'une maison individuelle lot {i} lotissement Les Tilleuls "
+    f"71100 Chalon-sur-Saône maître d'ouvrage SCI Bellevue architecte Cabinet Martin "
+    f"indice {i} date 12/03/2024 échelle 1/200 document non contractuel"
+    for i in range(12)
+)
+
+
+def _extracted(filename: str, text: str) -> ExtractedFile:
+    return ExtractedFile(
+        filename=filename,
+        content_hash=hashlib.sha256(filename.encode()).hexdigest(),
+        size=len(text),
+        pages=[text],
+        success=True,
+        signature=fingerprint(text),
+    )
+
+
+def test_plans_sharing_a_title_block_are_not_merged():
+    pc2 = _extracted("PC2 plan de masse.pdf", f"PC2 Plan de masse des constructions\n{CARTOUCHE}")
+    pc3 = _extracted("PC3 plan en coupe.pdf", f"PC3 Plan en coupe du terrain\n{CARTOUCHE}")
+    # Le texte seul les rapproche...
+    assert similarity(pc2.signature, pc3.signature) >= 0.8
+
+    report = run_analysis([pc2, pc3], case_type="PC").report
+
+    # ... mais ce sont deux pièces différentes
+    assert report.documents_doublons == []
+    types = {doc.filename: doc.document_type.value for doc in report.documents_conformes}
+    assert types == {"PC2 plan de masse.pdf": "PC2", "PC3 plan en coupe.pdf": "PC3"}
+    assert "PC2" not in report.documents_manquants
+    assert "PC3" not in report.documents_manquants
+
+
+def test_variants_of_the_same_file_are_still_merged():
+    text = f"Notice descriptive du projet\n{CARTOUCHE}"
+    # Scan : bruit d'OCR, la version Word est gardée
+    scan = _extracted("117 Notice.pdf", text + " |l ;; 7l1OO ~~ 0cr")
+    word = _extracted("117 Notice.docx", text)
+
+    report = run_analysis([scan, word], case_type="PC").report
+
+    assert [doc.filename for doc in report.documents_doublons] == ["117 Notice.pdf"]
+    assert report.documents_doublons[0].duplicate_of == "117 Notice.docx"
+
+
+def test_short_boilerplate_has_no_signature():
+    assert fingerprint("Cabinet Martin architecte échelle 1/200 document non contractuel " * 3) is None
+    assert fingerprint(" ".join(f"mot{i}" for i in range(MIN_SHINGLES + 4))) is not None
@@ -0,0 +1,62 @@
+"""Profilage : nombres d'échantillons des piles repliées, threads échantillonnés."""
+import contextvars
+import threading
+import time
+
+from app.services import near_duplicates
+from app.services.profiler import SamplingProfiler, folded, profiled_call
+
+TEXT = "plan de masse notice descriptive gestion des eaux pluviales " * 500
+
+
+def _busy(seconds: float, stop: threading.Event = None) -> None:
+    # Travail dans le code de l'application (seules ces piles sont gardées)
+    end = time.monotonic() + seconds
+    while time.monotonic() < end and not (stop and stop.is_set()):
+        near_duplicates.fingerprint(TEXT)
+
+
+def test_folded_reports_sample_counts():
+    profiler = SamplingProfiler(interval_s=0.005)
+    a = (("main", "app/main.py", 1), ("analyze", "app/services/analyzer.py", 10))
+    b = (("main", "app/main.py", 1), ("extract", "app/services/extractor.py", 20))
+    profiler.samples[("worker", a)] = 4
+    profiler.samples[("worker", b)] = 6
+
+    lines = folded(profiler.speedscope("test"), profiler.interval_s).splitlines()
+
+    assert sorted(int(line.rsplit(" ", 1)[1]) for line in lines) == [4, 6]
+
+
+def test_only_threads_of_the_request_are_sampled():
+    stop = threading.Event()
+    other_request = threading.Thread(target=_busy, args=(30, stop), name="other-request")
+    other_request.start()
+    result = {}
+
+    def request_thread() -> None:
+        profiler = SamplingProfiler(interval_s=0.002)
+        profiler.start()
+        try:
+            context = contextvars.copy_context()
+            worker = threading.Thread(
+                target=context.run, args=(profiled_call, _busy, 0.3), name="request-worker",
+            )
+            worker.start()
+            worker.join()
+        finally:
+            profiler.stop()
+        result["profiler"] = profiler
+
+    # Le contexte de la requête (comme le propage run_in_threadpool) suit le thread de travail
+    thread = threading.Thread(target=request_thread, name="request-loop")
+    thread.start()
+    thread.join()
+    stop.set()
+    other_request.join()
+
+    profiler = result["profiler"]
+    threads = {name for name, _ in profiler.samples}
+    assert "request-worker" in threads
+    assert "other-request" not in threads
+    assert profiler.shared_threads == ["request-loop"]
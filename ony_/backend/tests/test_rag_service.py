@@ -0,0 +1,44 @@
+"""Explications : une génération terminée est réutilisée par les autres workers."""
+import asyncio
+
+from app.models.document import AnalysisReport, ProjectInfo
+from app.services.rag_service import RAGService
+from app.services.shared_state import SharedState
+
+REPORT = AnalysisReport(
+    project_info=ProjectInfo(),
+    documents_conformes=[],
+    documents_non_conformes=[],
+    documents_manquants=["PC4"],
+    total_documents=0,
+    conformity_score=0.0,
+    report_id="rapport-test",
+)
+
+
+def test_finished_explanation_is_shared_between_workers(tmp_path):
+    shared = SharedState(str(tmp_path / "shared.db"))
+    generations = []
+
+    async def explain(report, priority=None):
+        generations.append(report.report_id)
+        return "Explication Jan.ai"
+
+    async def scenario():
+        first, second = RAGService(None, shared=shared), RAGService(None, shared=shared)
+        first.explain_issues = second.explain_issues = explain
+        assert not await second.has_explanation(REPORT)
+
+        assert await first.get_explanation(REPORT) == "Explication Jan.ai"
+        # Publication hors de la boucle asyncio
+        for _ in range(50):
+            if await second.has_explanation(REPORT):
+                break
+            await asyncio.sleep(0.02)
+        assert await second.get_explanation(REPORT) == "Explication Jan.ai"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        shared.close()
+    assert generations == ["rapport-test"]
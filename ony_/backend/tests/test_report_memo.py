@@ -0,0 +1,12 @@
+"""Mémo des rapports : la clé suit l'environnement d'extraction."""
+from app.services.report_memo import ReportMemo
+
+FILES = [("PC1 plan.pdf", "a" * 64), ("PC2 coupe.pdf", "b" * 64)]
+
+
+def test_key_depends_on_extractor_version():
+    memo = ReportMemo()
+    with_ocr = memo.key(FILES, "PC", "1:fitz:ocr:200dpi")
+    assert memo.key(list(reversed(FILES)), "PC", "1:fitz:ocr:200dpi") == with_ocr
+    assert memo.key(FILES, "PC", "1:fitz:no-ocr:200dpi") != with_ocr
+    assert memo.key(FILES, "PC", "1:fitz:ocr:150dpi") != with_ocr
@@ -0,0 +1,49 @@
+"""Single-flight : l'appel partagé s'arrête quand plus personne ne l'attend."""
+import asyncio
+
+from app.services.single_flight import SingleFlight
+
+
+def _slow_call(started: asyncio.Event, cancelled: asyncio.Event):
+    async def call():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return "réponse"
+    return call
+
+
+def test_cancelling_the_only_caller_cancels_the_call():
+    async def scenario():
+        flight = SingleFlight()
+        started, cancelled = asyncio.Event(), asyncio.Event()
+        caller = asyncio.ensure_future(flight.do("clé", _slow_call(started, cancelled)))
+        await started.wait()
+        caller.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        assert flight.snapshot()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_remaining_caller_keeps_the_call_alive():
+    async def scenario():
+        flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def call():
+            started.set()
+            await asyncio.sleep(0.1)
+            return "réponse"
+
+        first = asyncio.ensure_future(flight.do("clé", call))
+        second = asyncio.ensure_future(flight.do("clé", call))
+        await started.wait()
+        first.cancel()
+        assert await second == "réponse"
+        assert flight.collapsed_calls == 1 and flight.snapshot()["in_flight"] == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,63 @@
+"""Archives ZIP : noms de membres refusés, annulation pendant la décompression."""
+import io
+import threading
+import time
+import zipfile
+
+import pytest
+
+from app.services.cancellation import AnalysisCancelled, CancellationToken, CancelReason
+from app.services.pipeline import is_supported
+from app.services.zip_dossier import ZipDossier, ZipLimitError
+
+
+def _archive(names) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name in names:
+            archive.writestr(name, b"%PDF-1.4 contenu")
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.mark.parametrize("names", [
+    ["/etc/PC1 plan.pdf", "dossier/PC2 plan.pdf"],
+    ["dossier/../../PC1 plan.pdf", "dossier/PC2 plan.pdf"],
+    ["C:/dossier/PC1 plan.pdf"],
+])
+def test_absolute_or_parent_member_names_are_refused(names):
+    with pytest.raises(ZipLimitError):
+        ZipDossier("dossier.zip", _archive(names), is_supported)
+
+
+def test_common_root_is_removed():
+    dossier = ZipDossier("dossier.zip", _archive(["117 PC/PC1 plan.pdf", "117 PC/Plans/PC2 plan.pdf"]), is_supported)
+    try:
+        assert dossier.filenames == ["PC1 plan.pdf", "Plans/PC2 plan.pdf"]
+    finally:
+        dossier.close()
+
+
+class _SlowZipDossier(ZipDossier):
+    release = threading.Event()
+
+    def _read_member(self, info, name):
+        # Membre énorme : la décompression ne rend pas la main
+        self.release.wait(10)
+        return super()._read_member(info, name)
+
+
+def test_prefetch_notices_cancellation_while_waiting():
+    dossier = _SlowZipDossier("dossier.zip", _archive(["PC1 plan.pdf"]), is_supported)
+    token = CancellationToken()
+    threading.Timer(0.2, token.cancel, args=(CancelReason.CLIENT,)).start()
+    members = dossier.prefetch(cancel_token=token)
+    start = time.monotonic()
+    try:
+        with pytest.raises(AnalysisCancelled):
+            next(members)
+        assert time.monotonic() - start < 2
+    finally:
+        members.close()
+        _SlowZipDossier.release.set()
+        dossier.close()
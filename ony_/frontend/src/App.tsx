@@ -1,26 +1,53 @@
 import { useState } from 'react';
 import { Droplets, RefreshCw } from 'lucide-react';
 import { DropZone, Report, Chatbot } from './components';
-import { analyzeDocuments } from './services/api';
-import { AnalysisReport } from './types';
+import { analyzeDocumentsWithProgress } from './services/api';
+import { AnalysisReport, JobProgress } from './types';
+
+/** Libellé court de l'étape en cours d'un job d'analyse */
+function progressLabel(progress: JobProgress): string {
+  const file = progress.file ? ` ${progress.file}` : '';
+  const page = progress.page && progress.pages ? ` (page ${progress.page}/${progress.pages})` : '';
+  switch (progress.stage) {
+    case 'queued':
+      return 'En attente de traitement…';
+    case 'extracting':
+      return `Extraction du texte :${file}${page}`;
+    case 'ocr':
+      return `Reconnaissance de texte (OCR) :${file}${page}`;
+    case 'identifying':
+      return `Identification :${file}`;
+    case 'evaluating':
+      return 'Vérification des règles de conformité…';
+    default:
+      return 'Analyse en cours…';
+  }
+}
 
 function App() {
   const [report, setReport] = useState<AnalysisReport | null>(null);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [progress, setProgress] = useState<JobProgress | null>(null);
   const [caseType, setCaseType] = useState<'PC' | 'PA'>('PC');
+  // Session côté serveur : rattache le rapport et l'historique du chat à cet utilisateur
+  const [sessionId, setSessionId] = useState<string>(() => crypto.randomUUID());
 
   const handleFilesSelected = async (files: File[]) => {
     setIsLoading(true);
     setError(null);
+    setProgress(null);
 
     try {
-      const result = await analyzeDocuments(files, caseType);
+      const newSessionId = crypto.randomUUID();
+      const result = await analyzeDocumentsWithProgress(files, caseType, newSessionId, setProgress);
+      setSessionId(newSessionId);
       setReport(result);
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Une erreur est survenue');
     } finally {
       setIsLoading(false);
+      setProgress(null);
     }
   };
 
@@ -114,6 +141,12 @@ function App() {
             </div>
             
             <DropZone onFilesSelected={handleFilesSelected} isLoading={isLoading} />
+
+            {isLoading && progress && (
+              <p className="mt-3 text-center text-sm text-aqua-700">
+                {progressLabel(progress)}
+              </p>
+            )}
             
             {/* Infos */}
             <div className="mt-8 grid grid-cols-3 gap-4 text-center">
@@ -122,7 +155,7 @@ function App() {
                 <div className="text-sm text-aqua-600">Types de dossiers</div>
               </div>
               <div className="p-4 bg-white/50 rounded-xl">
-                <div className="text-2xl font-bold text-aqua-700">PDF/DOCX</div>
+                <div className="text-2xl font-bold text-aqua-700">PDF/DOCX/ZIP</div>
                 <div className="text-sm text-aqua-600">Formats acceptés</div>
               </div>
               <div className="p-4 bg-white/50 rounded-xl">
@@ -147,7 +180,7 @@ function App() {
               <h2 className="text-xl font-semibold text-aqua-900 mb-4">
                 Assistant
               </h2>
-              <Chatbot report={report} />
+              <Chatbot report={report} sessionId={sessionId} />
             </div>
           </div>
         )}
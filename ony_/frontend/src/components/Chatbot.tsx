@@ -1,13 +1,14 @@
 import { useState, useRef, useEffect } from 'react';
 import { Send, Bot, User, Loader2 } from 'lucide-react';
 import { ChatMessage, AnalysisReport } from '../types';
-import { sendChatMessage } from '../services/api';
+import { streamChatMessage } from '../services/api';
 
 interface ChatbotProps {
   report: AnalysisReport | null;
+  sessionId: string;
 }
 
-export function Chatbot({ report }: ChatbotProps) {
+export function Chatbot({ report, sessionId }: ChatbotProps) {
   const [messages, setMessages] = useState<ChatMessage[]>([
     {
       role: 'assistant',
@@ -18,6 +19,7 @@ export function Chatbot({ report }: ChatbotProps) {
   ]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [isStreaming, setIsStreaming] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
   const scrollToBottom = () => {
@@ -47,8 +49,19 @@ export function Chatbot({ report }: ChatbotProps) {
     setIsLoading(true);
 
     try {
-      const response = await sendChatMessage(input, report || undefined);
-      setMessages(prev => [...prev, response]);
+      // Le message de l'assistant est affiché au fil des tokens reçus
+      let started = false;
+      const response = await streamChatMessage(input, report || undefined, (content) => {
+        const replaceLast = started;
+        started = true;
+        setMessages(prev => replaceLast
+          ? [...prev.slice(0, -1), { role: 'assistant', content }]
+          : [...prev, { role: 'assistant', content }]);
+        setIsStreaming(true);
+      }, sessionId);
+      if (!started) {
+        setMessages(prev => [...prev, response]);
+      }
     } catch (error) {
       setMessages(prev => [...prev, {
         role: 'assistant',
@@ -56,6 +69,7 @@ export function Chatbot({ report }: ChatbotProps) {
       }]);
     } finally {
       setIsLoading(false);
+      setIsStreaming(false);
     }
   };
 
@@ -123,7 +137,7 @@ export function Chatbot({ report }: ChatbotProps) {
           </div>
         ))}
         
-        {isLoading && (
+        {isLoading && !isStreaming && (
           <div className="flex gap-3">
             <div className="p-2 bg-aqua-100 rounded-full h-fit">
               <Bot className="w-4 h-4 text-aqua-600" />
@@ -20,6 +20,8 @@ export function DropZone({ onFilesSelected, isLoading }: DropZoneProps) {
       'application/pdf': ['.pdf'],
       'application/vnd.openxmlformats-officedocument.wordprocessingml.document': ['.docx'],
       'application/msword': ['.doc'],
+      'application/zip': ['.zip'],
+      'application/x-zip-compressed': ['.zip'],
     },
     disabled: isLoading,
   });
@@ -74,7 +76,7 @@ export function DropZone({ onFilesSelected, isLoading }: DropZoneProps) {
               {isDragActive ? 'Déposez vos fichiers ici' : 'Glissez-déposez vos documents'}
             </p>
             <p className="text-sm text-aqua-600 mt-1">
-              ou cliquez pour sélectionner (PDF, DOCX)
+              ou cliquez pour sélectionner (PDF, DOCX, ou le dossier en ZIP)
             </p>
           </div>
         </div>
@@ -1,4 +1,4 @@
-import { CheckCircle, XCircle, AlertTriangle, FileText, Info } from 'lucide-react';
+import { CheckCircle, XCircle, AlertTriangle, FileText, Info, Copy } from 'lucide-react';
 import { AnalysisReport, DOCUMENT_LABELS, DocumentType } from '../types';
 
 interface ReportProps {
@@ -90,6 +90,11 @@ export function Report({ report }: ReportProps) {
                       </span>
                     )}
                   </p>
+                  {doc.resubmitted_in && doc.resubmitted_in.length > 0 && (
+                    <p className="text-xs text-amber-700">
+                      Déjà déposée dans {doc.resubmitted_in.length} dossier(s) archivé(s)
+                    </p>
+                  )}
                 </div>
                 <CheckCircle className="w-5 h-5 text-emerald-500 flex-shrink-0" />
               </div>
@@ -135,6 +140,40 @@ export function Report({ report }: ReportProps) {
         </div>
       )}
 
+      {/* Quasi-doublons */}
+      {report.documents_doublons && report.documents_doublons.length > 0 && (
+        <div className="bg-white/80 backdrop-blur rounded-2xl p-6 shadow-lg">
+          <div className="flex items-center gap-2 mb-4">
+            <Copy className="w-6 h-6 text-slate-500" />
+            <h3 className="text-lg font-semibold text-aqua-900">
+              Doublons ({report.documents_doublons.length})
+            </h3>
+          </div>
+
+          <div className="grid gap-2">
+            {report.documents_doublons.map((doc, index) => (
+              <div
+                key={index}
+                className="flex items-center gap-3 p-3 bg-slate-50 rounded-lg"
+              >
+                <FileText className="w-5 h-5 text-slate-500 flex-shrink-0" />
+                <div className="flex-1 min-w-0">
+                  <p className="font-medium text-slate-800 truncate">{doc.filename}</p>
+                  <p className="text-sm text-slate-600">
+                    Doublon de {doc.duplicate_of}
+                    {doc.similarity != null && (
+                      <span className="ml-2 text-slate-400">
+                        ({Math.round(doc.similarity * 100)}% similaire)
+                      </span>
+                    )}
+                  </p>
+                </div>
+              </div>
+            ))}
+          </div>
+        </div>
+      )}
+
       {/* Documents manquants */}
       {report.documents_manquants.length > 0 && (
         <div className="bg-white/80 backdrop-blur rounded-2xl p-6 shadow-lg">
@@ -1,26 +1,72 @@
-import { AnalysisReport, ChatMessage } from '../types';
+import { AnalysisReport, ChatMessage, ChatUpgrade, JobProgress } from '../types';
 
 const API_BASE = '/api';
 
+async function sha256Hex(file: File): Promise<string> {
+  const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, '0')).join('');
+}
+
+/**
+ * Formulaire d'un dossier : seuls les fichiers inconnus du serveur sont
+ * uploadés, les autres sont cités par leur SHA-256 (`known_files`).
+ */
+async function dossierForm(files: File[], uploadAll = false): Promise<FormData> {
+  const formData = new FormData();
+  // crypto.subtle n'existe qu'en contexte sécurisé (https, localhost)
+  if (uploadAll || !crypto?.subtle) {
+    files.forEach((file) => formData.append('files', file));
+    return formData;
+  }
+
+  const hashes = await Promise.all(files.map(sha256Hex));
+  const response = await fetch(`${API_BASE}/files/check`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ hashes }),
+  });
+  const known = new Set<string>(response.ok ? (await response.json()).known : []);
+
+  const knownFiles: { filename: string; sha256: string }[] = [];
+  files.forEach((file, index) => {
+    if (known.has(hashes[index])) {
+      knownFiles.push({ filename: file.name, sha256: hashes[index] });
+    } else {
+      formData.append('files', file);
+    }
+  });
+  if (knownFiles.length) {
+    formData.append('known_files', JSON.stringify(knownFiles));
+  }
+  return formData;
+}
+
+/**
+ * Envoie un dossier ; si le serveur a oublié un fichier entre-temps (409),
+ * le dossier est renvoyé en entier.
+ */
+async function postDossier(url: string, files: File[]): Promise<Response> {
+  const response = await fetch(url, { method: 'POST', body: await dossierForm(files) });
+  if (response.status !== 409) {
+    return response;
+  }
+  return fetch(url, { method: 'POST', body: await dossierForm(files, true) });
+}
+
 /**
  * Analyse les documents uploadés
  */
 export async function analyzeDocuments(
   files: File[],
-  caseType: 'PC' | 'PA' = 'PC'
+  caseType: 'PC' | 'PA' = 'PC',
+  sessionId?: string
 ): Promise<AnalysisReport> {
-  const formData = new FormData();
-  
-  files.forEach((file) => {
-    formData.append('files', file);
-  });
-
   const params = new URLSearchParams({ case_type: caseType });
+  if (sessionId) {
+    params.set('session_id', sessionId);
+  }
   
-  const response = await fetch(`${API_BASE}/analyze?${params.toString()}`, {
-    method: 'POST',
-    body: formData,
-  });
+  const response = await postDossier(`${API_BASE}/analyze?${params.toString()}`, files);
   
   if (!response.ok) {
     const error = await response.json();
@@ -30,20 +76,100 @@ export async function analyzeDocuments(
   return response.json();
 }
 
+/**
+ * Analyse les documents via un job asynchrone : la progression (fichier,
+ * page OCR n/m...) est transmise à `onProgress` jusqu'au rapport final.
+ */
+export async function analyzeDocumentsWithProgress(
+  files: File[],
+  caseType: 'PC' | 'PA' = 'PC',
+  sessionId: string | undefined,
+  onProgress: (progress: JobProgress) => void
+): Promise<AnalysisReport> {
+  // Onglet fermé : le serveur arrête l'analyse au lieu de l'OCRiser pour rien
+  const params = new URLSearchParams({ case_type: caseType, cancel_on_disconnect: 'true' });
+  if (sessionId) {
+    params.set('session_id', sessionId);
+  }
+
+  const response = await postDossier(`${API_BASE}/jobs?${params.toString()}`, files);
+
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.detail || 'Erreur lors de l\'analyse');
+  }
+
+  const { job_id: jobId } = await response.json();
+
+  // EventSource se reconnecte seul en reprenant au dernier événement reçu
+  return new Promise<AnalysisReport>((resolve, reject) => {
+    const source = new EventSource(`${API_BASE}/jobs/${jobId}/events`);
+
+    source.addEventListener('progress', (event) => {
+      onProgress(JSON.parse((event as MessageEvent).data));
+    });
+    source.addEventListener('done', (event) => {
+      source.close();
+      resolve(JSON.parse((event as MessageEvent).data).report);
+    });
+    source.addEventListener('failed', (event) => {
+      source.close();
+      const payload = JSON.parse((event as MessageEvent).data);
+      reject(new Error(payload.error || 'Erreur lors de l\'analyse'));
+    });
+    source.addEventListener('cancelled', (event) => {
+      source.close();
+      const payload = JSON.parse((event as MessageEvent).data);
+      reject(new Error(payload.reason === 'deadline' ? 'Délai d\'analyse dépassé' : 'Analyse annulée'));
+    });
+    source.onerror = () => {
+      // Fermé par le serveur avant la fin : le job a été oublié
+      if (source.readyState === EventSource.CLOSED) {
+        reject(new Error('Suivi de l\'analyse interrompu'));
+      }
+    };
+  });
+}
+
+/**
+ * Corps d'une requête de chat : le rapport n'est envoyé en entier que si le
+ * serveur ne le connaît pas (pas de report_id, ou rapport expiré côté serveur).
+ */
+function chatBody(
+  message: string,
+  report: AnalysisReport | undefined,
+  sendFullReport: boolean,
+  extra: Record<string, unknown>
+): string {
+  const reportFields = report?.report_id && !sendFullReport
+    ? { report_id: report.report_id }
+    : { report };
+  return JSON.stringify({ message, ...reportFields, ...extra });
+}
+
 /**
  * Envoie un message au chatbot
  */
 export async function sendChatMessage(
   message: string, 
-  report?: AnalysisReport
+  report?: AnalysisReport,
+  latencyBudgetMs?: number,
+  sessionId?: string
 ): Promise<ChatMessage> {
-  const response = await fetch(`${API_BASE}/chat`, {
+  const extra = { latency_budget_ms: latencyBudgetMs, session_id: sessionId };
+  const post = (sendFullReport: boolean) => fetch(`${API_BASE}/chat`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
     },
-    body: JSON.stringify({ message, report }),
+    body: chatBody(message, report, sendFullReport, extra),
   });
+
+  let response = await post(false);
+  if (response.status === 404 && report) {
+    // Rapport expiré côté serveur : on le renvoie en entier
+    response = await post(true);
+  }
   
   if (!response.ok) {
     const error = await response.json();
@@ -53,6 +179,90 @@ export async function sendChatMessage(
   return response.json();
 }
 
+/**
+ * Récupère la réponse Jan.ai d'un message servi en rule-based (budget de latence dépassé).
+ * `waitSeconds` permet une attente longue côté serveur.
+ */
+export async function fetchChatUpgrade(
+  upgradeId: string,
+  waitSeconds = 0
+): Promise<ChatUpgrade> {
+  const params = new URLSearchParams({ wait_s: String(waitSeconds) });
+  const response = await fetch(`${API_BASE}/chat/upgrades/${upgradeId}?${params.toString()}`);
+
+  if (!response.ok) {
+    const error = await response.json();
+    throw new Error(error.detail || 'Réponse indisponible');
+  }
+
+  return response.json();
+}
+
+/**
+ * Envoie un message au chatbot en streaming (server-sent events).
+ * `onToken` reçoit le texte cumulé à chaque morceau ; la réponse complète est retournée.
+ */
+export async function streamChatMessage(
+  message: string,
+  report: AnalysisReport | undefined,
+  onToken: (content: string) => void,
+  sessionId?: string
+): Promise<ChatMessage> {
+  const post = (sendFullReport: boolean) => fetch(`${API_BASE}/chat/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: chatBody(message, report, sendFullReport, { session_id: sessionId }),
+  });
+
+  let response = await post(false);
+  if (response.status === 404 && report) {
+    // Rapport expiré côté serveur : on le renvoie en entier
+    response = await post(true);
+  }
+
+  if (!response.ok || !response.body) {
+    throw new Error('Erreur de communication avec le chatbot');
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let content = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Les événements SSE sont séparés par une ligne vide
+    let separator = buffer.indexOf('\n\n');
+    while (separator !== -1) {
+      const rawEvent = buffer.slice(0, separator);
+      buffer = buffer.slice(separator + 2);
+      separator = buffer.indexOf('\n\n');
+
+      const event = rawEvent.match(/^event: (.*)$/m)?.[1];
+      const data = rawEvent.match(/^data: (.*)$/m)?.[1];
+      if (!event || !data) continue;
+
+      const payload = JSON.parse(data);
+      if (event === 'token') {
+        content += payload.content;
+      } else if (event === 'fallback') {
+        // Le fallback remplace une éventuelle réponse partielle
+        content = payload.content;
+      } else {
+        continue;
+      }
+      onToken(content);
+    }
+  }
+
+  return { role: 'assistant', content };
+}
+
 /**
  * Vérifie l'état de l'API
  */
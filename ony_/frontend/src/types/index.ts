@@ -13,6 +13,11 @@ export interface Document {
   confidence: number;
   extracted_text?: string;
   issues: string[];
+  // Quasi-doublon : variante analysée à sa place
+  duplicate_of?: string;
+  similarity?: number;
+  // Dossiers archivés (report_id) contenant déjà cette pièce
+  resubmitted_in?: string[];
 }
 
 export interface ProjectInfo {
@@ -46,11 +51,35 @@ export interface AnalysisReport {
   total_documents: number;
   conformity_score: number;
   compliance_issues: ComplianceIssue[];
+  documents_doublons?: Document[];
+  // Identifiant du rapport conservé côté serveur
+  report_id?: string;
 }
 
 export interface ChatMessage {
   role: 'user' | 'assistant';
   content: string;
+  source?: 'llm' | 'rules';
+  // Réponse Jan.ai à venir quand la réponse rule-based a été servie faute de temps
+  upgrade_id?: string;
+}
+
+export interface ChatUpgrade {
+  status: 'pending' | 'done' | 'failed';
+  message?: ChatMessage;
+}
+
+// Événement de progression d'un job d'analyse (/api/jobs/{id}/events)
+export interface JobProgress {
+  seq: number;
+  stage: 'queued' | 'running' | 'extracting' | 'ocr' | 'identifying' | 'evaluating' | 'done' | 'failed' | string;
+  file?: string;
+  file_index?: number;
+  files?: number;
+  page?: number;
+  pages?: number;
+  position?: number;
+  error?: string;
 }
 
 // Labels français pour les types de documents